@@ -1,16 +1,434 @@
+from array import array
+from collections import namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+import csv
 from datetime import date
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+import heapq
+from itertools import batched, islice, product, repeat
 import json
+import math
+import numpy as np
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils.cell import coordinate_to_tuple
 import os
 from os.path import basename
+import re
 import requests
 import smtplib
 from tabulate import tabulate
 
 
+class AssumptionSweep:
+    """
+    Evaluates every house across a grid of financial assumptions to show which houses become featured under which assumptions.
+
+    Every combination of the swept assumption values is analyzed with a single `HouseBatch` that holds the whole grid, so each house is only parsed once and every scenario is calculated in the same vectorized pass. Only the first five years are projected since that is all the featured house criteria need, and the houses are analyzed in chunks to keep the scenarios x houses arrays small for large searches.
+
+    Attributes:
+        assumption_ranges (dict): The values tried for each swept assumption, keyed by the assumption name.
+        assumptions (HouseAssumptions): The assumptions for the whole grid of scenarios.
+        scenarios (list): A dictionary of the swept values for each scenario, in the order of the grid.
+        address (list): The street address of each analyzed house.
+        url (list): URL to each analyzed house's listing page.
+        error_houses (list): The address of each house lacking the values needed for the analysis.
+        featured (ndarray): A boolean array with one row per scenario and one column per house that is True where the house is featured under the scenario.
+        results (list): A dictionary for each featured house under each scenario with the swept values, the house's address and URL, and its key metrics, ordered by scenario.
+
+    Methods:
+        featured_houses(self, scenario_index):
+            Returns the address of every house that is featured under the given scenario.
+        summary(self):
+            Returns the swept values and the number of featured houses for each scenario.
+
+    Example Usage:
+        sweep = AssumptionSweep(config, data, {"interest_rate": [0.05, 0.06, 0.07], "down_payment_decimal": [0.1, 0.2]})
+        create_sweep_results_csv(sweep, "assumption-sweep.csv")
+        # The CSV file lists every house that is featured under each of the six combinations of interest rate and down payment.
+    """
+    result_metrics = ('price', 'cash_flow_monthly', 'cash_on_cash_decimal', 'percent_rule_decimal', 'pro_forma_cap_decimal', 'five_year_annualized_return_decimal')
+    
+    def __init__(self, config, data, assumption_ranges, chunk_size=2000):
+        
+        self.assumption_ranges = dict(assumption_ranges)
+        self.assumptions, self.scenarios = HouseAssumptions.grid(config, self.assumption_ranges)
+        
+        # Compile the target values from the config file once for every chunk of houses
+        featured_filter = FeaturedHouseFilter(config)
+        
+        # Parse and verify every house once for the whole grid
+        verified_house_data, self.error_houses = verify_all_house_data(data)
+        self.address = [house_data.get('address') for house_data in verified_house_data]
+        self.url = [house_data.get('url') for house_data in verified_house_data]
+        
+        self.featured = np.zeros((len(self.scenarios), len(verified_house_data)), dtype=bool)
+        featured_results = []
+        
+        # Only project as far as the five year annualized return
+        projection_yrs = min(5, int(np.min(self.assumptions.loan_term_yrs)))
+        
+        # Analyze each chunk of houses under every scenario at once
+        for chunk_start in range(0, len(verified_house_data), chunk_size):
+            house_batch = HouseBatch(self.assumptions, verified_house_data[chunk_start:chunk_start + chunk_size], projection_yrs)
+            featured = featured_filter.mask(house_batch)
+            self.featured[:, chunk_start:chunk_start + len(house_batch)] = featured
+            
+            # Keep the key metrics of each house that is featured under a scenario
+            metric_values = {
+                "price": house_batch.price,
+                "cash_flow_monthly": house_batch.cash_flow_monthly,
+                "cash_on_cash_decimal": house_batch.cash_on_cash_decimal,
+                "percent_rule_decimal": house_batch.percent_rule_decimal,
+                "pro_forma_cap_decimal": house_batch.pro_forma_cap_decimal,
+                "five_year_annualized_return_decimal": house_batch.annualized_return_decimal[..., min(5, projection_yrs)]
+            }
+            metric_values = {name: np.broadcast_to(values, featured.shape) for name, values in metric_values.items()}
+            
+            for scenario_index, house_index in zip(*np.nonzero(featured)):
+                metrics = {name: float(metric_values[name][scenario_index, house_index]) for name in self.result_metrics}
+                featured_results.append((scenario_index, chunk_start + house_index, metrics))
+        
+        # Order the results by scenario and then by house
+        featured_results.sort(key=lambda result: result[:2])
+        self.results = [
+            {**self.scenarios[scenario_index], "address": self.address[house_index], "url": self.url[house_index], **metrics}
+            for scenario_index, house_index, metrics in featured_results
+        ]
+    
+    
+    def featured_houses(self, scenario_index):
+        """Return the address of every house that is featured under the scenario at the given index"""
+        return [self.address[house_index] for house_index in np.flatnonzero(self.featured[scenario_index])]
+    
+    
+    def summary(self):
+        """Return a dictionary with the swept values and the number of featured houses for each scenario"""
+        featured_counts = self.featured.sum(axis=1)
+        return [{**scenario, "featured_houses": int(featured_count)} for scenario, featured_count in zip(self.scenarios, featured_counts)]
+
+
+class BufferedExcelCell:
+    """
+    Holds the value and number format of a single cell of a `BufferedExcelSheet` until the sheet is written.
+
+    Attributes:
+        value: The value or formula of the cell.
+        number_format (str): The Excel number format of the cell.
+    """
+    __slots__ = ('value', 'number_format')
+    
+    def __init__(self, value=None, number_format='General'):
+        
+        self.value = value
+        self.number_format = number_format
+
+
+class BufferedExcelSheet:
+    """
+    Collects the cells of an Excel sheet by their coordinates (e.g., `sheet['B3'] = 100` and `sheet['B3'].number_format = '#0.00%'`) so a sheet filled in any order can be written to a write-only worksheet, which only accepts whole rows from top to bottom.
+
+    Write-only workbooks stream each row to disk as it is added instead of keeping every cell of every sheet in memory, so a workbook with a sheet for each of thousands of houses can be written with the memory of a single sheet.
+
+    Attributes:
+        cells (dict): The `BufferedExcelCell` for each coordinate that was set.
+
+    Methods:
+        write_rows(self, worksheet):
+            Appends the collected cells to a write-only worksheet row by row.
+    """
+    def __init__(self):
+        
+        self.cells = {}
+    
+    
+    def __getitem__(self, coordinate):
+        # Create empty cells the first time they are used so their format can be set before their value
+        if coordinate not in self.cells:
+            self.cells[coordinate] = BufferedExcelCell()
+        return self.cells[coordinate]
+    
+    
+    def __setitem__(self, coordinate, value):
+        self[coordinate].value = value
+    
+    
+    def write_rows(self, worksheet):
+        """Append every collected cell to the write-only worksheet, filling the gaps between the cells with empty cells"""
+        # Find the row and column of each cell
+        cell_positions = {coordinate_to_tuple(coordinate): cell for coordinate, cell in self.cells.items()}
+        last_row = max((row for row, _ in cell_positions), default=0)
+        last_column = max((column for _, column in cell_positions), default=0)
+        
+        # Write each row from top to bottom, keeping the number format of each cell
+        for row in range(1, last_row + 1):
+            row_cells = []
+            for column in range(1, last_column + 1):
+                cell = cell_positions.get((row, column))
+                
+                # Write empty and unformatted cells as plain values, which is much faster than creating a cell
+                if cell is None or cell.number_format == 'General':
+                    row_cells.append(cell.value if cell else None)
+                    continue
+                
+                written_cell = WriteOnlyCell(worksheet, value=cell.value)
+                written_cell.number_format = cell.number_format
+                row_cells.append(written_cell)
+            worksheet.append(row_cells)
+
+
+class FeaturedHouseFilter:
+    """
+    Checks whether houses meet the investor's target values, compiled once from the config file so the same targets can be checked against any number of houses.
+
+    Only the targets that are set are checked, and they are checked in order of how often they reject a house, so most houses that miss a target are rejected by the first check. The rejection rates are counted as houses are checked and the order is updated every `reorder_interval` houses. The five year annualized return is always checked last because it is the only target that calculates a projection. The same checks can be run on a single `House` or as a boolean mask over a whole `HouseBatch`.
+
+    Attributes:
+        checks (list): The [target key, target value, houses checked, houses rejected] of each target that is set, in the order they are checked.
+        houses_checked (int): The number of houses checked by the filter.
+        reorder_interval (int): The number of houses checked between updates to the order of the checks.
+
+    Methods:
+        mask(self, house_batch):
+            Returns a boolean array that is True for each house (and each scenario) in the batch that meets every target.
+        reorder(self):
+            Orders the checks from the highest rejection rate to the lowest.
+
+    Example Usage:
+        featured_filter = FeaturedHouseFilter(config)
+        featured_houses = [house for house in analyzed_houses if featured_filter(house)]
+    """
+    house_metrics = {
+        "target_cash_flow_monthly_min": lambda house: house.cash_flow_monthly,
+        "target_percent_rule_min": lambda house: house.percent_rule_decimal,
+        "target_net_operating_income_min": lambda house: house.net_operating_income,
+        "target_pro_forma_cap_min": lambda house: house.pro_forma_cap_decimal,
+        "target_cash_on_cash_return_min": lambda house: house.cash_on_cash_decimal,
+        "target_five_year_annualized_return_min": lambda house: house.annualized_return_decimal[5]
+    }
+    batch_metrics = dict(house_metrics, target_five_year_annualized_return_min=lambda house_batch: house_batch.annualized_return_decimal[..., 5])
+    projection_targets = ("target_five_year_annualized_return_min",)
+    
+    def __init__(self, target_values, reorder_interval=256):
+        
+        # Keep only the targets that are set, ignoring every other config value
+        self.checks = [[key, target_values[key], 0, 0] for key in self.house_metrics if target_values.get(key) is not None]
+        self.houses_checked = 0
+        self.reorder_interval = reorder_interval
+    
+    
+    def __call__(self, house):
+        """Return True if the house meets or exceeds every target value, stopping at the first target the house misses"""
+        # Update the order of the checks after every `reorder_interval` houses
+        if self.houses_checked and self.houses_checked % self.reorder_interval == 0:
+            self.reorder()
+        self.houses_checked += 1
+        
+        for check in self.checks:
+            check[2] += 1
+            
+            # A metric without a real value (nan) never meets the target
+            if not check[1] <= self.house_metrics[check[0]](house):
+                check[3] += 1
+                return False
+        
+        return True
+    
+    
+    def __len__(self):
+        return len(self.checks)
+    
+    
+    def mask(self, house_batch):
+        """Return a boolean array that is True for each house in the batch that meets or exceeds every target value"""
+        self.houses_checked += int(np.size(house_batch.cash_flow_monthly))
+        
+        # Start with every house featured and remove the houses that miss any of the targets
+        featured_mask = np.ones(np.shape(house_batch.cash_flow_monthly), dtype=bool)
+        for check in self.checks:
+            houses_left = int(np.count_nonzero(featured_mask))
+            if houses_left == 0:
+                break
+            
+            check_mask = np.broadcast_to(check[1] <= self.batch_metrics[check[0]](house_batch), featured_mask.shape)
+            check[2] += houses_left
+            check[3] += houses_left - int(np.count_nonzero(check_mask & featured_mask))
+            featured_mask &= check_mask
+        
+        self.reorder()
+        return featured_mask
+    
+    
+    def reorder(self):
+        """Order the checks from the highest rejection rate to the lowest, keeping the targets that calculate a projection last"""
+        # Smooth the rates so targets that have rarely been reached are not moved on a few houses
+        self.checks.sort(key=lambda check: (check[0] in self.projection_targets, -(check[3] + 1) / (check[2] + 2)))
+
+
+class FeaturedHousePrescreen:
+    """
+    Drops the houses in the search results that could never be featured before their page, taxes, and rent are scraped, using only the price and square footage on the search result.
+
+    Each house is checked at its best case: no taxes and the highest rent it could get, which is `max_rent_per_sqft` times its square footage raised by the `safety_margin`. The best case is analyzed with the same `House` formulas and checked with the same `FeaturedHouseFilter` as the full analysis. Every target only gets better with more rent and less taxes, so a house that misses a target at its best case misses it with any taxes and rent that are scraped. Houses without a price or square footage are always kept.
+
+    Attributes:
+        config (dict): The config file the assumptions and targets are read from.
+        max_rent_per_sqft (float): The highest monthly rent per square foot expected for any house in the search, or None to keep every house.
+        safety_margin (float): The decimal the highest rent is raised by to allow for rent estimates above `max_rent_per_sqft`.
+        assumptions (HouseAssumptions): The financial assumptions shared by every best case house, or None when every house is kept.
+        featured_filter (FeaturedHouseFilter): The targets each best case is checked against.
+        houses_checked (int): The number of houses checked.
+        houses_dropped (int): The number of houses that could never be featured.
+
+    Methods:
+        from_config(cls, config):
+            Creates the prescreen from the optional "prescreen_max_rent_per_sqft" and "prescreen_safety_margin" values in the config file, checking the targets only if featured houses are required.
+        best_case_house(self, price, sqft):
+            Returns the analyzed `House` with no taxes and the highest rent.
+
+    Example Usage:
+        prescreen = FeaturedHousePrescreen.from_config(config)
+        if prescreen("$199,900", "2,140 sqft"):
+            # Scrape the taxes and rent for the house
+    """
+    def __init__(self, config, max_rent_per_sqft=None, safety_margin=0.1):
+        
+        self.config = config
+        self.max_rent_per_sqft = max_rent_per_sqft
+        self.safety_margin = safety_margin
+        self.featured_filter = FeaturedHouseFilter(config)
+        self.houses_checked = 0
+        self.houses_dropped = 0
+        
+        # Create the financial assumptions once so they are shared by every best case house instead of read from the config file for each search result
+        self.assumptions = HouseAssumptions.from_config(config) if max_rent_per_sqft is not None else None
+    
+    
+    def __call__(self, price, sqft):
+        """Return True if the house could be featured with some taxes and rent, or if there is not enough on the search result to tell"""
+        # Keep every house when there is no highest rent or no target to check
+        if self.max_rent_per_sqft is None or not len(self.featured_filter):
+            return True
+        
+        # Read the price and square footage the way the pipeline cleans them
+        price = str(price or "").replace('$', '').replace(',', '')
+        sqft = str(sqft or "").replace(' sqft', '').replace(',', '')
+        if not is_convertible_to_float(price) or not is_convertible_to_float(sqft) or float(price) <= 0 or float(sqft) <= 0:
+            return True
+        
+        self.houses_checked += 1
+        if self.featured_filter(self.best_case_house(float(price), float(sqft))):
+            return True
+        
+        self.houses_dropped += 1
+        return False
+    
+    
+    @classmethod
+    def from_config(cls, config):
+        """Create the prescreen from the optional highest rent per square foot and safety margin in the config file, keeping every house unless featured houses are required"""
+        max_rent_per_sqft = config.get('prescreen_max_rent_per_sqft') if config.get('featured_house_required') else None
+        safety_margin = config.get('prescreen_safety_margin')
+        return cls(config, max_rent_per_sqft=max_rent_per_sqft, safety_margin=0.1 if safety_margin is None else safety_margin)
+    
+    
+    def best_case_house(self, price, sqft):
+        """Return the house analyzed with no taxes and the highest total rent it could get, as a single unit so the rent is not multiplied again"""
+        best_case_rent = self.max_rent_per_sqft * sqft * (1 + self.safety_margin)
+        return House(self.assumptions, {'price': price, 'sqft': sqft, 'tax': 0, 'rent': best_case_rent})
+
+
+class FeaturedHouseRanking:
+    """
+    Keeps the top featured houses ranked by a chosen metric or a weighted score of several metrics while the analyzed houses stream through, so the featured house email stays small and sorted no matter how many houses were scraped.
+
+    The ranking is a bounded min-heap: once it holds `limit` houses, each new house only replaces the lowest ranked house when it scores higher, so keeping the top K of N houses costs O(N log K) time and O(K) memory. Houses with the same score keep the order they were scraped in. The ranking can be used in place of a list of featured houses, since houses are added with `append` and iterating over it gives the houses from the highest score to the lowest.
+
+    Attributes:
+        limit (int): The most houses kept, or None to keep every house.
+        rank_by (str or dict): The metric to rank by (e.g., "cash_flow_monthly"), or a dictionary of the weight for each metric in a weighted score (e.g., `{"cash_on_cash_return": 100, "five_year_annualized_return": 50}`). None keeps the houses in the order they were scraped.
+        heap (list): The kept houses as (score, tiebreaker, house) entries with the lowest ranked house first.
+        houses_seen (int): The number of houses added to the ranking.
+
+    Methods:
+        from_config(cls, config):
+            Creates the ranking from the optional "featured_house_limit" and "featured_house_rank_by" values in the config file.
+        append(self, house):
+            Adds a featured house, dropping the lowest ranked house when the ranking is full.
+        score(self, house):
+            Returns the score the house is ranked by.
+        summary(self):
+            Returns the rank, address, and score of each kept house.
+    """
+    rank_metrics = {
+        "cash_flow_monthly": lambda house: house.cash_flow_monthly,
+        "percent_rule": lambda house: house.percent_rule_decimal,
+        "net_operating_income": lambda house: house.net_operating_income,
+        "pro_forma_cap": lambda house: house.pro_forma_cap_decimal,
+        "cash_on_cash_return": lambda house: house.cash_on_cash_decimal,
+        "five_year_annualized_return": lambda house: house.annualized_return_decimal[5]
+    }
+    
+    def __init__(self, limit=None, rank_by=None):
+        
+        self.limit = limit
+        self.rank_by = rank_by
+        self.heap = []
+        self.houses_seen = 0
+    
+    
+    def __iter__(self):
+        # Give the houses from the highest score to the lowest, and in scrape order for the same score
+        return (house for _, _, house in sorted(self.heap, reverse=True))
+    
+    
+    def __len__(self):
+        return len(self.heap)
+    
+    
+    @classmethod
+    def from_config(cls, config):
+        """Create the ranking from the optional featured house limit and ranking metric in the config file"""
+        return cls(limit=config.get('featured_house_limit'), rank_by=config.get('featured_house_rank_by'))
+    
+    
+    def append(self, house):
+        """Add a featured house to the ranking, keeping only the top `limit` houses"""
+        # Break ties in favor of the houses scraped first
+        entry = (self.score(house), -self.houses_seen, house)
+        self.houses_seen += 1
+        
+        if self.limit is None or len(self.heap) < self.limit:
+            heapq.heappush(self.heap, entry)
+        
+        # Replace the lowest ranked house when the new house ranks higher
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+    
+    
+    def score(self, house):
+        """Return the score of the house for the ranking, ranking houses without a real value (such as a nan annualized return) last"""
+        # Keep the scrape order when no ranking metric is given
+        if self.rank_by is None:
+            return 0
+        
+        # Rank by a single metric or by the weighted score of several metrics
+        if isinstance(self.rank_by, str):
+            score = self.rank_metrics[self.rank_by](house)
+        else:
+            score = sum(weight * self.rank_metrics[metric](house) for metric, weight in self.rank_by.items())
+        
+        return -math.inf if math.isnan(score) else score
+    
+    
+    def summary(self):
+        """Return a dictionary with the rank, address, and score of each kept house from the highest score to the lowest"""
+        return [{"rank": rank, "address": house.address, "score": score} for rank, (score, _, house) in enumerate(sorted(self.heap, reverse=True), start=1)]
+
+
 class House:
     """
     Represents a house with various attributes and methods to analyze its financial viability as an investment.
@@ -33,17 +451,7 @@ class House:
         url (str): URL to the house's listing page.
         min_rent (str): The minimum estimated rent for the house.
         max_rent (str): The maximum estimated rent for the house.
-        down_payment_decimal (float): The fraction of the purchase price that must be paid upfront as a down payment.
-        closing_cost_buyer_decimal (float): The fraction of the purchase price that covers the buyer's closing costs.
-        closing_cost_seller_decimal (float): The fraction of the purchase price that covers the seller's closing costs.
-        expected_annual_growth (float): The expected annual growth rate of the property's value.
-        interest_rate (float): The annual interest rate of the mortgage.
-        loan_term_yrs (int): The term of the mortgage loan in years.
-        expected_repairs_monthly (float): The monthly cost of repairs as a fraction of the rent.
-        expected_vacancy_monthly (float): The monthly cost associated with vacancy as a fraction of the rent.
-        expected_capx_monthly (float): The monthly cost of capital expenditures as a fraction of the rent.
-        expected_management_monthly (float): The monthly cost of property management as a fraction of the rent.
-        insurance_rate_yearly (float): The yearly insurance rate as a fraction of the property's value.
+        assumptions (HouseAssumptions): The financial assumptions from the config file. One immutable `HouseAssumptions` object is shared by every house analyzed with the same config, and each assumption can still be read directly from the house (e.g., `house.interest_rate`).
 
     Methods:
         calculate_metrics(self):
@@ -61,9 +469,19 @@ class House:
         house_excel_sheet_creator(self, wb):
             Creates a new Excel sheet in a given workbook (`wb`) and populates it with the house's data and calculated financial metrics. This method also applies formatting for better readability and analysis.
 
+        projection(self, periods_per_year=1):
+            Returns the house's lazy `HouseProjection`. The yearly projection backs the `year`, `property_value`, `loan_balance`, `equity`, `rent_growth`, `profit_if_sold`, `cash_flow_yearly`, and `annualized_return_decimal` attributes, which are only calculated as far as they are read.
+
     Note:
         This class requires an external library `tabulate` for generating HTML tables and an Excel workbook object `wb` for creating Excel sheets, indicating that it should be used within a larger application context that handles Excel file manipulation and HTML content generation.
     """
+    __slots__ = (
+        'price', 'sqft', 'tax', 'rent', 'property_subtype', 'address', 'beds', 'baths', 'description', 'year_built', 'region', 'subdivision', 'tax_url', 'rent_url', 'url', 'min_rent', 'max_rent', 'assumptions',
+        'price_per_sqft', 'insurance_monthly', 'down_payment_cost', 'loan', 'closing_costs', 'principle_interest_monthly', 'taxes_monthly', 'total_operating_costs_monthly', 'number_units', 'suggested_total_rent_monthly',
+        'total_repairs_monthly', 'total_capx_monthly', 'total_vacancy_monthly', 'total_management_monthly', 'total_expenses_monthly', 'cash_flow_monthly', 'cash_flow_50', 'cash_needed_total', 'cash_on_cash_decimal',
+        'percent_rule_decimal', 'net_operating_income', 'pro_forma_cap_decimal', 'projections'
+    )
+    
     def __init__(self, config, data):
         
         self.price = float(data.get('price'))
@@ -83,18 +501,26 @@ class House:
         self.url = data.get('url')
         self.min_rent = data.get('min_rent')
         self.max_rent = data.get('max_rent')
-        self.down_payment_decimal = config['down_payment_decimal']
-        self.closing_cost_buyer_decimal = config['closing_cost_buyer_decimal']
-        self.closing_cost_seller_decimal = config['closing_cost_seller_decimal']
-        self.expected_annual_growth = config['expected_annual_growth']
-        self.interest_rate = config['interest_rate']
-        self.loan_term_yrs = config['loan_term_yrs']
-        self.expected_repairs_monthly = config['expected_repairs_monthly']
-        self.expected_vacancy_monthly = config['expected_vacancy_monthly']
-        self.expected_capx_monthly = config['expected_capx_monthly']
-        self.expected_management_monthly = config['expected_management_monthly']
-        self.insurance_rate_yearly = config['insurance_rate_yearly']
+        self.assumptions = HouseAssumptions.from_config(config)
         self.calculate_metrics()
+        
+        
+    def __getattr__(self, name):
+        # Read the financial assumptions shared by all the houses as if they were attributes of the house
+        if name in HouseAssumptions._fields:
+            return getattr(self.assumptions, name)
+        raise AttributeError(f"'House' object has no attribute '{name}'")
+    
+    
+    def __getstate__(self):
+        # Leave out the projections when pickling a house, they are recalculated lazily when they are read
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'projections' and hasattr(self, name)}
+    
+    
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.projections = None
 
 
     def calculate_metrics(self):
@@ -113,27 +539,31 @@ class House:
         - Monthly repair expenses, capital expenditures, expected vacancy costs, and management fees: Calculated as percentages of the suggested total rent.
         - Total monthly expenses and cash flow: Sum of operating and additional monthly expenses, and the net cash flow after expenses.
         - Cash flow based on the 50% rule, total cash needed to complete the purchase, cash-on-cash return, and the 1% rule.
-        - Net Operating Income (NOI), pro forma cap rate, and various annualized returns and financial projections over the loan term.
+        - Net Operating Income (NOI) and pro forma cap rate.
+
+        The yearly financial projections over the loan term (property value, loan balance, equity, rents, cash flow, profit if sold, and annualized returns) are not calculated here. They are calculated lazily by `projection` the first time each year is read.
 
         This method leverages the property's and loan configuration attributes to perform its calculations, updating the house instance with these computed metrics for further analysis or reporting.
         """
+        assumptions = self.assumptions
+        
         # Calculate the price per sqft
         self.price_per_sqft = round(self.price / self.sqft, 2)
         
         # Calculate the monthly insurance
-        self.insurance_monthly = round((self.price * self.insurance_rate_yearly) / 12, 2)
+        self.insurance_monthly = round((self.price * assumptions.insurance_rate_yearly) / 12, 2)
         
         # Calculate the down payment needed
-        self.down_payment_cost = round(self.price * self.down_payment_decimal, 2)
+        self.down_payment_cost = round(self.price * assumptions.down_payment_decimal, 2)
         
         # Calculate the loan needed
         self.loan = self.price - self.down_payment_cost
         
         # Calculate the closing costs required
-        self.closing_costs = self.price * self.closing_cost_buyer_decimal
+        self.closing_costs = self.price * assumptions.closing_cost_buyer_decimal
         
         # Calculate the monthly principle and interest payments
-        self.principle_interest_monthly = round((self.loan * (self.interest_rate / 12) * (1 + self.interest_rate / 12) ** (self.loan_term_yrs * 12)) / ((1 + self.interest_rate / 12) ** (self.loan_term_yrs * 12) - 1), 2)
+        self.principle_interest_monthly = round((self.loan * (assumptions.interest_rate / 12) * (1 + assumptions.interest_rate / 12) ** (assumptions.loan_term_yrs * 12)) / ((1 + assumptions.interest_rate / 12) ** (assumptions.loan_term_yrs * 12) - 1), 2)
         
         # Calculate the monthly taxes
         self.taxes_monthly = round(self.tax / 12, 2)
@@ -155,16 +585,16 @@ class House:
         self.suggested_total_rent_monthly = round(self.number_units * self.rent, 2)
         
         # Calculate the monthly repair expenses
-        self.total_repairs_monthly = round(self.suggested_total_rent_monthly * self.expected_repairs_monthly, 2)
+        self.total_repairs_monthly = round(self.suggested_total_rent_monthly * assumptions.expected_repairs_monthly, 2)
         
         # Calculate the monthly capital expenditures
-        self.total_capx_monthly = round(self.suggested_total_rent_monthly * self.expected_capx_monthly, 2)
+        self.total_capx_monthly = round(self.suggested_total_rent_monthly * assumptions.expected_capx_monthly, 2)
         
         # Calculate the monthly expected vacancy
-        self.total_vacancy_monthly = round(self.suggested_total_rent_monthly * self.expected_vacancy_monthly, 2)
+        self.total_vacancy_monthly = round(self.suggested_total_rent_monthly * assumptions.expected_vacancy_monthly, 2)
         
         # Calculate the monthly expected management fees
-        self.total_management_monthly = round(self.suggested_total_rent_monthly * self.expected_management_monthly, 2)
+        self.total_management_monthly = round(self.suggested_total_rent_monthly * assumptions.expected_management_monthly, 2)
         
         # Calculate the total amount of monthly expanses
         self.total_expenses_monthly = self.total_operating_costs_monthly + self.total_repairs_monthly + self.total_capx_monthly + self.total_vacancy_monthly + self.total_management_monthly
@@ -190,26 +620,56 @@ class House:
         # Calculate the pro forma cap
         self.pro_forma_cap_decimal = round(self.net_operating_income / self.price, 4)
         
-        # Declare lists for the property value, equity, loan balance, rent_growth, cashflow, profit if sold, and annualized return
-        self.year = []
-        self.property_value = []
-        self.loan_balance = []
-        self.equity = []
-        self.rent_growth = []
-        self.profit_if_sold = []
-        self.cash_flow_yearly = []
-        self.annualized_return_decimal = []
-        
-        # Loop though all the years of the loan term to determine yearly statistics of the property
-        for x in range(self.loan_term_yrs + 1):
-            self.year.append(x)
-            self.property_value.append(round(self.price * (1 + self.expected_annual_growth) ** x, 2))
-            self.loan_balance.append(round((self.principle_interest_monthly / (self.interest_rate / 12)) * (1 - (1 / ((1 + self.interest_rate / 12) ** (self.loan_term_yrs * 12 - x * 12)))), 2))
-            self.equity.append(round(self.property_value[x] - self.loan_balance[x], 2))
-            self.rent_growth.append(round(self.suggested_total_rent_monthly * (1 + self.expected_annual_growth) ** x, 2))
-            self.profit_if_sold.append(round(self.property_value[x] * (1 - self.closing_cost_seller_decimal) + sum(self.cash_flow_yearly) - self.cash_needed_total - self.loan_balance[x], 2))
-            self.cash_flow_yearly.append(round((self.rent_growth[x] * (1 - self.expected_repairs_monthly - self.expected_vacancy_monthly - self.expected_capx_monthly - self.expected_management_monthly) - (1 + self.expected_annual_growth) ** x * (self.insurance_monthly + self.taxes_monthly) - self.principle_interest_monthly)  * 12, 2))
-            self.annualized_return_decimal.append(round((((self.profit_if_sold[x] + self.cash_needed_total) / self.cash_needed_total) ** (1 / (x + 1)) - 1), 4))
+        # Clear any earlier projections, the property value, equity, loan balance, rent_growth, cashflow, profit if sold, and annualized return are only projected when they are first needed
+        self.projections = None
+        
+        
+    @property
+    def year(self):
+        """The year of each entry in the yearly projection, starting at 0 for the purchase year"""
+        return self.projection().period
+    
+    
+    @property
+    def property_value(self):
+        """The expected property value for each year of the loan term"""
+        return self.projection().property_value
+    
+    
+    @property
+    def loan_balance(self):
+        """The remaining loan balance for each year of the loan term"""
+        return self.projection().loan_balance
+    
+    
+    @property
+    def equity(self):
+        """The equity in the property for each year of the loan term"""
+        return self.projection().equity
+    
+    
+    @property
+    def rent_growth(self):
+        """The expected total monthly rent for each year of the loan term"""
+        return self.projection().rent_growth
+    
+    
+    @property
+    def profit_if_sold(self):
+        """The profit if the house was sold in each year of the loan term"""
+        return self.projection().profit_if_sold
+    
+    
+    @property
+    def cash_flow_yearly(self):
+        """The expected cash flow over each year of the loan term"""
+        return self.projection().cash_flow
+    
+    
+    @property
+    def annualized_return_decimal(self):
+        """The annualized return if the house was sold in each year of the loan term"""
+        return self.projection().annualized_return_decimal
             
             
     def email_format_html(self):
@@ -349,7 +809,7 @@ class House:
         Determines whether the house meets a set of predefined investment criteria. This method compares the house's financial metrics against target values specified by the investor or analysis criteria. The target values should be provided as a dictionary where the keys correspond to specific metrics of interest, and the values represent the minimum acceptable values for those metrics.
 
         Parameters:
-            target_values (dict): A dictionary containing the target investment criteria, with keys representing the metric names (e.g., "target_cash_flow_monthly_min", "target_percent_rule_min") and values representing the minimum acceptable values for those metrics.
+            target_values (dict or FeaturedHouseFilter): A dictionary containing the target investment criteria, with keys representing the metric names (e.g., "target_cash_flow_monthly_min", "target_percent_rule_min") and values representing the minimum acceptable values for those metrics, or a `FeaturedHouseFilter` already compiled from them. Pass a compiled filter when checking many houses.
 
         Returns:
             bool: True if the house meets or exceeds all the target criteria; False otherwise.
@@ -371,30 +831,11 @@ class House:
             This method is crucial for quickly identifying properties that align with an investor's specific financial goals and investment strategy. It allows for the automated screening of properties based on financial performance metrics, facilitating the investment decision-making process.
         """
 
-        # Establish all matches between the metrics in the config file and House class   
-        house_analytics_match = {
-            "target_cash_flow_monthly_min": self.cash_flow_monthly,
-            "target_percent_rule_min": self.percent_rule_decimal,
-            "target_net_operating_income_min": self.net_operating_income,
-            "target_pro_forma_cap_min": self.pro_forma_cap_decimal,
-            "target_five_year_annualized_return_min": self.annualized_return_decimal[5],
-            "target_cash_on_cash_return_min": self.cash_on_cash_decimal
-        }
+        # Compile the target values once unless they are already a compiled filter. The five year annualized return is checked last and only read when it is a target, so houses that fail on their headline metrics never calculate a projection
+        if not isinstance(target_values, FeaturedHouseFilter):
+            target_values = FeaturedHouseFilter(target_values)
         
-        # Loop through all of the potential target keys and target values available
-        for key, value in house_analytics_match.items():
-            # Determine if one of the keys in the potential target keys is also in the target keys
-            if key in target_values:
-                # Determine if the house value is equal to or greater than the target value
-                if target_values[key] <= value:
-                    pass
-                    
-                # If one key does not pass, return false
-                else:
-                    return False
-        
-        # If all keys pass, return true
-        return True
+        return target_values(self)
     
     
     def house_excel_sheet_creator(self, wb):
@@ -402,7 +843,7 @@ class House:
         Populates a new Excel sheet within a given workbook with the house's details and calculated financial metrics. This method systematically organizes key property information and investment analysis metrics into a structured Excel format, making it suitable for detailed review, comparison, and archival purposes.
 
         Parameters:
-            wb (Workbook): An open Excel workbook object within which the new sheet will be created. This workbook should be part of a library that supports Excel file manipulation (e.g., openpyxl, xlwt).
+            wb (Workbook): An open Excel workbook object within which the new sheet will be created. This workbook should be part of a library that supports Excel file manipulation (e.g., openpyxl, xlwt). Write-only openpyxl workbooks are supported, and the sheet is then written row by row once all of its cells are filled in.
 
         Returns:
             Worksheet: The newly created worksheet populated with the house's data and metrics. This includes general information about the property, financial figures, and projections that are essential for investment analysis.
@@ -429,6 +870,11 @@ class House:
         # Create a new sheet with the specified name
         sheet = wb.create_sheet(title=sheet_name)
         
+        # Write-only workbooks only accept whole rows, so collect the cells of the sheet first and write the rows once the sheet is complete
+        worksheet = sheet
+        if wb.write_only:
+            sheet = BufferedExcelSheet()
+        
         # Format the cells for percentages and currencies
         sheet = format_excel_sheet(sheet)
         
@@ -465,28 +911,28 @@ class House:
         sheet['B1'] = self.address
         sheet['B3'] = self.price
         sheet['B4'] = '=B5*B3'
-        sheet['B5'] = self.closing_cost_buyer_decimal
-        sheet['B6'] = self.expected_annual_growth
-        sheet['B9'] = self.down_payment_decimal
+        sheet['B5'] = self.assumptions.closing_cost_buyer_decimal
+        sheet['B6'] = self.assumptions.expected_annual_growth
+        sheet['B9'] = self.assumptions.down_payment_decimal
         sheet['B10'] = '=B3*B9'
         sheet['B11'] = '=B3-B10'
-        sheet['B12'] = self.interest_rate
-        sheet['B13'] = self.loan_term_yrs
+        sheet['B12'] = self.assumptions.interest_rate
+        sheet['B13'] = self.assumptions.loan_term_yrs
         sheet['B14'] = '=(B11*(B12/12)*(1+B12/12)^(B13*12))/((1+B12/12)^(B13*12)-1)'
         sheet['B17'] = self.suggested_total_rent_monthly
         sheet['B20'] = self.taxes_monthly
         sheet['B21'] = self.insurance_monthly
-        sheet['B22'] = self.expected_repairs_monthly
-        sheet['B23'] = self.expected_vacancy_monthly
-        sheet['B24'] = self.expected_capx_monthly
-        sheet['B25'] = self.expected_management_monthly
+        sheet['B22'] = self.assumptions.expected_repairs_monthly
+        sheet['B23'] = self.assumptions.expected_vacancy_monthly
+        sheet['B24'] = self.assumptions.expected_capx_monthly
+        sheet['B25'] = self.assumptions.expected_management_monthly
         sheet['B27'] = 0
         sheet['B28'] = '=B3*(1+B6)^B27'
         sheet['B29'] = '=B28-B30'
         sheet['B30'] = '=B3-B10'
         sheet['B31'] = '=(B17*(1+B6)^B27)'
         sheet['B32'] = '=(B31-B31*B22-B31*B23-B31*B24-B31*B25-B21*(1+B6)^B27-B20*(1+B6)^B27-B14)*12'
-        sheet['B33'] = f'=B28*(1-{self.closing_cost_seller_decimal})-E6-B30'
+        sheet['B33'] = f'=B28*(1-{self.assumptions.closing_cost_seller_decimal})-E6-B30'
         sheet['B34'] = '=((B33+E6)/E6)^(1/(B27+1))-1'
         sheet['C1'] = 'Beds'
         sheet['C19'] = 'Monthly'
@@ -502,7 +948,7 @@ class House:
         sheet['C30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-C27*12))))'
         sheet['C31'] = '=(B17*(1+B6)^C27)'
         sheet['C32'] = '=(C31-C31*B22-C31*B23-C31*B24-C31*B25-B21*(1+B6)^C27-B20*(1+B6)^C27-B14)*12'
-        sheet['C33'] = f'=C28*(1-{self.closing_cost_seller_decimal})+B32-E6-C30'
+        sheet['C33'] = f'=C28*(1-{self.assumptions.closing_cost_seller_decimal})+B32-E6-C30'
         sheet['C34'] = '=((C33+E6)/E6)^(1/(C27+1))-1'
         sheet['D1'] = self.beds
         sheet['D3'] = 'Income (mo)'
@@ -529,7 +975,7 @@ class House:
         sheet['D30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-D27*12))))'
         sheet['D31'] = '=(B17*(1+B6)^D27)'
         sheet['D32'] = '=(D31-D31*B22-D31*B23-D31*B24-D31*B25-B21*(1+B6)^D27-B20*(1+B6)^D27-B14)*12'
-        sheet['D33'] = f'=D28*(1-{self.closing_cost_seller_decimal})+sum(B32:C32)-E6-D30'
+        sheet['D33'] = f'=D28*(1-{self.assumptions.closing_cost_seller_decimal})+sum(B32:C32)-E6-D30'
         sheet['D34'] = '=((D33+E6)/E6)^(1/(D27+1))-1'
         sheet['E1'] = 'Baths'
         sheet['E3'] = '=B17'
@@ -549,7 +995,7 @@ class House:
         sheet['E30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-E27*12))))'
         sheet['E31'] = '=(B17*(1+B6)^E27)'
         sheet['E32'] = '=(E31-E31*B22-E31*B23-E31*B24-E31*B25-B21*(1+B6)^E27-B20*(1+B6)^E27-B14)*12'
-        sheet['E33'] = f'=E28*(1-{self.closing_cost_seller_decimal})+sum(B32:D32)-E6-E30'
+        sheet['E33'] = f'=E28*(1-{self.assumptions.closing_cost_seller_decimal})+sum(B32:D32)-E6-E30'
         sheet['E34'] = '=((E33+E6)/E6)^(1/(E27+1))-1'
         sheet['F1'] = self.baths
         sheet['F27'] = 4
@@ -558,7 +1004,7 @@ class House:
         sheet['F30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-F27*12))))'
         sheet['F31'] = '=(B17*(1+B6)^F27)'
         sheet['F32'] = '=(F31-F31*B22-F31*B23-F31*B24-F31*B25-B21*(1+B6)^F27-B20*(1+B6)^F27-B14)*12'
-        sheet['F33'] = f'=F28*(1-{self.closing_cost_seller_decimal})+sum(B32:E32)-E6-F30'
+        sheet['F33'] = f'=F28*(1-{self.assumptions.closing_cost_seller_decimal})+sum(B32:E32)-E6-F30'
         sheet['F34'] = '=((F33+E6)/E6)^(1/(F27+1))-1'
         sheet['G1'] = 'SQFT'
         sheet['G27'] = 5
@@ -567,7 +1013,7 @@ class House:
         sheet['G30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-G27*12))))'
         sheet['G31'] = '=(B17*(1+B6)^G27)'
         sheet['G32'] = '=(G31-G31*B22-G31*B23-G31*B24-G31*B25-B21*(1+B6)^G27-B20*(1+B6)^G27-B14)*12'
-        sheet['G33'] = f'=G28*(1-{self.closing_cost_seller_decimal})+sum(B32:F32)-E6-G30'
+        sheet['G33'] = f'=G28*(1-{self.assumptions.closing_cost_seller_decimal})+sum(B32:F32)-E6-G30'
         sheet['G34'] = '=((G33+E6)/E6)^(1/(G27+1))-1'
         sheet['H1'] = self.sqft
         sheet['H27'] = 10
@@ -576,88 +1022,710 @@ class House:
         sheet['H30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-H27*12))))'
         sheet['H31'] = '=(B17*(1+B6)^H27)'
         sheet['H32'] = '=(H31-H31*B22-H31*B23-H31*B24-H31*B25-B21*(1+B6)^H27-B20*(1+B6)^H27-B14)*12'
-        sheet['I27'] = self.loan_term_yrs
+        sheet['I27'] = self.assumptions.loan_term_yrs
         sheet['I28'] = '=B3*(1+B6)^I27'
         sheet['I29'] = '=I28-I30'
         sheet['I30'] = '=(B14/(B12/12))*(1-(1/((1+B12/12)^(B13*12-I27*12))))'
         sheet['I31'] = '=(B17*(1+B6)^I27)'
         sheet['I32'] = '=(I31-I31*B22-I31*B23-I31*B24-I31*B25-B21*(1+B6)^I27-B20*(1+B6)^I27-B14)*12'
+        
+        # Write the collected rows to a write-only sheet
+        if wb.write_only:
+            sheet.write_rows(worksheet)
 
-        return sheet
+        return worksheet
+    
+    
+    def projection(self, periods_per_year=1):
+        """
+        Returns the house's lazy `HouseProjection` for the given number of periods per year. The yearly projection backs the house's projection attributes (`property_value`, `loan_balance`, `cash_flow_yearly`, etc.), but any number of periods per year that divides evenly into 12 months can be requested, such as a monthly projection.
 
+        Each projection is created the first time it is requested and kept on the house, and it only calculates the periods that are actually read. A house that is only screened on its headline metrics never calculates a projection at all.
 
-def analyze_all_houses(config, data):
-    """Function to analyze all the given JSON data using the House class and return a list of analyzed and error houses"""
-    # Create a list with all the analyzed houses
-    analyzed_houses = []
-    
-    # Create a list with all the houses lacking key values
-    error_houses = []
+        Parameters:
+            periods_per_year (int): The number of periods in each year of the projection. Use 1 for a yearly projection or 12 for a monthly projection.
 
-    # Establish the required values to analyze a house
-    required_house_values = {
-        "price": lambda x: is_convertible_to_float(x) and float(x) > 0,
-        "rent": lambda x: is_convertible_to_float(x) and float(x) > 0,
-        "sqft": lambda x: is_convertible_to_float(x) and float(x) > 0,
-        "tax": lambda x: is_convertible_to_float(x) and float(x) > 0
-    }
-    
-    def house_json_error_message(key, error, json_data):
-        """Function to define error messages for the homedata.json file"""
-        # Error message for if a value is missing
-        if error == "missing":
-            error_message = f'"{key}" is missing for {json_data['address']} in the housedata.json file.'
-        # Error message for if a value is incorrect
-        elif error == "incorrect":
-            error_message = f'"{key}" for {json_data['address']} is incorrectly entered in the housedata.json file.'
-        # Error message to handle if it was not a number that was entered
-        elif error == "number":
-            error_message = f'"{key}" for {json_data['address']} is not a valid number in the housedata.json file.'
-        # General error message to handle all other issues
-        else:
-            error_message = "An error has occurred while verifying data from the housedata.json file."
-            
-        return error_message
+        Returns:
+            HouseProjection: The projection with one entry per period from the purchase until the end of the loan term.
 
-    # Loop through each of the houses in the dataset and create an excel sheet for that house
-    for house_data in data:
-        # Append error messages to the list if any error messages are generated 
-        error_messages = verify_all_required_values(required_house_values, house_data, house_json_error_message)
-        if not error_messages:
-            house = House(config, house_data)
-            analyzed_houses.append(house)
-        
-        # If the calculation values for a house cannot be verified, add it to a list of error_houses
-        else:
-            for error in error_messages:
-                print(error)
-            error_houses.append(house_data['address'])
+        Example Usage:
+            house = House(config, data)  # Assuming `config` and `data` are predefined dictionaries with property and financial info.
+            monthly_projection = house.projection(periods_per_year=12)
+            # `monthly_projection.cash_flow[:12]` calculates and returns the expected cash flow for each month of the first year.
+        """
+        # Create the projection the first time it is requested
+        if self.projections is None:
+            self.projections = {}
+        if periods_per_year not in self.projections:
+            self.projections[periods_per_year] = HouseProjection(self, periods_per_year)
         
-    return analyzed_houses, error_houses
+        return self.projections[periods_per_year]
 
 
-def config_file_required_email_values_present(config):
-    """Function to verify and return a dictionary of all the required email values and return false otherwise"""
-    
-    # Establish error messages for feedback to the user
-    error_messages = []
+class HouseAssumptions(namedtuple('HouseAssumptions', ['down_payment_decimal', 'closing_cost_buyer_decimal', 'closing_cost_seller_decimal', 'expected_annual_growth', 'interest_rate', 'loan_term_yrs', 'expected_repairs_monthly', 'expected_vacancy_monthly', 'expected_capx_monthly', 'expected_management_monthly', 'insurance_rate_yearly'])):
+    """
+    Represents the financial assumptions from the config file that are used to analyze every house.
+
+    The assumptions are immutable, so a single `HouseAssumptions` object can safely be shared by every `House` and `HouseBatch` analyzed with the same config instead of copying each config value onto every house.
+
+    Attributes:
+        down_payment_decimal (float): The fraction of the purchase price that must be paid upfront as a down payment.
+        closing_cost_buyer_decimal (float): The fraction of the purchase price that covers the buyer's closing costs.
+        closing_cost_seller_decimal (float): The fraction of the purchase price that covers the seller's closing costs.
+        expected_annual_growth (float): The expected annual growth rate of the property's value.
+        interest_rate (float): The annual interest rate of the mortgage.
+        loan_term_yrs (int): The term of the mortgage loan in years.
+        expected_repairs_monthly (float): The monthly cost of repairs as a fraction of the rent.
+        expected_vacancy_monthly (float): The monthly cost associated with vacancy as a fraction of the rent.
+        expected_capx_monthly (float): The monthly cost of capital expenditures as a fraction of the rent.
+        expected_management_monthly (float): The monthly cost of property management as a fraction of the rent.
+        insurance_rate_yearly (float): The yearly insurance rate as a fraction of the property's value.
+
+    Methods:
+        from_config(cls, config):
+            Creates the assumptions from a config dictionary. An existing `HouseAssumptions` object is returned as it is so it can be shared.
+        grid(cls, config, assumption_ranges):
+            Creates assumptions holding every combination of the given assumption values so a `HouseBatch` can analyze all the scenarios at once.
+    """
+    __slots__ = ()
     
-    # Verify that the user wants emails
-    if config['send_emails']:
-        # Establish all the variables required for email in the config file
-        required_config_email_values = {
-            "email_sender_address": lambda x: isinstance(x, str) and "@" in x,
-            "email_receiver_address": lambda x: isinstance(x, str) and "@" in x,
-            "email_2FA_password": lambda x: isinstance(x, str),
-            "send_error_emails": lambda x: isinstance(x, bool),
-            "featured_house_required": lambda x: isinstance(x, bool)       
-        }
+    @classmethod
+    def from_config(cls, config):
+        """Create the assumptions from the config file values, or return the given assumptions if they were already created"""
+        if isinstance(config, HouseAssumptions):
+            return config
         
-        def email_config_error_message(key, error, json_data=None):
-            """Function to define error messages for the email config file"""
-            # Error message for if a value is missing
-            if error == "missing":
-                error_message = f'"{key}" is not in the config file. Please enter "{key}" in the config file.'
+        return cls(**{field: config[field] for field in cls._fields})
+    
+    
+    @classmethod
+    def grid(cls, config, assumption_ranges):
+        """
+        Creates the assumptions for every combination (the Cartesian product) of the given assumption values. Each swept assumption becomes a NumPy column with one value per scenario, while the assumptions that are not swept keep their single config value.
+
+        Parameters:
+            config (dict or HouseAssumptions): The config values used for every assumption that is not swept.
+            assumption_ranges (dict): The values to try for each swept assumption, keyed by the assumption name (e.g., `{"interest_rate": [0.05, 0.06, 0.07]}`).
+
+        Returns:
+            tuple: The `HouseAssumptions` for the whole grid and a list with a dictionary of the swept values for each scenario, in the same order as the scenario axis.
+
+        Example Usage:
+            assumptions, scenarios = HouseAssumptions.grid(config, {"interest_rate": [0.05, 0.06], "down_payment_decimal": [0.1, 0.2]})
+            house_batch = HouseBatch(assumptions, data)
+            # `house_batch.cash_flow_monthly[2]` holds the cash flow of every house for `scenarios[2]`, an interest rate of 0.06 with a down payment of 0.1.
+        """
+        # Verify that only financial assumptions are swept
+        if not assumption_ranges:
+            raise ValueError("At least one assumption must be given to create a grid of scenarios.")
+        for field, values in assumption_ranges.items():
+            if field not in cls._fields:
+                raise ValueError(f'"{field}" is not a financial assumption that can be swept.')
+            if len(values) == 0:
+                raise ValueError(f'No values were given to sweep "{field}".')
+        
+        # Create a scenario for every combination of the swept values
+        scenarios = [dict(zip(assumption_ranges, values)) for values in product(*assumption_ranges.values())]
+        
+        # Replace each swept assumption with a column of its value in every scenario
+        swept_assumptions = {field: np.array([scenario[field] for scenario in scenarios])[:, np.newaxis] for field in assumption_ranges}
+        
+        return cls.from_config(config)._replace(**swept_assumptions), scenarios
+
+
+class HouseBatch:
+    """
+    Represents a whole list of houses as NumPy columns so every financial metric can be calculated for all the houses at once instead of one `House` at a time.
+
+    Every metric uses the same name and formula as the `House` class and gives the same values, but each metric is a NumPy array with one entry per house. The yearly projections are NumPy arrays with one row per house and one column per year of the loan term (houses x years).
+
+    The assumptions can also hold a grid of scenarios (see `HouseAssumptions.grid`), where each swept assumption is a column with one value per scenario. Every metric that depends on a swept assumption then gains a leading scenario axis (scenarios x houses, and scenarios x houses x years for the projections), while the metrics that do not keep one value per house and broadcast against them, so every house is analyzed under every scenario in the same pass.
+
+    Attributes:
+        address (list): The street address of each house.
+        url (list): URL to each house's listing page.
+        property_subtype (list): The property subtype of each house (e.g., duplex, triplex, etc.).
+        price (ndarray): The listing price of each house.
+        sqft (ndarray): The square footage of each house.
+        tax (ndarray): The yearly taxes for each house.
+        rent (ndarray): The estimated monthly rent for each house.
+        assumptions (HouseAssumptions): The financial assumptions from the config file, shared by every house in the batch. Each assumption can also be read directly from the batch (e.g., `house_batch.interest_rate`).
+        projection_yrs (int): The number of years projected, which defaults to the loan term. A shorter horizon skips the later years when only the first few are needed.
+
+    Methods:
+        calculate_metrics(self):
+            Calculates the same metrics as `House.calculate_metrics` for every house in the batch using NumPy array operations.
+        featured_home_mask(self, target_values):
+            Determines which houses meet the target investment criteria, returning a boolean array instead of checking one house at a time.
+
+    Note:
+        The house data given to this class should already be verified with `verify_house_data_values`. Use `analyze_all_houses_batch` to verify and analyze the houses in one step.
+    """
+    def __init__(self, config, data, projection_yrs=None):
+
+        self.address = [house_data.get('address') for house_data in data]
+        self.url = [house_data.get('url') for house_data in data]
+        self.property_subtype = [house_data.get('property_subtype') for house_data in data]
+        self.price = np.array([float(house_data.get('price')) for house_data in data], dtype=float)
+        self.sqft = np.array([float(house_data.get('sqft')) for house_data in data], dtype=float)
+        self.tax = np.array([float(house_data.get('tax')) for house_data in data], dtype=float)
+        self.rent = np.array([float(house_data.get('rent')) for house_data in data], dtype=float)
+        self.assumptions = HouseAssumptions.from_config(config)
+        
+        # Project over the whole loan term unless a shorter horizon is requested
+        shortest_loan_term_yrs = int(np.min(self.assumptions.loan_term_yrs))
+        self.projection_yrs = shortest_loan_term_yrs if projection_yrs is None else projection_yrs
+        if not 0 <= self.projection_yrs <= shortest_loan_term_yrs:
+            raise ValueError(f"The projection horizon must be between 0 and {shortest_loan_term_yrs} years.")
+        
+        self.calculate_metrics()
+
+
+    def __getattr__(self, name):
+        # Read the financial assumptions shared by all the houses as if they were attributes of the batch
+        if name in HouseAssumptions._fields:
+            return getattr(self.assumptions, name)
+        raise AttributeError(f"'HouseBatch' object has no attribute '{name}'")
+    
+    
+    def __len__(self):
+        return len(self.price)
+
+
+    def calculate_metrics(self):
+        """
+        Calculates the financial and operational metrics for every house in the batch. Each calculation mirrors the matching line in `House.calculate_metrics`, keeping the same order of operations and rounding, so the arrays hold exactly the values the `House` class would calculate for each house.
+
+        The factors that only depend on the config values (the yearly growth factors and the loan amortization factors) are calculated once for each scenario with plain Python numbers, just like the `House` class calculates them. All the per house calculations are NumPy array operations, so the cost of the analysis grows with the size of the arrays rather than with the number of Python loops.
+        """
+        assumptions = self.assumptions
+        
+        # Calculate the price per sqft
+        self.price_per_sqft = round_array(self.price / self.sqft, 2)
+
+        # Calculate the monthly insurance
+        self.insurance_monthly = round_array((self.price * assumptions.insurance_rate_yearly) / 12, 2)
+
+        # Calculate the down payment needed
+        self.down_payment_cost = round_array(self.price * assumptions.down_payment_decimal, 2)
+
+        # Calculate the loan needed
+        self.loan = self.price - self.down_payment_cost
+
+        # Calculate the closing costs required
+        self.closing_costs = self.price * assumptions.closing_cost_buyer_decimal
+
+        # Calculate the monthly principle and interest payments using the compounding factor shared by every house
+        compounding_factor = scenario_values(lambda interest_rate, loan_term_yrs: (1 + interest_rate / 12) ** (loan_term_yrs * 12), assumptions.interest_rate, assumptions.loan_term_yrs)
+        self.principle_interest_monthly = round_array((self.loan * (assumptions.interest_rate / 12) * compounding_factor) / (compounding_factor - 1), 2)
+
+        # Calculate the monthly taxes
+        self.taxes_monthly = round_array(self.tax / 12, 2)
+
+        # Calculate the operating costs
+        self.total_operating_costs_monthly = round_array(self.principle_interest_monthly + self.taxes_monthly + self.insurance_monthly, 2)
+
+        # Determine how many units are contained in each property
+        property_subtypes = {
+            'duplex': 2,
+            'triplex': 3,
+            'quadplex': 4,
+            'quinplex': 5
+        }
+
+        self.number_units = np.array([property_subtypes.get(property_subtype, 1) for property_subtype in self.property_subtype], dtype=int)
+
+        # Calculate the suggested total rent for the units
+        self.suggested_total_rent_monthly = round_array(self.number_units * self.rent, 2)
+
+        # Calculate the monthly repair expenses
+        self.total_repairs_monthly = round_array(self.suggested_total_rent_monthly * assumptions.expected_repairs_monthly, 2)
+
+        # Calculate the monthly capital expenditures
+        self.total_capx_monthly = round_array(self.suggested_total_rent_monthly * assumptions.expected_capx_monthly, 2)
+
+        # Calculate the monthly expected vacancy
+        self.total_vacancy_monthly = round_array(self.suggested_total_rent_monthly * assumptions.expected_vacancy_monthly, 2)
+
+        # Calculate the monthly expected management fees
+        self.total_management_monthly = round_array(self.suggested_total_rent_monthly * assumptions.expected_management_monthly, 2)
+
+        # Calculate the total amount of monthly expanses
+        self.total_expenses_monthly = self.total_operating_costs_monthly + self.total_repairs_monthly + self.total_capx_monthly + self.total_vacancy_monthly + self.total_management_monthly
+
+        # Calculate the total expected monthly cash flow
+        self.cash_flow_monthly = round_array(self.suggested_total_rent_monthly - self.total_expenses_monthly, 2)
+
+        # Calculate the expected cash flow from the 50% rule
+        self.cash_flow_50 = round_array(self.suggested_total_rent_monthly / 2 - self.principle_interest_monthly, 2)
+
+        # Calculate the total cash needed to complete the deal
+        self.cash_needed_total = self.down_payment_cost + self.closing_costs
+
+        # Calculate the cash on cash return for the property
+        self.cash_on_cash_decimal = round_array(self.suggested_total_rent_monthly / self.cash_needed_total, 4)
+
+        # Calculate the 1% rule
+        self.percent_rule_decimal = round_array(self.suggested_total_rent_monthly / self.price, 4)
+
+        # Calculate the Net Operating Income
+        self.net_operating_income = self.suggested_total_rent_monthly * 12 - (self.taxes_monthly + self.insurance_monthly + self.total_repairs_monthly + self.total_capx_monthly + self.total_vacancy_monthly + self.total_management_monthly) * 12
+
+        # Calculate the pro forma cap
+        self.pro_forma_cap_decimal = round_array(self.net_operating_income / self.price, 4)
+
+        # Calculate the growth and loan balance factors for each year of the projection once for each scenario
+        self.year = np.arange(self.projection_yrs + 1)
+        factors = scenario_values(lambda expected_annual_growth, interest_rate, loan_term_yrs: list(islice(projection_factors(expected_annual_growth, interest_rate, loan_term_yrs), self.projection_yrs + 1)), assumptions.expected_annual_growth, assumptions.interest_rate, assumptions.loan_term_yrs)
+        growth_factors, loan_balance_factors = factors[..., 0], factors[..., 1]
+        annualized_return_exponents = np.array([1 / (x + 1) for x in range(self.projection_yrs + 1)])
+        
+        # Give the assumptions used in the projections a year axis so they line up with the projections of every scenario
+        rent_after_expenses_decimal = np.asarray(1 - assumptions.expected_repairs_monthly - assumptions.expected_vacancy_monthly - assumptions.expected_capx_monthly - assumptions.expected_management_monthly)[..., np.newaxis]
+        sale_after_closing_decimal = np.asarray(1 - assumptions.closing_cost_seller_decimal)[..., np.newaxis]
+
+        # Calculate the yearly projections for every house, with one row per house and one column per year
+        self.property_value = round_array(self.price[..., np.newaxis] * growth_factors, 2)
+        self.loan_balance = round_array((self.principle_interest_monthly / (assumptions.interest_rate / 12))[..., np.newaxis] * loan_balance_factors, 2)
+        self.equity = round_array(self.property_value - self.loan_balance, 2)
+        self.rent_growth = round_array(self.suggested_total_rent_monthly[..., np.newaxis] * growth_factors, 2)
+        self.cash_flow_yearly = round_array((self.rent_growth * rent_after_expenses_decimal - growth_factors * (self.insurance_monthly + self.taxes_monthly)[..., np.newaxis] - self.principle_interest_monthly[..., np.newaxis]) * 12, 2)
+
+        # Total the cash flow from all of the years before each year of the projection
+        cash_flow_before_year = np.zeros_like(self.cash_flow_yearly)
+        cash_flow_before_year[..., 1:] = np.cumsum(self.cash_flow_yearly[..., :-1], axis=-1)
+
+        self.profit_if_sold = round_array(self.property_value * sale_after_closing_decimal + cash_flow_before_year - self.cash_needed_total[..., np.newaxis] - self.loan_balance, 2)
+
+        # Houses that lose more than the cash needed have no real annualized return and are left as nan
+        total_return_ratio = (self.profit_if_sold + self.cash_needed_total[..., np.newaxis]) / self.cash_needed_total[..., np.newaxis]
+        with np.errstate(invalid='ignore'):
+            self.annualized_return_decimal = round_array(
+                np.power(total_return_ratio, annualized_return_exponents) - 1, 4,
+                exact=lambda index: float(total_return_ratio[index]) ** float(annualized_return_exponents[index[-1]]) - 1
+            )
+
+
+    def featured_home_mask(self, target_values):
+        """
+        Determines which houses in the batch meet the investment criteria, the same way `House.featured_home_determiner` does for a single house, but for every house (and every scenario) at once.
+
+        Parameters:
+            target_values (dict or FeaturedHouseFilter): A dictionary containing the target investment criteria, with keys representing the metric names (e.g., "target_cash_flow_monthly_min") and values representing the minimum acceptable values for those metrics, or a `FeaturedHouseFilter` already compiled from them.
+
+        Returns:
+            ndarray: A boolean array with the same shape as the headline metrics that is True for each house that meets or exceeds all the target criteria.
+        """
+        # Compile the target values once unless they are already a compiled filter
+        if not isinstance(target_values, FeaturedHouseFilter):
+            target_values = FeaturedHouseFilter(target_values)
+        
+        return target_values.mask(self)
+
+
+class HouseProjection:
+    """
+    Projects a house's property value, loan balance, equity, rent, cash flow, profit if sold, and annualized return period by period over the loan term.
+
+    The projection is an incremental engine: each new period is calculated from the previous one by carrying a running total of the cash flow and running growth and loan discount factors from `projection_factors`, so extending the projection costs the same for every period no matter how long the horizon is. This keeps long loan terms and monthly projections cheap.
+
+    The projection is also lazy. Nothing is calculated when it is created, and each series is a `ProjectionSeries` that only extends the projection as far as the periods that are actually read. Every calculated period is kept in a compact `array('d')` buffer, so each period is only ever calculated once.
+
+    Attributes:
+        house (House): The analyzed house being projected.
+        periods_per_year (int): The number of periods in each year of the projection (1 for yearly, 12 for monthly).
+        last_period (int): The index of the last period of the loan term.
+        calculated_periods (int): The number of periods calculated so far.
+        values (dict): The calculated values for each series, keyed by the series name, stored as `array('d')` buffers.
+        period (ProjectionSeries): The index of each period, starting at 0 for the purchase.
+        property_value (ProjectionSeries): The expected property value for each period.
+        loan_balance (ProjectionSeries): The remaining loan balance for each period.
+        equity (ProjectionSeries): The property value minus the loan balance for each period.
+        rent_growth (ProjectionSeries): The expected total monthly rent for each period.
+        profit_if_sold (ProjectionSeries): The profit if the house was sold at the start of each period, including all the cash flow from the earlier periods.
+        cash_flow (ProjectionSeries): The expected cash flow over each period.
+        annualized_return_decimal (ProjectionSeries): The annualized return if the house was sold at the start of each period.
+
+    Methods:
+        extend_to(self, period):
+            Calculates every period of the projection up to and including the given period.
+    """
+    __slots__ = ('house', 'periods_per_year', 'last_period', 'calculated_periods', 'values', 'cash_flow_total', 'factors')
+    
+    series_names = ('period', 'property_value', 'loan_balance', 'equity', 'rent_growth', 'profit_if_sold', 'cash_flow', 'annualized_return_decimal')
+    
+    def __init__(self, house, periods_per_year=1):
+        
+        self.house = house
+        self.periods_per_year = periods_per_year
+        self.last_period = house.assumptions.loan_term_yrs * periods_per_year
+        self.calculated_periods = 0
+        
+        # The period series is just the index of each period, so only the other series need to be stored
+        self.values = {name: array('d') for name in self.series_names if name != 'period'}
+        
+        # Keep a running total of the cash flow from all of the periods calculated so far
+        self.cash_flow_total = 0
+        
+        # Generate the growth and loan balance factors one period at a time
+        self.factors = projection_factors(house.assumptions.expected_annual_growth, house.assumptions.interest_rate, house.assumptions.loan_term_yrs, periods_per_year)
+        
+        
+    def __getattr__(self, name):
+        # Return a lazy view of any of the projected series
+        if name in HouseProjection.series_names:
+            return ProjectionSeries(self, name)
+        raise AttributeError(f"'HouseProjection' object has no attribute '{name}'")
+        
+        
+    def __len__(self):
+        return self.last_period + 1
+    
+    
+    def extend_to(self, period):
+        """Calculate every period of the projection up to and including the given period. Periods that were already calculated are not calculated again"""
+        house = self.house
+        assumptions = house.assumptions
+        values = self.values
+        property_value = values['property_value']
+        loan_balance = values['loan_balance']
+        rent_growth = values['rent_growth']
+        profit_if_sold = values['profit_if_sold']
+        cash_flow = values['cash_flow']
+        
+        # Determine the amount of months in each period and the share of the rent left after all of the rent based expenses
+        months_per_period = 12 / self.periods_per_year
+        rent_after_expenses_decimal = 1 - assumptions.expected_repairs_monthly - assumptions.expected_vacancy_monthly - assumptions.expected_capx_monthly - assumptions.expected_management_monthly
+        
+        # Loop through all the periods that have not been calculated yet, stopping at the end of the loan term
+        for x in range(self.calculated_periods, min(period, self.last_period) + 1):
+            growth_factor, loan_balance_factor = next(self.factors)
+            
+            property_value.append(round(house.price * growth_factor, 2))
+            loan_balance.append(round((house.principle_interest_monthly / (assumptions.interest_rate / 12)) * loan_balance_factor, 2))
+            values['equity'].append(round(property_value[x] - loan_balance[x], 2))
+            rent_growth.append(round(house.suggested_total_rent_monthly * growth_factor, 2))
+            profit_if_sold.append(round(property_value[x] * (1 - assumptions.closing_cost_seller_decimal) + self.cash_flow_total - house.cash_needed_total - loan_balance[x], 2))
+            cash_flow.append(round((rent_growth[x] * rent_after_expenses_decimal - growth_factor * (house.insurance_monthly + house.taxes_monthly) - house.principle_interest_monthly) * months_per_period, 2))
+            
+            # A house that loses more than the cash needed has no real annualized return after the first period, which matches the nan values from HouseBatch
+            total_return_ratio = (profit_if_sold[x] + house.cash_needed_total) / house.cash_needed_total
+            annualized_return_exponent = 1 / (x / self.periods_per_year + 1)
+            values['annualized_return_decimal'].append(round((total_return_ratio ** annualized_return_exponent - 1), 4) if total_return_ratio >= 0 or annualized_return_exponent == 1 else float('nan'))
+            
+            # Add the cash flow from this period to the running total for the next period
+            self.cash_flow_total += cash_flow[x]
+            self.calculated_periods = x + 1
+        
+        return self
+
+
+class MonteCarloSimulation:
+    """
+    Simulates the projections of every house across many random paths of growth, vacancy, repairs, and interest rates, and reports percentile bands for the profit if sold and the annualized return of each house for each year.
+
+    Each simulation path draws a growth rate, a vacancy rate, and a repair rate for every year around the config values, along with an interest rate that is locked in at the purchase, since the loan is a fixed rate mortgage. None of the paths depend on the house, and each projected profit is a sum of four house values (the price, the total monthly rent, the monthly insurance and taxes, and the loan) times factors that only depend on the path. The factors for every path are calculated once, so the profits of a chunk of houses across every path are a single matrix multiplication. The chunks of houses are spread across a process pool, and each chunk is reduced to its percentiles before it is returned.
+
+    Attributes:
+        simulations (int): The number of simulated paths.
+        projection_yrs (int): The number of years projected, which defaults to the loan term.
+        percentiles (tuple): The percentiles reported for each house and year.
+        volatility (dict): The standard deviation of each simulated assumption, keyed by the assumption name.
+        address (list): The street address of each analyzed house.
+        url (list): URL to each analyzed house's listing page.
+        error_houses (list): The address of each house lacking the values needed for the analysis.
+        year (ndarray): The years of the projection, starting at 0 for the purchase.
+        profit_if_sold (ndarray): The profit if sold at each percentile, with one row per house, one column per percentile, and one entry per year (houses x percentiles x years).
+        annualized_return_decimal (ndarray): The annualized return at each percentile, with the same shape as `profit_if_sold`.
+
+    Methods:
+        sample_path_factors(self, assumptions, rng):
+            Draws the random paths and returns the factors that turn the house values into the profit if sold for every path and year.
+
+    Note:
+        The simulated values are not rounded at each step like the `House` class, since the rounding is far smaller than the spread of the simulation. With no volatility every path follows the config values and the results match the `House` projections to within a few cents of rounding. The annualized return only grows with the profit, so its percentiles are calculated from the profit percentiles.
+
+    Example Usage:
+        simulation = MonteCarloSimulation(config, data, simulations=10000, seed=1)
+        # `simulation.annualized_return_decimal[0, :, 5]` holds the 5th, 25th, 50th, 75th, and 95th percentile five year annualized return of the first house.
+    """
+    default_volatility = {
+        "expected_annual_growth": 0.05,
+        "expected_vacancy_monthly": 0.03,
+        "expected_repairs_monthly": 0.02,
+        "interest_rate": 0.01
+    }
+    
+    def __init__(self, config, data, simulations=10000, projection_yrs=None, percentiles=(5, 25, 50, 75, 95), volatility=None, seed=None, workers=None, chunk_size=None):
+        
+        self.simulations = simulations
+        self.percentiles = tuple(percentiles)
+        self.volatility = dict(self.default_volatility, **(volatility or {}))
+        
+        # Parse the houses and calculate the headline metrics each simulation starts from
+        verified_house_data, self.error_houses = verify_all_house_data(data)
+        house_batch = HouseBatch(config, verified_house_data, projection_yrs=0)
+        self.address = house_batch.address
+        self.url = house_batch.url
+        assumptions = house_batch.assumptions
+        
+        # Project over the whole loan term unless a shorter horizon is requested
+        self.projection_yrs = assumptions.loan_term_yrs if projection_yrs is None else projection_yrs
+        if not 0 <= self.projection_yrs <= assumptions.loan_term_yrs:
+            raise ValueError(f"The projection horizon must be between 0 and {assumptions.loan_term_yrs} years.")
+        self.year = np.arange(self.projection_yrs + 1)
+        
+        # Draw the paths once so every house is simulated on the same paths
+        path_factors = self.sample_path_factors(assumptions, np.random.default_rng(seed))
+        
+        # Collect the house values that are multiplied by the path factors
+        house_values = np.column_stack([house_batch.price, house_batch.suggested_total_rent_monthly, house_batch.insurance_monthly + house_batch.taxes_monthly, house_batch.loan])
+        cash_needed_total = house_batch.cash_needed_total
+        
+        # Split the houses into a few chunks for each worker
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(house_batch) // (workers * 4)))
+        chunks = [slice(chunk_start, chunk_start + chunk_size) for chunk_start in range(0, len(house_batch), chunk_size)]
+        house_value_chunks = [house_values[chunk] for chunk in chunks]
+        cash_needed_chunks = [cash_needed_total[chunk] for chunk in chunks]
+        
+        # Simulate the chunks on a process pool, unless there is only one worker or one chunk to simulate
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(simulate_house_chunk, house_value_chunks, cash_needed_chunks, repeat(path_factors), repeat(self.percentiles)))
+        else:
+            results = list(map(simulate_house_chunk, house_value_chunks, cash_needed_chunks, repeat(path_factors), repeat(self.percentiles)))
+        
+        # Combine the percentile bands of every chunk in the original order of the houses
+        empty_bands = np.empty((0, len(self.percentiles), len(self.year)))
+        self.profit_if_sold = np.concatenate([empty_bands] + [profit_bands for profit_bands, _ in results])
+        self.annualized_return_decimal = np.concatenate([empty_bands] + [annualized_return_bands for _, annualized_return_bands in results])
+
+
+    def sample_path_factors(self, assumptions, rng):
+        """
+        Draws the random growth, vacancy, repair, and interest rate paths and turns them into the factors of the profit if sold. The profit if sold of a house for a path and year is the price, the total monthly rent, the monthly insurance and taxes, and the loan, each times its factor, minus the cash needed.
+
+        Parameters:
+            assumptions (HouseAssumptions): The financial assumptions each path is drawn around.
+            rng (Generator): The NumPy random number generator used to draw the paths.
+
+        Returns:
+            ndarray: The factors of the four house values for each year of each path (4 x years x paths).
+        """
+        number_years = self.projection_yrs + 1
+        
+        # Draw a growth rate for each year before the last, and a vacancy rate and repair rate for every year of each path
+        growth = rng.normal(assumptions.expected_annual_growth, self.volatility["expected_annual_growth"], (number_years - 1, self.simulations))
+        vacancy = np.clip(rng.normal(assumptions.expected_vacancy_monthly, self.volatility["expected_vacancy_monthly"], (number_years, self.simulations)), 0, 1)
+        repairs = np.clip(rng.normal(assumptions.expected_repairs_monthly, self.volatility["expected_repairs_monthly"], (number_years, self.simulations)), 0, 1)
+        
+        # Draw the interest rate locked in for each path, keeping it above zero
+        monthly_interest_rate = np.clip(rng.normal(assumptions.interest_rate, self.volatility["interest_rate"], self.simulations), 1e-4, None) / 12
+        
+        # Compound the growth of each path to find its growth factor for each year
+        growth_factors = np.ones((number_years, self.simulations))
+        growth_factors[1:] = np.cumprod(1 + growth, axis=0)
+        rent_after_expenses = growth_factors * (1 - repairs - vacancy - assumptions.expected_capx_monthly - assumptions.expected_management_monthly)
+        
+        # Total the rent after expenses and the growth of insurance and taxes from all of the years before each year
+        rent_before_year = np.zeros_like(rent_after_expenses)
+        rent_before_year[1:] = np.cumsum(rent_after_expenses[:-1], axis=0)
+        growth_before_year = np.zeros_like(growth_factors)
+        growth_before_year[1:] = np.cumsum(growth_factors[:-1], axis=0)
+        
+        # Calculate the monthly payment for each dollar of the loan, and the loan balance left for each dollar of monthly payment
+        compounding_factor = (1 + monthly_interest_rate) ** (assumptions.loan_term_yrs * 12)
+        payment_per_loan = monthly_interest_rate * compounding_factor / (compounding_factor - 1)
+        years = np.arange(number_years)[:, np.newaxis]
+        loan_balance_per_payment = (1 - (1 + monthly_interest_rate) ** (-12 * (assumptions.loan_term_yrs - years))) / monthly_interest_rate
+        
+        return np.stack([
+            growth_factors * (1 - assumptions.closing_cost_seller_decimal),
+            12 * rent_before_year,
+            -12 * growth_before_year,
+            -payment_per_loan * (12 * years + loan_balance_per_payment)
+        ])
+
+
+class ProjectionSeries(Sequence):
+    """
+    A read only, list like view of one series of a `HouseProjection` (property value, loan balance, etc.) that calculates the projection lazily.
+
+    Reading a period or a slice of periods only extends the projection as far as the last period read, so asking for the first five years of a thirty year projection only ever calculates those five years. Slices are returned as plain lists so they can be combined with other lists for the email and Excel tables.
+
+    Attributes:
+        projection (HouseProjection): The projection the series belongs to.
+        name (str): The name of the series in the projection (e.g., 'property_value').
+    """
+    __slots__ = ('projection', 'name')
+    
+    def __init__(self, projection, name):
+        
+        self.projection = projection
+        self.name = name
+        
+    
+    def __len__(self):
+        return len(self.projection)
+    
+    
+    def __getitem__(self, index):
+        # Determine which periods were requested, handling negative indexes and slices the same way a list does
+        if isinstance(index, slice):
+            periods = range(len(self))[index]
+            if periods:
+                self.projection.extend_to(max(periods))
+            return [self._value(period) for period in periods]
+        
+        try:
+            period = range(len(self))[index]
+        except IndexError:
+            raise IndexError(f"{self.name} index out of range") from None
+        
+        # Only calculate the projection up to the period requested
+        self.projection.extend_to(period)
+        return self._value(period)
+    
+    
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, ProjectionSeries)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    
+    def _value(self, period):
+        # The period series is the index of each period, every other series is stored in the projection
+        if self.name == 'period':
+            return period
+        return self.projection.values[self.name][period]
+
+
+def analyze_all_houses(config, data, workers=1, parallel_threshold=10000):
+    """Function to analyze all the given JSON data using the House class and return a list of analyzed and error houses. When there are more workers than one and at least `parallel_threshold` houses, the data is split into chunks that are analyzed on a process pool, and smaller datasets stay in this process to avoid the cost of starting the pool"""
+    # Create the financial assumptions once so they are shared by every house
+    assumptions = HouseAssumptions.from_config(config)
+    
+    # Use every core when no worker count is given
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    
+    # Analyze small datasets in this process
+    if workers <= 1 or len(data) < parallel_threshold:
+        analyzed_houses, error_houses, error_messages = analyze_house_chunk(assumptions, data)
+    
+    # Split large datasets into a few chunks for each worker and analyze the chunks on a process pool
+    else:
+        chunk_size = -(-len(data) // (workers * 4))
+        data_chunks = [data[chunk_start:chunk_start + chunk_size] for chunk_start in range(0, len(data), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(analyze_house_chunk, repeat(assumptions), data_chunks))
+        
+        # Merge the chunks back together in the original order of the data
+        analyzed_houses, error_houses, error_messages = [], [], []
+        for chunk_analyzed_houses, chunk_error_houses, chunk_error_messages in chunk_results:
+            analyzed_houses.extend(chunk_analyzed_houses)
+            error_houses.extend(chunk_error_houses)
+            error_messages.extend(chunk_error_messages)
+        
+        # Share this process's assumptions again, since each chunk comes back with its own copy
+        for house in analyzed_houses:
+            house.assumptions = assumptions
+    
+    # Show the errors for every house lacking key values
+    for error in error_messages:
+        print(error)
+        
+    return analyzed_houses, error_houses
+
+
+def analyze_house_chunk(assumptions, data):
+    """Function to analyze a chunk of the JSON data using the House class and return a list of analyzed houses, a list of error houses, and the error messages for the error houses. It only uses its arguments so analyze_all_houses can run each chunk in a separate process"""
+    # Create a list with all the analyzed houses
+    analyzed_houses = []
+    
+    # Create a list with all the houses lacking key values
+    error_houses = []
+    
+    # Create a list with the error messages for the houses lacking key values
+    error_messages = []
+
+    # Loop through each of the houses in the chunk and analyze the houses that can be verified
+    for house_data in data:
+        house_error_messages = verify_house_data_values(house_data)
+        if not house_error_messages:
+            house = House(assumptions, house_data)
+            analyzed_houses.append(house)
+        
+        # If the calculation values for a house cannot be verified, add it to a list of error_houses
+        else:
+            error_messages.extend(house_error_messages)
+            error_houses.append(house_data['address'])
+        
+    return analyzed_houses, error_houses, error_messages
+
+
+def analyze_all_houses_batch(config, data):
+    """Function to analyze all the given JSON data at once using the HouseBatch class and return the analyzed HouseBatch and a list of error houses"""
+    # Split the houses that can be analyzed from the houses lacking key values
+    verified_house_data, error_houses = verify_all_house_data(data)
+    
+    # Analyze all the verified houses at once
+    house_batch = HouseBatch(config, verified_house_data)
+    
+    return house_batch, error_houses
+
+
+def collect_featured_houses(analyzed_houses, target_values, featured_houses):
+    """Generator that passes every analyzed house through unchanged while adding each house that meets the target values (a dictionary or a `FeaturedHouseFilter`) to `featured_houses` (a list or a `FeaturedHouseRanking`), so the featured houses can be picked out of a stream of houses that is only read once"""
+    # Compile the target values once for the whole stream
+    featured_filter = target_values if isinstance(target_values, FeaturedHouseFilter) else FeaturedHouseFilter(target_values)
+    
+    for house in analyzed_houses:
+        # Keep the houses that meet the investor's criteria
+        if featured_filter(house):
+            featured_houses.append(house)
+            
+        yield house
+
+
+def collect_config_featured_houses(analyzed_houses, config):
+    """Function to return the analyzed houses along with the FeaturedHouseRanking that is filled as they pass through, leaving the ranking empty and the houses untouched when the config file does not require featured houses, since an empty filter would keep every house"""
+    featured_houses = FeaturedHouseRanking.from_config(config)
+    
+    # Only rank the houses when they will be featured in the email
+    if config.get('featured_house_required'):
+        analyzed_houses = collect_featured_houses(analyzed_houses, FeaturedHouseFilter(config), featured_houses)
+    
+    return analyzed_houses, featured_houses
+
+
+def config_file_required_email_values_present(config):
+    """Function to verify and return a dictionary of all the required email values and return false otherwise"""
+    
+    # Establish error messages for feedback to the user
+    error_messages = []
+    
+    # Verify that the user wants emails
+    if config['send_emails']:
+        # Establish all the variables required for email in the config file
+        required_config_email_values = {
+            "email_sender_address": lambda x: isinstance(x, str) and "@" in x,
+            "email_receiver_address": lambda x: isinstance(x, str) and "@" in x,
+            "email_2FA_password": lambda x: isinstance(x, str),
+            "send_error_emails": lambda x: isinstance(x, bool),
+            "featured_house_required": lambda x: isinstance(x, bool)       
+        }
+        
+        def email_config_error_message(key, error, json_data=None):
+            """Function to define error messages for the email config file"""
+            # Error message for if a value is missing
+            if error == "missing":
+                error_message = f'"{key}" is not in the config file. Please enter "{key}" in the config file.'
             # Error message for if a value is incorrect
             elif error == "incorrect":
                 error_message = f'"{key}" is incorrectly entered in the config file. Review documentation for how to enter "{key}".'
@@ -725,6 +1793,22 @@ def config_file_required_values_present(config):
     # Extend the list of error messages with any error messages found when verifying all the values
     error_messages.extend(verify_all_required_values(required_config_values, config, config_error_message))
     
+    # Establish the optional values that tune how large datasets are analyzed
+    optional_config_values = {
+        "analysis_workers": lambda x: isinstance(x, int) and not isinstance(x, bool) and x > 0,
+        "parallel_analysis_threshold": lambda x: isinstance(x, int) and not isinstance(x, bool) and x >= 0,
+        "featured_house_limit": lambda x: isinstance(x, int) and not isinstance(x, bool) and x > 0,
+        "house_detail_fields": lambda x: isinstance(x, list) and all(field in ("address", "price", "beds", "baths", "sqft", "description", "year_built", "property_subtype", "region", "subdivision") for field in x),
+        "prescreen_max_rent_per_sqft": lambda x: isinstance(x, (int, float)) and not isinstance(x, bool) and x > 0,
+        "prescreen_safety_margin": lambda x: isinstance(x, (int, float)) and not isinstance(x, bool) and x >= 0,
+        "featured_house_rank_by": lambda x: (isinstance(x, str) and x in FeaturedHouseRanking.rank_metrics) or (isinstance(x, dict) and len(x) > 0 and all(metric in FeaturedHouseRanking.rank_metrics and isinstance(weight, (int, float)) for metric, weight in x.items())),
+    }
+    
+    # Verify the optional values that were entered
+    for key, value in optional_config_values.items():
+        if config.get(key) is not None and not value(config[key]):
+            error_messages.append(config_error_message(key, "incorrect"))
+    
     # Test that the given API key can return a result if it exists
     if config.get('scrapeops_api_key'):
         # Generate any potential error messages from verifying the api key
@@ -737,46 +1821,62 @@ def config_file_required_values_present(config):
     
 
 def create_house_analysis_excel_book(analyzed_houses, excel_filename):
-    """Create an excel book given a list of analyzed House objects"""
+    """Create an excel book given a list or stream of analyzed House objects and return the number of houses written. The workbook is write-only, so each sheet is streamed to disk as it is created rather than keeping every sheet in memory"""
+    
+    # Create a new write-only workbook, which starts without any sheets
+    wb = Workbook(write_only=True)
     
-    # Create a new workbook
-    wb = Workbook()
-    # Remove the default sheet created by openpyxl
-    wb.remove(wb.active)
+    # Keep track of the number of houses written to the workbook
+    number_houses = 0
     
     # Loop through each of the houses in the dataset and create an excel sheet for that house
     for house in analyzed_houses:
             
         # Create the house excel sheet for the house being analyzed
         house.house_excel_sheet_creator(wb)
+        number_houses += 1
             
     # Save the excel file that was created
     wb.save(filename=excel_filename)
 
-    return
+    return number_houses
 
 
 def create_featured_house_email(analyzed_houses, config):
-    """Function to create an email containing all of the scraped houses and some featured houses based on user request from JSON file"""
+    """Function to create an email containing all of the scraped houses and some featured houses based on user request from JSON file. The featured houses are ranked and limited by the optional "featured_house_rank_by" and "featured_house_limit" values in the config file, and a FeaturedHouseRanking that was already filled is used as it is"""
     
     # Verify that the user is looking for featured houses in their emails
     if config['featured_house_required']:
-        # Generate a dictionary of target keys and values from the config file
-        target_values = create_target_values_dictionary(config)
+        # Use the featured houses that were already ranked while the houses were analyzed
+        if isinstance(analyzed_houses, FeaturedHouseRanking):
+            featured_houses = analyzed_houses
+        
+        # Otherwise rank the houses that meet the investor's criteria, keeping only the top houses
+        else:
+            # Compile the target values from the config file once for every house
+            featured_filter = FeaturedHouseFilter(config)
+            
+            featured_houses = FeaturedHouseRanking.from_config(config)
+            for house in analyzed_houses:
+                # Check to see if the analyzed house meets the investor's criteria
+                if featured_filter(house):
+                    featured_houses.append(house)
         
         # Create the beginning of the email body for all of the analyzed houses in plain text and HTML
         # email_content_plain = ""
         email_content_html = "<html>\n\t<body>\n\t\t<h2>Featured Houses:</h2>"
         
-        # Loop through each of the houses in the dataset and add them to a list of analyzed houses
-        for house in analyzed_houses:
-            # Check to see if the analyzed house meets the investor's criteria
-            if house.featured_home_determiner(target_values):
-                # Add the individual house HTMl content to the total HTML content
-                email_content_html += house.email_format_html()
-                
-                # Add the individual house plain text content to the total plain text content
-                # email_content_plain += house.email_format_plain()
+        # Explain when only the top featured houses are shown
+        if featured_houses.houses_seen > len(featured_houses):
+            email_content_html += f"\n\t\t<p>Showing the top {len(featured_houses)} of {featured_houses.houses_seen} featured houses.</p>"
+        
+        # Loop through each of the featured houses from the highest ranked to the lowest
+        for house in featured_houses:
+            # Add the individual house HTMl content to the total HTML content
+            email_content_html += house.email_format_html()
+            
+            # Add the individual house plain text content to the total plain text content
+            # email_content_plain += house.email_format_plain()
                 
         # Close the html for the email content
         email_content_html += "\t</body>\n</html>"
@@ -792,19 +1892,28 @@ def create_featured_house_email(analyzed_houses, config):
         return email_content_html
 
 
-def create_target_values_dictionary(config):
-    """Function to return a dictionary containing all the user input target values in config"""
+def create_simulation_results_csv(simulation, csv_filename):
+    """Function to create a CSV file with the profit if sold and annualized return percentile bands of a MonteCarloSimulation, with one row per house per year"""
+    # Name a column for each percentile of each metric
+    metric_columns = [(metric, percentile_index, f"{metric}_p{percentile}") for metric in ["profit_if_sold", "annualized_return_decimal"] for percentile_index, percentile in enumerate(simulation.percentiles)]
     
-    # Dictionary to store all the target requested values
-    target_values = {}
+    with open(csv_filename, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["address", "url", "year"] + [column for _, _, column in metric_columns])
+        for house_index, address in enumerate(simulation.address):
+            for year in simulation.year:
+                writer.writerow([address, simulation.url[house_index], int(year)] + [float(getattr(simulation, metric)[house_index, percentile_index, year]) for metric, percentile_index, _ in metric_columns])
+
+
+def create_sweep_results_csv(assumption_sweep, csv_filename):
+    """Function to create a CSV file listing every house that is featured under each scenario of an AssumptionSweep, with one row per featured house per scenario"""
+    # Use the swept assumptions followed by the house details as the columns
+    fieldnames = list(assumption_sweep.assumption_ranges) + ["address", "url"] + list(assumption_sweep.result_metrics)
     
-    # Loop through each of the target required keys and values 
-    for key, value in config.items():
-        # Determine if a value exits in config for a target key
-        if value is not None:
-            target_values[f'{key}'] = value
-            
-    return target_values  
+    with open(csv_filename, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(assumption_sweep.results)
 
 
 def delete_file(file_path):
@@ -934,6 +2043,75 @@ def is_convertible_to_float(s):
         return False
 
 
+def iter_analyzed_houses(config, data, error_houses, workers=1, parallel_threshold=10000):
+    """Generator that analyzes a stream of JSON house data chunk by chunk and yields each analyzed House, adding the address of every house lacking key values to the `error_houses` list. Only one chunk of houses is held at a time, and each chunk is analyzed with analyze_all_houses so large chunks still use the process pool"""
+    # Create the financial assumptions once so they are shared by every house
+    assumptions = HouseAssumptions.from_config(config)
+    
+    # Make the chunks large enough to be analyzed on the process pool
+    chunk_size = max(parallel_threshold, 1000)
+    
+    for data_chunk in batched(data, chunk_size):
+        analyzed_houses, chunk_error_houses = analyze_all_houses(assumptions, data_chunk, workers, parallel_threshold)
+        error_houses.extend(chunk_error_houses)
+        yield from analyzed_houses
+
+
+def iter_house_data(json_path):
+    """Generator that reads the scraped house data one house at a time from a JSON Lines file, so the whole file is never loaded at once. A JSON file holding a list of houses (such as one scraped before the spiders wrote JSON Lines) is loaded whole and then read the same way"""
+    # Try to open the json file
+    try:
+        with open(json_path, 'r') as json_file:
+            # Read a JSON list of houses all at once
+            if not json_path.endswith('.jsonl'):
+                yield from json.load(json_file)
+                return
+            
+            # Read each line of the JSON Lines file as a single house
+            for line_number, line in enumerate(json_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                # Skip a line that is not complete, such as the last line of a crawl that was stopped early
+                except json.JSONDecodeError:
+                    print(f"Line {line_number} of '{json_path}' is not complete JSON and was skipped.")
+    # Handle errors if the file is not found or is not complete
+    except (OSError, json.JSONDecodeError):
+        print(f"An error occurred while trying to load '{json_path}'. Verify that the target json file name matches, that the file exists, and is complete.")
+
+
+def house_zpid(url):
+    """Function to return the Zillow property id from a house url (e.g., 33546129 for https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33546129_zpid/), or the url itself if it has none"""
+    match = re.search(r"/(\d+)_zpid", url or "")
+    return match.group(1) if match else url
+
+
+def merge_house_data(json_paths, output_path):
+    """Function to combine the houses in several JSON Lines files into one JSON Lines file one house at a time, keeping only the first copy of each Zillow property, and return the number of houses saved and the number of duplicates skipped"""
+    seen_zpids = set()
+    number_houses = 0
+    number_duplicates = 0
+    
+    with open(output_path, 'w', encoding="utf-8") as output_file:
+        for json_path in json_paths:
+            # Skip the files of shards that did not find any houses
+            if not os.path.exists(json_path):
+                continue
+            
+            for house in iter_house_data(json_path):
+                zpid = house_zpid(house.get('url'))
+                if zpid in seen_zpids:
+                    number_duplicates += 1
+                    continue
+                
+                seen_zpids.add(zpid)
+                output_file.write(json.dumps(house, ensure_ascii=False) + "\n")
+                number_houses += 1
+    
+    return number_houses, number_duplicates
+
+
 def load_json(json_path):
     """Load a configuration file with sensitive or variable information"""
     # Try to open the json file
@@ -947,6 +2125,80 @@ def load_json(json_path):
         return
 
 
+def parse_assumption_range(range_text):
+    """Function to turn the values to sweep for an assumption, written as "start:stop:step" (including the stop value) or as a comma separated list, into a list of numbers"""
+    def to_number(text):
+        """Function to convert the text to an int when it is a whole number and to a float otherwise"""
+        text = text.strip()
+        return int(text) if text.lstrip('-').isdigit() else float(text)
+    
+    # Handle a list of values
+    if ':' not in range_text:
+        return [to_number(value) for value in range_text.split(',')]
+    
+    # Handle a range of values
+    range_values = range_text.split(':')
+    if len(range_values) != 3:
+        raise ValueError(f'"{range_text}" is not a valid range. Enter ranges as "start:stop:step".')
+    start, stop, step = (to_number(value) for value in range_values)
+    if step <= 0 or stop < start:
+        raise ValueError(f'"{range_text}" is not a valid range. The step must be positive and the stop must not be less than the start.')
+    
+    # Count the steps instead of adding them up so floating point error does not add or drop a value, then round away the error left in each float value
+    number_values = int(round((stop - start) / step)) + 1
+    values = [start + index * step for index in range(number_values)]
+    return [round(value, 10) if isinstance(value, float) else value for value in values]
+
+
+def projection_factors(expected_annual_growth, interest_rate, loan_term_yrs, periods_per_year=1):
+    """Generator that yields the growth factor and the loan balance factor for each period from the purchase until the end of the loan term. Each factor is carried forward from the previous period with a single multiplication instead of recalculating the powers from scratch"""
+    # Determine how much the growth and the loan interest compound over each period
+    growth_step = (1 + expected_annual_growth) ** (1 / periods_per_year)
+    compounding_step = (1 + interest_rate / 12) ** (12 / periods_per_year)
+    
+    # Start with no growth and every loan payment remaining
+    growth_factor = 1.0
+    discount_factor = 1 / ((1 + interest_rate / 12) ** (loan_term_yrs * 12))
+    
+    last_period = loan_term_yrs * periods_per_year
+    for period in range(last_period + 1):
+        # The loan is fully paid off once the last period is reached
+        loan_balance_factor = 1 - discount_factor if period < last_period else 0.0
+        
+        yield growth_factor, loan_balance_factor
+        
+        growth_factor *= growth_step
+        discount_factor *= compounding_step
+
+
+def round_array(values, ndigits, exact=None):
+    """Function to round every value in a NumPy array exactly the way the built-in round function does. Values within floating point error of a rounding tie are rounded one at a time with the built-in round, using `exact(index)` to recompute the value with plain Python floats when it is given"""
+    # Round all the values at once
+    rounded_values = np.round(values, ndigits)
+    
+    # Find the values that sit on (or within floating point error of) a tie, where NumPy and the built-in round can disagree
+    scaled_values = values * 10.0 ** ndigits
+    tie_values = np.abs(scaled_values - np.floor(scaled_values) - 0.5) <= 1e-6
+    
+    # Round each of the tie values the same way the House class does
+    for index in zip(*np.nonzero(tie_values)):
+        value = exact(index) if exact else values[index]
+        rounded_values[index] = round(float(value), ndigits)
+        
+    return rounded_values
+
+
+def scenario_values(function, *assumption_values):
+    """Function to calculate a value that only depends on the assumptions for each scenario with plain Python numbers, so config-only factors match the House class exactly. Each assumption can be a single value or a column with one value per scenario, and the results keep the shape of the scenarios"""
+    # Line up the values of the assumptions for each scenario
+    assumption_arrays = np.broadcast_arrays(*[np.asarray(value) for value in assumption_values])
+    
+    # Calculate the value for each scenario with plain Python numbers
+    results = [function(*[value.item() for value in scenario]) for scenario in zip(*[assumption_array.ravel() for assumption_array in assumption_arrays])]
+    
+    return np.array(results, dtype=float).reshape(assumption_arrays[0].shape + np.shape(results[0]))
+
+
 def send_error_email(error_message, config):
     """Function to send a custom error message to a user if any issues occur that they cannot see"""
     
@@ -1016,6 +2268,52 @@ def send_featured_house_email(analyzed_houses, excel_filename, config):
     return
 
 
+def simulate_house_chunk(house_values, cash_needed_total, path_factors, percentiles, max_block_values=2 ** 24):
+    """Function to calculate the profit if sold and annualized return percentile bands of a chunk of houses across every simulated path. It only uses its arguments so MonteCarloSimulation can run each chunk in a separate process"""
+    number_factors, number_years, simulations = path_factors.shape
+    flat_path_factors = path_factors.reshape(number_factors, -1)
+    profit_bands = np.empty((len(house_values), len(percentiles), number_years))
+    
+    # Calculate a block of houses at a time so the profits for every path stay a manageable size
+    houses_per_block = max(1, max_block_values // (number_years * simulations))
+    for block_start in range(0, len(house_values), houses_per_block):
+        block = slice(block_start, block_start + houses_per_block)
+        
+        # Find the profit for every house, year, and path in the block with a single matrix multiplication, then keep only the percentiles over the paths
+        profit = (house_values[block] @ flat_path_factors).reshape(-1, number_years, simulations) - cash_needed_total[block, np.newaxis, np.newaxis]
+        profit_bands[block] = np.moveaxis(np.percentile(profit, percentiles, axis=-1), 0, 1)
+    
+    # Annualize the profit percentiles, leaving houses that lose more than the cash needed as nan after the first year like HouseBatch
+    total_return_ratio = (profit_bands + cash_needed_total[:, np.newaxis, np.newaxis]) / cash_needed_total[:, np.newaxis, np.newaxis]
+    with np.errstate(invalid='ignore'):
+        annualized_return_bands = np.power(total_return_ratio, 1 / (np.arange(number_years) + 1)) - 1
+    
+    return np.round(profit_bands, 2), np.round(annualized_return_bands, 4)
+
+
+def verify_all_house_data(data):
+    """Function to split the given JSON data into a list of the houses that can be analyzed and a list with the address of every house lacking key values"""
+    # Create a list with the data for all the houses that can be analyzed
+    verified_house_data = []
+    
+    # Create a list with all the houses lacking key values
+    error_houses = []
+    
+    # Loop through each of the houses in the dataset and verify the data
+    for house_data in data:
+        error_messages = verify_house_data_values(house_data)
+        if not error_messages:
+            verified_house_data.append(house_data)
+        
+        # If the calculation values for a house cannot be verified, add it to a list of error_houses
+        else:
+            for error in error_messages:
+                print(error)
+            error_houses.append(house_data['address'])
+            
+    return verified_house_data, error_houses
+
+
 def verify_all_required_values(required_values, json_data, error_message_pattern=None):
     """Function to return a list of all the errors generated if the required values are not included and/or within specified ranges for any JSON data"""
     # Variable to track of the error messages generated
@@ -1082,6 +2380,38 @@ def verify_config_file_target_values(config):
     return error_messages
 
 
+def verify_house_data_values(house_data):
+    """Function to return a list of all the errors generated while verifying the values required to analyze a house from the homedata.json file. Returning an empty list means the house can be analyzed"""
+    
+    # Establish the required values to analyze a house
+    required_house_values = {
+        "price": lambda x: is_convertible_to_float(x) and float(x) > 0,
+        "rent": lambda x: is_convertible_to_float(x) and float(x) > 0,
+        "sqft": lambda x: is_convertible_to_float(x) and float(x) > 0,
+        "tax": lambda x: is_convertible_to_float(x) and float(x) > 0
+    }
+    
+    def house_json_error_message(key, error, json_data):
+        """Function to define error messages for the homedata.json file"""
+        # Error message for if a value is missing
+        if error == "missing":
+            error_message = f'"{key}" is missing for {json_data['address']} in the housedata.json file.'
+        # Error message for if a value is incorrect
+        elif error == "incorrect":
+            error_message = f'"{key}" for {json_data['address']} is incorrectly entered in the housedata.json file.'
+        # Error message to handle if it was not a number that was entered
+        elif error == "number":
+            error_message = f'"{key}" for {json_data['address']} is not a valid number in the housedata.json file.'
+        # General error message to handle all other issues
+        else:
+            error_message = "An error has occurred while verifying data from the housedata.json file."
+            
+        return error_message
+    
+    # Return all the error messages generated while verifying the house data
+    return verify_all_required_values(required_house_values, house_data, house_json_error_message)
+
+
 def verify_scrapeops_api_key(scrapeops_api_key):
     """Function to validate that the user has entered a valid Scrapeops API Key."""
 
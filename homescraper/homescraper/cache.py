@@ -0,0 +1,91 @@
+# Define here the persistent caches shared by the spiders
+#
+# The tax records, rent estimates, and other lookups that barely change between runs are kept in one SQLite
+# file with a table for each kind of lookup, so daily runs over the same neighborhoods can skip most requests.
+
+import json
+import sqlite3
+from time import time
+
+
+class LookupCache:
+    """
+    Keeps the results of a lookup on disk between runs, keyed by a normalized value such as the Zillow address slug of a house.
+
+    Each entry is stored as JSON with the time it was stored, and an entry older than the time to live is treated as missing.
+
+    Attributes:
+        path (str): The path of the SQLite file holding the cache.
+        table (str): The table in the file for this kind of lookup (e.g., "taxes").
+        ttl (float): The number of seconds an entry is used for, or None to use entries forever.
+
+    Methods:
+        get(self, key):
+            Returns the stored values for the key, or None if there are none or they have expired.
+        get_with_age(self, key):
+            Returns the stored values for the key and their age in seconds, even if they have expired.
+        set(self, key, values):
+            Stores the values for the key with the current time.
+        add(self, key, amount):
+            Adds the amount to the number stored for the key and returns the new number.
+        close(self):
+            Closes the SQLite file.
+
+    Example Usage:
+        tax_cache = LookupCache("homedata-cache.sqlite", "taxes", ttl=180 * 24 * 60 * 60)
+        tax_values = tax_cache.get("1486-olivewood-ave-lakewood-oh-44107")
+        if tax_values is None:
+            tax_cache.set("1486-olivewood-ave-lakewood-oh-44107", {"tax": "$4,325"})
+    """
+    def __init__(self, path, table, ttl=None):
+
+        if not table.isidentifier():
+            raise ValueError(f"'{table}' is not a valid cache table name.")
+
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+        self.connection.commit()
+
+
+    def get(self, key):
+        """Return the values stored for the key, or None if there are none or they are older than the time to live"""
+        values, age = self.get_with_age(key)
+
+        # Treat expired entries the same as missing entries
+        if values is None or (self.ttl is not None and age > self.ttl):
+            return None
+
+        return values
+
+
+    def get_with_age(self, key):
+        """Return the values stored for the key and the number of seconds since they were stored, ignoring the time to live, or (None, None) if there are none"""
+        row = self.connection.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+
+        value, stored_at = row
+        return json.loads(value), time() - stored_at
+
+
+    def set(self, key, values):
+        """Store the values for the key, replacing any older values"""
+        self.connection.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)", (key, json.dumps(values), time()))
+        self.connection.commit()
+
+
+    def add(self, key, amount):
+        """Add the amount to the number stored for the key in one transaction, so processes adding to the same key at the same time do not lose each other's amounts, and return the new number"""
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(f"INSERT INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET value = CAST(value AS REAL) + excluded.value, stored_at = excluded.stored_at", (key, float(amount), time()))
+            row = self.connection.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0])
+
+
+    def close(self):
+        """Close the SQLite file"""
+        self.connection.close()
@@ -0,0 +1,126 @@
+# Define here the checkpoints that let a stopped crawl resume where it stopped
+#
+# Each spider of a crawl saves its progress to its own folder in the CRAWL_CHECKPOINT_DIR. A spider that stops cleanly
+# (e.g., Ctrl-C or a closed spider) saves its request queue, the requests it has seen, and its state with Scrapy's JOBDIR,
+# and a spider that is killed keeps the houses it already saved. The folder is deleted once every spider has finished.
+
+import os
+import shutil
+from analysis_functions import iter_house_data
+
+
+class CrawlCheckpoint:
+    """
+    Saves the progress of each spider in a crawl so a crawl that was stopped resumes where it stopped instead of starting again from the start urls.
+
+    A spider with `checkpoint_requests = True` saves its request queue, seen requests, and spider state to its folder with Scrapy's JOBDIR while it runs, so a spider that stopped cleanly picks up its queue again. Scrapy only saves the queue when the spider closes, so a spider that was killed starts again from its start urls, and the houses already saved to its feed file are skipped along with any lookups saved in the lookup cache. A spider without request checkpoints reads its houses from a file, so it always resumes by skipping the houses already saved to its feed file.
+
+    Attributes:
+        checkpoint_dir (str): The folder holding a folder for each spider, or None to start every crawl from the start urls.
+
+    Methods:
+        spider_dir(self, spidercls):
+            Returns the folder holding the spider's progress.
+        is_finished(self, spidercls):
+            Returns True if the spider finished before the crawl was stopped.
+        spider_settings(self, settings, spidercls, feed_file=None):
+            Returns a copy of the settings that resumes the spider if it was stopped, or starts it and its checkpoint otherwise.
+        close_spider(self, spidercls, reason):
+            Marks the spider as finished so it is skipped if the crawl is resumed, or as stopped cleanly so its saved queue can be used.
+        clear(self):
+            Deletes the progress of every spider so the next crawl starts from the start urls.
+
+    Example Usage:
+        checkpoint = CrawlCheckpoint("crawl-checkpoint")
+        if not checkpoint.is_finished(HomespiderSpider):
+            runner = CrawlerRunner(checkpoint.spider_settings(settings, HomespiderSpider))
+    """
+    def __init__(self, checkpoint_dir):
+
+        self.checkpoint_dir = checkpoint_dir or None
+
+
+    def spider_dir(self, spidercls):
+        """Return the folder holding the spider's progress"""
+        return os.path.join(self.checkpoint_dir, spidercls.name)
+
+
+    def is_finished(self, spidercls):
+        """Return True if the spider finished in the crawl that is being resumed"""
+        if self.checkpoint_dir is None:
+            return False
+        return os.path.exists(os.path.join(self.spider_dir(spidercls), "finished"))
+
+
+    def spider_settings(self, settings, spidercls, feed_file=None):
+        """Return a copy of the settings that resumes the spider where it stopped if it was started before, or starts it from the start urls otherwise. The feed file defaults to the spider's feed_file"""
+        spider_settings = settings.copy()
+        if self.checkpoint_dir is None:
+            return spider_settings
+
+        spider_dir = self.spider_dir(spidercls)
+        resume = os.path.isdir(spider_dir)
+        request_checkpoints = getattr(spidercls, 'checkpoint_requests', False)
+
+        # Scrapy only saves the request queue and spider state when the spider closes, so the requests it has seen are thrown away if it was killed, otherwise the pages in its lost queue would be skipped as already seen
+        stopped_marker = os.path.join(spider_dir, "stopped")
+        if resume and request_checkpoints and not os.path.exists(stopped_marker):
+            shutil.rmtree(spider_dir)
+        os.makedirs(spider_dir, exist_ok=True)
+        
+        # The saved queue is only complete until the spider runs again
+        if os.path.exists(stopped_marker):
+            os.remove(stopped_marker)
+        if request_checkpoints:
+            spider_settings.set('JOBDIR', spider_dir)
+
+        # Add to the houses already saved instead of replacing them, dropping a house that was only partly written when the spider was killed
+        if resume:
+            truncate_incomplete_line(feed_file or spidercls.feed_file)
+            feeds = spider_settings.getdict('FEEDS')
+            spider_settings.set('FEEDS', {feed_path: dict(feed_options, overwrite=False) for feed_path, feed_options in feeds.items()})
+        spider_settings.set('CRAWL_RESUME', resume)
+        return spider_settings
+
+
+    def close_spider(self, spidercls, reason):
+        """Mark the spider as finished so it is skipped if the crawl is resumed, or as stopped cleanly with its request queue saved so it is resumed from the queue"""
+        if self.checkpoint_dir is not None:
+            with open(os.path.join(self.spider_dir(spidercls), "finished" if reason == 'finished' else "stopped"), 'w'):
+                pass
+
+
+    def clear(self):
+        """Delete the progress of every spider so the next crawl starts from the start urls"""
+        if self.checkpoint_dir is not None and os.path.isdir(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir)
+
+
+def truncate_incomplete_line(path):
+    """Function to remove a last line that was only partly written to a JSON Lines file, so new lines can be added after it"""
+    if not os.path.exists(path):
+        return
+
+    # Read back from the end of the file in chunks so a large file is not loaded at once
+    with open(path, 'rb+') as file:
+        end = position = file.seek(0, os.SEEK_END)
+        while position > 0:
+            chunk_start = max(0, position - 4096)
+            file.seek(chunk_start)
+            chunk = file.read(position - chunk_start)
+            if position == end and chunk.endswith(b"\n"):
+                return
+
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                file.truncate(chunk_start + newline + 1)
+                return
+            position = chunk_start
+        file.truncate(0)
+
+
+def saved_house_urls(settings, feed_file):
+    """Function to return the urls of the houses the spider already saved to its feed file when a stopped crawl is resumed, or an empty set for a new crawl"""
+    if not settings.getbool('CRAWL_RESUME') or not os.path.exists(feed_file):
+        return set()
+    return {house.get('url') for house in iter_house_data(feed_file)}
@@ -0,0 +1,482 @@
+# Define here the shared crawl frontier that lets several workers share one crawl
+#
+# Each worker runs the same spiders with the FrontierScheduler, which keeps the request queue, the requests that have
+# been seen, and the scraped houses in one shared store instead of in the worker's memory. Any worker can download any
+# request, no request is downloaded twice, and every worker waits until the whole crawl is idle before it closes.
+#
+# The store is a Redis server (FRONTIER_URL = "redis://host:6379/0"), which needs the redis package, or an SQLite file
+# (FRONTIER_URL = "sqlite:///homedata-frontier.sqlite") for workers on one machine or for testing without a server.
+#
+# The requests are kept in the store as JSON, so a worker never runs code read from the store, but anyone who can write
+# to the store can still add requests to the crawl, so it should only be reachable by the workers.
+
+import json
+import os
+import socket
+import sqlite3
+from analysis_functions import house_zpid, iter_house_data
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.exceptions import DontCloseSpider, NotConfigured
+from scrapy.utils.misc import create_instance, load_object
+from scrapy.utils.request import request_from_dict
+from time import monotonic, time
+
+
+class SQLiteFrontierStore:
+    """
+    Keeps the shared request queues, seen requests, busy workers, and scraped houses of each spider in an SQLite file, for workers on one machine or for testing a distributed crawl without a Redis server.
+
+    Every value is kept under the name of the run, so a new run (e.g., the next day) does not see the requests of an earlier run. A request taken by a worker stays in the store until the worker acknowledges it, and is put back in the queue if the worker stops being marked busy before then.
+
+    Attributes:
+        path (str): The path of the SQLite file.
+        run (str): The name of the run the values belong to.
+
+    Methods:
+        push_request(self, queue, data, priority):
+            Adds a serialized request to the queue.
+        pop_request(self, queue, node):
+            Takes the serialized request with the highest priority for the worker and returns its id and data, or None if the queue is empty.
+        ack_request(self, queue, request_id):
+            Removes a request the worker has finished.
+        requeue_requests(self, queue, timeout):
+            Puts the requests taken by workers that have not been marked busy within the timeout back in the queue.
+        count_requests(self, queue):
+            Returns the number of requests waiting in the queue.
+        add_fingerprint(self, key, fingerprint):
+            Adds a request fingerprint, returning True if it had not been seen before.
+        mark_busy(self, key, node):
+            Marks the worker as downloading requests.
+        mark_idle(self, key, node):
+            Marks the worker as idle.
+        busy_nodes(self, key, timeout):
+            Returns the number of workers marked busy within the timeout.
+        save_item(self, key, item_key, values):
+            Saves a scraped house, replacing an earlier copy of the same house.
+        iter_items(self, key):
+            Yields the saved houses in the order they were first saved.
+        close(self):
+            Closes the SQLite file.
+
+    Example Usage:
+        frontier_store = SQLiteFrontierStore("homedata-frontier.sqlite", run="2024-03-15")
+        frontier_store.push_request("homespider", request_data, priority=0)
+    """
+    def __init__(self, path, run):
+
+        self.path = path
+        self.run = run
+
+        # Commit each change right away so every worker sees it, and wait for the other workers' changes to finish
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS frontier_requests (id INTEGER PRIMARY KEY AUTOINCREMENT, run TEXT NOT NULL, queue TEXT NOT NULL, priority INTEGER NOT NULL, data BLOB NOT NULL, taken_by TEXT)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS frontier_requests_waiting ON frontier_requests (run, queue, taken_by, priority DESC, id)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS frontier_seen (run TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL, PRIMARY KEY (run, key, fingerprint))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS frontier_nodes (run TEXT NOT NULL, key TEXT NOT NULL, node TEXT NOT NULL, busy_at REAL NOT NULL, PRIMARY KEY (run, key, node))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS frontier_items (id INTEGER PRIMARY KEY AUTOINCREMENT, run TEXT NOT NULL, key TEXT NOT NULL, item_key TEXT NOT NULL, value TEXT NOT NULL, UNIQUE (run, key, item_key))")
+
+
+    def push_request(self, queue, data, priority):
+        """Add a serialized request to the queue"""
+        self.connection.execute("INSERT INTO frontier_requests (run, queue, priority, data) VALUES (?, ?, ?, ?)", (self.run, queue, priority, data))
+
+
+    def pop_request(self, queue, node):
+        """Take the serialized request with the highest priority for the worker, taking the oldest request first within a priority, and return its id and data, or None if the queue is empty"""
+        # Lock the file while the request is taken so two workers never take the same request
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute("SELECT id, data FROM frontier_requests WHERE run = ? AND queue = ? AND taken_by IS NULL ORDER BY priority DESC, id LIMIT 1", (self.run, queue)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE frontier_requests SET taken_by = ? WHERE id = ?", (node, row[0]))
+        finally:
+            self.connection.execute("COMMIT")
+        return (row[0], row[1]) if row is not None else None
+
+
+    def ack_request(self, queue, request_id):
+        """Remove a request the worker has finished"""
+        self.connection.execute("DELETE FROM frontier_requests WHERE id = ?", (request_id,))
+
+
+    def requeue_requests(self, queue, timeout):
+        """Put the requests taken by workers that have not been marked busy within the timeout back in the queue, since those workers were killed before finishing them, and return the number of requests put back"""
+        cursor = self.connection.execute("UPDATE frontier_requests SET taken_by = NULL WHERE run = ? AND queue = ? AND taken_by IS NOT NULL AND taken_by NOT IN (SELECT node FROM frontier_nodes WHERE run = ? AND key = ? AND busy_at > ?)", (self.run, queue, self.run, queue, time() - timeout))
+        return cursor.rowcount
+
+
+    def count_requests(self, queue):
+        """Return the number of requests waiting in the queue"""
+        return self.connection.execute("SELECT COUNT(*) FROM frontier_requests WHERE run = ? AND queue = ? AND taken_by IS NULL", (self.run, queue)).fetchone()[0]
+
+
+    def add_fingerprint(self, key, fingerprint):
+        """Add a request fingerprint and return True if no worker had seen it before"""
+        cursor = self.connection.execute("INSERT OR IGNORE INTO frontier_seen (run, key, fingerprint) VALUES (?, ?, ?)", (self.run, key, fingerprint))
+        return cursor.rowcount == 1
+
+
+    def mark_busy(self, key, node):
+        """Mark the worker as downloading requests"""
+        self.connection.execute("INSERT OR REPLACE INTO frontier_nodes (run, key, node, busy_at) VALUES (?, ?, ?, ?)", (self.run, key, node, time()))
+
+
+    def mark_idle(self, key, node):
+        """Mark the worker as idle"""
+        self.connection.execute("DELETE FROM frontier_nodes WHERE run = ? AND key = ? AND node = ?", (self.run, key, node))
+
+
+    def busy_nodes(self, key, timeout):
+        """Return the number of workers marked busy within the timeout, so a worker that was killed stops holding up the crawl"""
+        return self.connection.execute("SELECT COUNT(*) FROM frontier_nodes WHERE run = ? AND key = ? AND busy_at > ?", (self.run, key, time() - timeout)).fetchone()[0]
+
+
+    def save_item(self, key, item_key, values):
+        """Save a scraped house, replacing an earlier copy of the same house"""
+        self.connection.execute("INSERT INTO frontier_items (run, key, item_key, value) VALUES (?, ?, ?, ?) ON CONFLICT (run, key, item_key) DO UPDATE SET value = excluded.value", (self.run, key, item_key, json.dumps(values)))
+
+
+    def iter_items(self, key):
+        """Yield the saved houses one at a time in the order they were first saved"""
+        for (value,) in self.connection.execute("SELECT value FROM frontier_items WHERE run = ? AND key = ? ORDER BY id", (self.run, key)):
+            yield json.loads(value)
+
+
+    def close(self):
+        """Close the SQLite file"""
+        self.connection.close()
+
+
+class RedisFrontierStore:
+    """
+    Keeps the shared request queues, seen requests, busy workers, and scraped houses of each spider on a Redis server, so workers on several machines can share one crawl. It has the same methods as the SQLiteFrontierStore.
+
+    Each queue is a sorted set ordered by priority and then by the order the requests were added, and the requests taken by the workers are kept in a hash with the worker and the request's place in the queue until they are acknowledged. Every key starts with "homescraper:" and the name of the run.
+
+    Attributes:
+        url (str): The url of the Redis server (e.g., "redis://localhost:6379/0").
+        run (str): The name of the run the values belong to.
+    """
+    def __init__(self, url, run):
+
+        try:
+            import redis
+        except ImportError:
+            raise ImportError(f"The redis package is needed to use '{url}' as the FRONTIER_URL. Install it with 'pip install redis', or use an sqlite:/// FRONTIER_URL instead.")
+
+        self.url = url
+        self.run = run
+        self.client = redis.Redis.from_url(url)
+
+        # Move the request to the taken requests in the same step it is removed from the queue, so it is never lost in between
+        self.pop_script = self.client.register_script("""
+            local popped = redis.call('ZPOPMIN', KEYS[1])
+            if #popped == 0 then
+                return false
+            end
+            redis.call('HSET', KEYS[2], popped[1], ARGV[1] .. '|' .. popped[2])
+            return popped[1]
+        """)
+
+
+    def _key(self, *parts):
+        return ":".join(("homescraper", self.run) + parts)
+
+
+    def push_request(self, queue, data, priority):
+        """Add a serialized request to the queue, numbering it so requests with the same priority are taken in the order they were added"""
+        number = self.client.incr(self._key(queue, "requests", "count"))
+        self.client.zadd(self._key(queue, "requests"), {str(number).encode() + b":" + data: -priority * 10 ** 12 + number})
+
+
+    def pop_request(self, queue, node):
+        """Take the serialized request with the highest priority for the worker and return its id and data, or None if the queue is empty"""
+        request_id = self.pop_script(keys=[self._key(queue, "requests"), self._key(queue, "taken")], args=[node])
+        if not request_id:
+            return None
+        return request_id, request_id.split(b":", 1)[1]
+
+
+    def ack_request(self, queue, request_id):
+        """Remove a request the worker has finished"""
+        self.client.hdel(self._key(queue, "taken"), request_id)
+
+
+    def requeue_requests(self, queue, timeout):
+        """Put the requests taken by workers that have not been marked busy within the timeout back in the queue, since those workers were killed before finishing them, and return the number of requests put back"""
+        busy_nodes = {node for node, busy_at in self.client.hgetall(self._key(queue, "nodes")).items() if float(busy_at) > time() - timeout}
+        requeued = 0
+        for request_id, taken in self.client.hgetall(self._key(queue, "taken")).items():
+            node, score = taken.rsplit(b"|", 1)
+            if node not in busy_nodes:
+                pipeline = self.client.pipeline()
+                pipeline.zadd(self._key(queue, "requests"), {request_id: float(score)})
+                pipeline.hdel(self._key(queue, "taken"), request_id)
+                pipeline.execute()
+                requeued += 1
+        return requeued
+
+
+    def count_requests(self, queue):
+        """Return the number of requests waiting in the queue"""
+        return self.client.zcard(self._key(queue, "requests"))
+
+
+    def add_fingerprint(self, key, fingerprint):
+        """Add a request fingerprint and return True if no worker had seen it before"""
+        return self.client.sadd(self._key(key, "seen"), fingerprint) == 1
+
+
+    def mark_busy(self, key, node):
+        """Mark the worker as downloading requests"""
+        self.client.hset(self._key(key, "nodes"), node, time())
+
+
+    def mark_idle(self, key, node):
+        """Mark the worker as idle"""
+        self.client.hdel(self._key(key, "nodes"), node)
+
+
+    def busy_nodes(self, key, timeout):
+        """Return the number of workers marked busy within the timeout, so a worker that was killed stops holding up the crawl"""
+        return sum(float(busy_at) > time() - timeout for busy_at in self.client.hvals(self._key(key, "nodes")))
+
+
+    def save_item(self, key, item_key, values):
+        """Save a scraped house, replacing an earlier copy of the same house and keeping the order the houses were first saved"""
+        if self.client.hset(self._key(key, "items"), item_key, json.dumps(values)):
+            self.client.rpush(self._key(key, "items", "order"), item_key)
+
+
+    def iter_items(self, key):
+        """Yield the saved houses one at a time in the order they were first saved"""
+        for item_key in self.client.lrange(self._key(key, "items", "order"), 0, -1):
+            value = self.client.hget(self._key(key, "items"), item_key)
+            if value is not None:
+                yield json.loads(value)
+
+
+    def close(self):
+        """Close the connection to the Redis server"""
+        self.client.close()
+
+
+def open_frontier_store(settings):
+    """Function to open the shared store from the FRONTIER_URL and FRONTIER_RUN settings, or return None if the crawl is not shared"""
+    url = settings.get('FRONTIER_URL')
+    if not url:
+        return None
+
+    run = settings.get('FRONTIER_RUN') or "default"
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisFrontierStore(url, run)
+    if url.startswith("sqlite:///"):
+        return SQLiteFrontierStore(url[len("sqlite:///"):], run)
+    raise ValueError(f"'{url}' is not a valid FRONTIER_URL. Use a redis:// url or an sqlite:/// path.")
+
+
+def iter_source_houses(settings, source_spider, source_file):
+    """Function to yield the houses scraped by the spider before this one, from the shared store when the crawl is shared between workers, or from the spider's feed file otherwise"""
+    frontier_store = open_frontier_store(settings)
+    if frontier_store is None:
+        yield from iter_house_data(source_file)
+        return
+
+    try:
+        yield from frontier_store.iter_items(source_spider)
+    finally:
+        frontier_store.close()
+
+
+def request_to_json(request, spider):
+    """Function to serialize a request as JSON for the shared store, with its headers and body kept as latin-1 text so every byte comes back unchanged. The request's meta and cb_kwargs must only hold JSON values"""
+    request_dict = request.to_dict(spider=spider)
+    request_dict['headers'] = {name.decode('latin-1'): [value.decode('latin-1') for value in values] for name, values in request_dict['headers'].items()}
+    request_dict['body'] = request_dict['body'].decode('latin-1')
+    return json.dumps(request_dict).encode()
+
+
+def request_from_json(data, spider):
+    """Function to rebuild a request serialized by request_to_json"""
+    request_dict = json.loads(data)
+    request_dict['headers'] = {name.encode('latin-1'): [value.encode('latin-1') for value in values] for name, values in request_dict['headers'].items()}
+    request_dict['body'] = request_dict['body'].encode('latin-1')
+    return request_from_dict(request_dict, spider=spider)
+
+
+def export_frontier_houses(settings, spider_name, path):
+    """Function to save the houses a spider scraped across every worker of a shared crawl to a JSON Lines file and return the number of houses saved"""
+    frontier_store = open_frontier_store(settings)
+    number_houses = 0
+    with open(path, 'w', encoding="utf-8") as output_file:
+        for house in frontier_store.iter_items(spider_name):
+            output_file.write(json.dumps(house, ensure_ascii=False) + "\n")
+            number_houses += 1
+
+    frontier_store.close()
+    return number_houses
+
+
+class FrontierDupeFilter(BaseDupeFilter):
+    """Filter out the requests any worker of a shared crawl has already seen, using the spider's set of request fingerprints in the shared store"""
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        frontier_store = open_frontier_store(crawler.settings)
+        if frontier_store is None:
+            raise NotConfigured("The FrontierDupeFilter needs a FRONTIER_URL.")
+        return cls(frontier_store, crawler.request_fingerprinter, crawler.spider.name)
+
+
+    def __init__(self, frontier_store, fingerprinter, spider_name):
+        self.frontier_store = frontier_store
+        self.fingerprinter = fingerprinter
+        self.spider_name = spider_name
+
+
+    def request_seen(self, request):
+        return not self.frontier_store.add_fingerprint(self.spider_name, self.fingerprinter.fingerprint(request).hex())
+
+
+    def log(self, request, spider):
+        spider.crawler.stats.inc_value('dupefilter/filtered')
+
+
+    def close(self, reason):
+        self.frontier_store.close()
+
+
+class FrontierScheduler:
+    """
+    Keep the spider's request queue in the shared store, so every worker of a shared crawl takes its requests from the same queue.
+
+    Every worker sends its start requests, but only the first copy of each is queued, even though start requests are not filtered otherwise. A worker that runs out of requests stays open while the queue has requests or another worker is still downloading, since that worker may still add requests, and closes once the whole crawl has been idle for FRONTIER_IDLE_SECONDS.
+
+    Each request stays in the store until the worker is done with it, including any requests it led to being queued, so the requests of a worker that is killed are put back in the queue once it has not been marked busy for FRONTIER_NODE_TIMEOUT seconds. A request the killed worker had already finished may be downloaded again.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.frontier_store = open_frontier_store(settings)
+        if self.frontier_store is None:
+            raise NotConfigured("The FrontierScheduler needs a FRONTIER_URL.")
+
+        self.dupefilter = create_instance(load_object(settings['DUPEFILTER_CLASS']), settings, crawler)
+        self.queue = crawler.spider.name
+        self.node = f"{socket.gethostname()}:{os.getpid()}"
+        self.idle_seconds = settings.getfloat('FRONTIER_IDLE_SECONDS', 30)
+        self.node_timeout = settings.getfloat('FRONTIER_NODE_TIMEOUT', 600)
+        self.busy_since = None
+        self.idle_since = None
+        self.taken_requests = {}
+        crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
+
+
+    def open(self, spider):
+        self.spider = spider
+        return self.dupefilter.open()
+
+
+    def close(self, reason):
+        # The engine finishes every request it took before the scheduler is closed
+        self.ack_finished_requests()
+        self.frontier_store.mark_idle(self.queue, self.node)
+        self.frontier_store.close()
+        return self.dupefilter.close(reason)
+
+
+    def has_pending_requests(self):
+        return self.frontier_store.count_requests(self.queue) > 0
+
+
+    def enqueue_request(self, request):
+        # Only queue the first copy of each start request, since every worker sends them
+        if (not request.dont_filter or request.meta.get('is_start_request')) and self.dupefilter.request_seen(request):
+            self.dupefilter.log(request, self.spider)
+            return False
+
+        self.frontier_store.push_request(self.queue, request_to_json(request, self.spider), request.priority)
+        self.crawler.stats.inc_value('scheduler/enqueued/frontier')
+        return True
+
+
+    def next_request(self):
+        # Mark the worker as busy before taking a request, so the other workers never see an empty queue and no busy workers while it has the request
+        if self.busy_since is None or monotonic() - self.busy_since > self.node_timeout / 3:
+            self.frontier_store.mark_busy(self.queue, self.node)
+            self.busy_since = monotonic()
+
+        self.ack_finished_requests()
+        taken = self.frontier_store.pop_request(self.queue, self.node)
+        if taken is None:
+            return None
+
+        request_id, data = taken
+        request = request_from_json(data, self.spider)
+        self.taken_requests[request] = request_id
+        self.idle_since = None
+        self.crawler.stats.inc_value('scheduler/dequeued/frontier')
+        return request
+
+
+    def ack_finished_requests(self):
+        """Remove the requests the engine has finished from the store, once the requests they led to have been queued"""
+        engine_slot = getattr(self.crawler.engine, 'slot', None)
+        in_progress = engine_slot.inprogress if engine_slot is not None else set()
+        for request in [request for request in self.taken_requests if request not in in_progress]:
+            self.frontier_store.ack_request(self.queue, self.taken_requests.pop(request))
+
+
+    def spider_idle(self, spider):
+        """Keep the worker open while the crawl is still running on another worker, and close it once the whole crawl has been idle for FRONTIER_IDLE_SECONDS"""
+        self.ack_finished_requests()
+        self.frontier_store.mark_idle(self.queue, self.node)
+        self.busy_since = None
+
+        # Put back the requests of any worker that was killed before finishing them
+        requeued = self.frontier_store.requeue_requests(self.queue, self.node_timeout)
+        if requeued:
+            spider.logger.warning(f"{requeued} requests taken by a worker that stopped were put back in the queue")
+        if self.frontier_store.count_requests(self.queue) > 0 or self.frontier_store.busy_nodes(self.queue, self.node_timeout) > 0:
+            self.idle_since = None
+            raise DontCloseSpider
+
+        if self.idle_since is None:
+            self.idle_since = monotonic()
+        if monotonic() - self.idle_since < self.idle_seconds:
+            raise DontCloseSpider
+
+
+class FrontierResults:
+    """Save every house a worker scrapes to the shared store, keyed by its Zillow property id, so the houses from every worker of a shared crawl end up in one place for the next spider and the analysis"""
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        frontier_store = open_frontier_store(crawler.settings)
+        if frontier_store is None:
+            raise NotConfigured
+        extension = cls(frontier_store)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+
+    def __init__(self, frontier_store):
+        self.frontier_store = frontier_store
+
+
+    def item_scraped(self, item, spider):
+        house = ItemAdapter(item).asdict()
+        self.frontier_store.save_item(spider.name, house_zpid(house.get('url')), house)
+
+
+    def spider_closed(self, spider):
+        self.frontier_store.close()
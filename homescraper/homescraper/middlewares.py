@@ -4,10 +4,18 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 
-from random import randint
+from collections import Counter
+from datetime import date
+from homescraper.cache import LookupCache
+import logging
+from random import choices
 import requests
 from scrapy import signals
 from scrapy import Request
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
+from time import monotonic
+from twisted.internet.threads import deferToThread
 from urllib.parse import urlencode
 
 
@@ -15,6 +23,9 @@ from urllib.parse import urlencode
 from itemadapter import is_item, ItemAdapter
 
 
+logger = logging.getLogger(__name__)
+
+
 class HomescraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the spider middleware does not modify the
@@ -109,8 +120,150 @@ class HomescraperDownloaderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+def blocked_response_reason(response, blocked_statuses, blocked_markers):
+    """Function to return why a response was blocked by the site, such as a blocked status or a captcha page returned in place of the page, or None if it was not blocked"""
+    if response.status in blocked_statuses:
+        return f"Status {response.status}"
+
+    # Look for the captcha pages that are returned with a normal status
+    for marker in blocked_markers:
+        if marker in response.body:
+            return f"Captcha page ({marker.decode()})"
+    return None
+
+
+def daily_proxy_credits(settings, day=None):
+    """Function to return the proxy credits spent on the day (today by default) by every spider that has finished, from the LOOKUP_CACHE_FILE"""
+    credits_cache = LookupCache(settings.get('LOOKUP_CACHE_FILE', 'homedata-cache.sqlite'), 'proxy_credits')
+    daily_credits = credits_cache.get(day or str(date.today())) or 0
+    credits_cache.close()
+    return daily_credits
+
+
+def shard_credit_limit(settings, shard_count):
+    """Function to return the proxy credits each shard of a sharded crawl may spend, its share of the run limit or of the credits left today, whichever is smaller, or None if neither limit is set"""
+    credit_limits = []
+    if settings.get('SCRAPEOPS_CREDIT_RUN_LIMIT') is not None:
+        credit_limits.append(float(settings.get('SCRAPEOPS_CREDIT_RUN_LIMIT')))
+    if settings.get('SCRAPEOPS_CREDIT_DAILY_LIMIT') is not None:
+        credit_limits.append(max(0, float(settings.get('SCRAPEOPS_CREDIT_DAILY_LIMIT')) - daily_proxy_credits(settings)))
+    return min(credit_limits) / shard_count if credit_limits else None
+
+
+class OutcomeStats:
+    """
+    Keeps the number of requests, blocked requests, and the latency for each header profile, proxy option, or site, so the choices that keep getting through can be picked more often, along with how often each key's requests were blocked for each reason.
+
+    Attributes:
+        outcomes (dict): The requests, blocked requests, and total latency for each key.
+        blocked_reasons (dict): A Counter of the reasons the requests sent with each key were blocked, such as "Status 403".
+
+    Methods:
+        record(self, key, blocked, latency):
+            Adds the outcome of one request sent with the key, where `blocked` is the reason it was blocked or None.
+        success_rate(self, key):
+            Returns the estimated share of requests sent with the key that are not blocked, starting at one half for a key that has not been used.
+        choose(self, options, key):
+            Picks one of the options at random, weighted by the success rate of each option's key.
+        summary(self):
+            Returns a list of dictionaries with the requests, blocked requests, reasons the requests were blocked, and average latency for each key.
+
+    Example Usage:
+        header_outcomes = OutcomeStats()
+        header = header_outcomes.choose(headers_list, key=lambda header: header['user-agent'])
+        header_outcomes.record(header['user-agent'], blocked=None, latency=1.2)
+    """
+    def __init__(self):
+        self.outcomes = {}
+        self.blocked_reasons = {}
+
+
+    def record(self, key, blocked, latency):
+        """Add the outcome of one request sent with the key, counting the reason it was blocked if it was"""
+        outcome = self.outcomes.setdefault(key, [0, 0, 0.0])
+        outcome[0] += 1
+        outcome[1] += bool(blocked)
+        outcome[2] += latency or 0
+        if blocked:
+            self.blocked_reasons.setdefault(key, Counter())[blocked] += 1
+
+
+    def success_rate(self, key):
+        """Return the share of the key's requests that were not blocked, counting one blocked and one successful request for every key so new keys are still tried"""
+        requests_sent, requests_blocked, _ = self.outcomes.get(key, (0, 0, 0.0))
+        return (requests_sent - requests_blocked + 1) / (requests_sent + 2)
+
+
+    def choose(self, options, key=lambda option: option):
+        """Pick one of the options at random, picking the options whose requests are blocked less often more often"""
+        return choices(options, weights=[self.success_rate(key(option)) for option in options])[0]
+
+
+    def summary(self):
+        """Return the requests, blocked requests, reasons the requests were blocked from the most to the least common, and average latency for each key"""
+        return [{
+            'key': key,
+            'requests': requests_sent,
+            'blocked': requests_blocked,
+            'blocked_reasons': dict(self.blocked_reasons.get(key, Counter()).most_common()),
+            'average_latency': round(total_latency / requests_sent, 2) if requests_sent else 0,
+        } for key, (requests_sent, requests_blocked, total_latency) in self.outcomes.items()]
+
+
+class ProxyCreditLedger:
+    """
+    Keeps the number of requests sent through the proxy and the proxy credits they cost for each spider and site.
+
+    Attributes:
+        credits (dict): The requests and credits for each (spider name, site).
+
+    Methods:
+        spend(self, spider_name, site, credits):
+            Adds one request sent through the proxy and the credits it cost.
+        total(self, spider_name=None):
+            Returns the credits spent by the spider, or by every spider.
+        summary(self, spider_name=None):
+            Returns a list of dictionaries with the requests and credits for each site of the spider, or of every spider.
+
+    Example Usage:
+        run_credits = ProxyCreditLedger()
+        run_credits.spend("taxspider", "www.countyoffice.org", 10)
+    """
+    def __init__(self):
+        self.credits = {}
+
+
+    def spend(self, spider_name, site, credits):
+        """Add one request sent through the proxy and the credits it cost"""
+        site_credits = self.credits.setdefault((spider_name, site), [0, 0])
+        site_credits[0] += 1
+        site_credits[1] += credits
+
+
+    def total(self, spider_name=None):
+        """Return the credits spent by the spider, or by every spider if no spider is given"""
+        return sum(credits for (name, _), (_, credits) in self.credits.items() if spider_name is None or name == spider_name)
+
+
+    def summary(self, spider_name=None):
+        """Return the requests and credits for each site of the spider, or of every spider if no spider is given"""
+        return [{
+            'spider': name,
+            'site': site,
+            'requests': requests_sent,
+            'credits': credits,
+        } for (name, site), (requests_sent, credits) in self.credits.items() if spider_name is None or name == spider_name]
+
+
 class ScrapeOpsFakeBrowserHeadersMiddleware:
 
+    # The browser headers shared by every spider in the process, so the header list is only fetched once per run
+    shared_headers_lists = {}
+    refreshing_headers_lists = set()
+
+    # How often the requests sent with each browser's headers are blocked, shared by every spider in the process so later spiders start from what was learned
+    header_outcomes = OutcomeStats()
+
     @classmethod
     def from_crawler(cls, crawler):
         return cls(crawler.settings)
@@ -120,21 +273,74 @@ class ScrapeOpsFakeBrowserHeadersMiddleware:
         self.scrapeops_endpoint = settings.get('SCRAPEOPS_FAKE_HEADERS_ENDPOINT', 'http://headers.scrapeops.io/v1/browser-headers?') 
         self.scrapeops_fake_headers_active = settings.get('SCRAPEOPS_FAKE_HEADERS_ENABLED', False)
         self.scrapeops_num_results = settings.get('SCRAPEOPS_NUM_RESULTS')
-        self.headers_list = []
+        self.scrapeops_headers_timeout = settings.getfloat('SCRAPEOPS_FAKE_HEADERS_TIMEOUT', 10)
+        self.headers_cache_path = settings.get('LOOKUP_CACHE_FILE', 'homedata-cache.sqlite')
+        self.headers_cache_ttl = settings.getfloat('SCRAPEOPS_FAKE_HEADERS_CACHE_HOURS', 24) * 60 * 60
+        self.headers_key = f"{self.scrapeops_endpoint}{self.scrapeops_num_results}"
+        self.blocked_statuses = set(settings.getlist('BLOCKED_STATUSES', [403, 429, 503]))
+        self.blocked_markers = [marker.encode() for marker in settings.getlist('BLOCKED_PAGE_MARKERS')]
         self._get_headers_list()
         self._scrapeops_fake_headers_enabled()
 
-    def _get_headers_list(self):
+    @property
+    def headers_list(self):
+        return self.shared_headers_lists.get(self.headers_key, [])
+
+    def _fetch_headers_list(self):
         payload = {'api_key': self.scrapeops_api_key}
         if self.scrapeops_num_results is not None:
             payload['num_results'] = self.scrapeops_num_results
-        response = requests.get(self.scrapeops_endpoint, params=urlencode(payload))
+        response = requests.get(self.scrapeops_endpoint, params=urlencode(payload), timeout=self.scrapeops_headers_timeout)
         json_response = response.json()
-        self.headers_list = json_response.get('result', [])
+        return json_response.get('result', [])
+
+    def _get_headers_list(self):
+        # Use the headers already loaded by another spider in this run
+        if self.headers_key in self.shared_headers_lists:
+            return
+
+        # Otherwise use the headers saved by an earlier run, even if they are out of date
+        headers_cache = LookupCache(self.headers_cache_path, 'browser_headers')
+        headers_list, headers_age = headers_cache.get_with_age(self.headers_key)
+        headers_cache.close()
+        if headers_list:
+            self.shared_headers_lists[self.headers_key] = headers_list
+            
+            # Refresh out of date headers in a background thread so the crawl does not wait on them
+            if headers_age > self.headers_cache_ttl:
+                self._refresh_headers_list()
+            return
+
+        # Fetch the headers before the crawl starts the first time the project runs
+        try:
+            self._save_headers_list(self._fetch_headers_list())
+        except (requests.RequestException, ValueError) as error:
+            logger.warning(f"The browser headers could not be loaded from ScrapeOps, so the default headers will be used: {type(error).__name__}")
+
+    def _refresh_headers_list(self):
+        if self.headers_key in self.refreshing_headers_lists:
+            return
+        self.refreshing_headers_lists.add(self.headers_key)
+
+        # Keep using the saved headers if the refresh fails or is slow
+        refresh = deferToThread(self._fetch_headers_list)
+        refresh.addCallback(self._save_headers_list)
+        refresh.addErrback(lambda failure: logger.warning(f"The browser headers could not be refreshed from ScrapeOps, so the saved headers will be used: {failure.type.__name__}"))
+        refresh.addBoth(lambda _: self.refreshing_headers_lists.discard(self.headers_key))
+
+    def _save_headers_list(self, headers_list):
+        if not headers_list:
+            return
+        self.shared_headers_lists[self.headers_key] = headers_list
+
+        # Save the headers for the next runs
+        headers_cache = LookupCache(self.headers_cache_path, 'browser_headers')
+        headers_cache.set(self.headers_key, headers_list)
+        headers_cache.close()
 
     def _get_random_header(self):
-        random_index = randint(0, len(self.headers_list) - 1)
-        return self.headers_list[random_index]
+        # Pick the headers of the browsers that are blocked less often more often
+        return self.header_outcomes.choose(self.headers_list, key=lambda header: header.get('user-agent'))
 
     def _scrapeops_fake_headers_enabled(self):
         if self.scrapeops_api_key is None or self.scrapeops_api_key == '' or self.scrapeops_fake_headers_active == False:
@@ -142,6 +348,10 @@ class ScrapeOpsFakeBrowserHeadersMiddleware:
         self.scrapeops_fake_headers_active = True
     
     def process_request(self, request, spider):        
+        # Keep the default headers if no browser headers could be loaded
+        if not self.headers_list:
+            return None
+        
         random_header = self._get_random_header()
         
         request.headers['accept-language'] = random_header['accept-language']
@@ -155,22 +365,61 @@ class ScrapeOpsFakeBrowserHeadersMiddleware:
         request.headers['user-agent'] = random_header['user-agent']
         request.headers['upgrade-insecure-requests'] = random_header['upgrade-insecure-requests']
         
+        # Remember which browser's headers were sent to record whether the request is blocked
+        request.meta['header_profile'] = random_header.get('user-agent')
+        
         # Display the new headers as they are created
         # print("*************** New Header ***************")
         # print(request.headers)
+
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('header_profile') is not None:
+            blocked = blocked_response_reason(response, self.blocked_statuses, self.blocked_markers)
+            self.header_outcomes.record(request.meta['header_profile'], blocked, request.meta.get('download_latency'))
+        return response
         
 
 class ScrapeOpsProxyMiddleware:
+    """Send requests through the ScrapeOps proxy, picking the proxy options that are blocked less often by each site, and pause every request to a site after it blocks CIRCUIT_BREAKER_BLOCKS requests in a row instead of spending proxy credits on requests that will be blocked. The paused requests are held outside the downloader so the other sites keep downloading, then one request is put back in the scheduler to test the site after the pause, and the rest are put back once it gets through.
+
+    The proxy credits of each request are counted when it is sent, weighted by SCRAPEOPS_CREDIT_COSTS for render_js and residential requests. Once SCRAPEOPS_CREDIT_SHED_RATIO of the SCRAPEOPS_CREDIT_RUN_LIMIT or SCRAPEOPS_CREDIT_DAILY_LIMIT is spent, only requests with a priority of at least SCRAPEOPS_CREDIT_SHED_PRIORITY are sent, such as the tax and rent lookups of houses already found, and every request is dropped once a limit is reached. The credits spent by each spider on each site are logged when the spider finishes."""
+
+    # The proxy credits spent by every spider in the process, so the run limit covers every spider of the run
+    run_credits = ProxyCreditLedger()
 
     @classmethod
     def from_crawler(cls, crawler):
-        return cls(crawler.settings)
+        middleware = cls(crawler.settings)
+        middleware.crawler = crawler
+        middleware.stats = crawler.stats
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
 
 
     def __init__(self, settings):
         self.scrapeops_api_key = settings.get('SCRAPEOPS_API_KEY')
         self.scrapeops_endpoint = 'https://proxy.scrapeops.io/v1/?'
         self.scrapeops_proxy_active = settings.get('SCRAPEOPS_PROXY_ENABLED', False)
+        self.proxy_options = settings.getlist('SCRAPEOPS_PROXY_OPTIONS') or [{}]
+        self.blocked_statuses = set(settings.getlist('BLOCKED_STATUSES', [403, 429, 503]))
+        self.blocked_markers = [marker.encode() for marker in settings.getlist('BLOCKED_PAGE_MARKERS')]
+        self.circuit_blocks = settings.getint('CIRCUIT_BREAKER_BLOCKS', 5)
+        self.circuit_pause = settings.getfloat('CIRCUIT_BREAKER_PAUSE', 300)
+        self.site_outcomes = OutcomeStats()
+        self.proxy_option_outcomes = OutcomeStats()
+        self.circuits = {}
+        self.credit_costs = dict({'request': 1, 'render_js': 10, 'residential': 10}, **(settings.getdict('SCRAPEOPS_CREDIT_COSTS') or {}))
+        self.credit_run_limit = float(settings.get('SCRAPEOPS_CREDIT_RUN_LIMIT')) if settings.get('SCRAPEOPS_CREDIT_RUN_LIMIT') is not None else None
+        self.credit_daily_limit = float(settings.get('SCRAPEOPS_CREDIT_DAILY_LIMIT')) if settings.get('SCRAPEOPS_CREDIT_DAILY_LIMIT') is not None else None
+        self.credit_shed_ratio = settings.getfloat('SCRAPEOPS_CREDIT_SHED_RATIO', 0.8)
+        self.credit_shed_priority = settings.getint('SCRAPEOPS_CREDIT_SHED_PRIORITY', 1)
+        self.credits_cache_path = settings.get('LOOKUP_CACHE_FILE', 'homedata-cache.sqlite')
+        self.credits_day = str(date.today())
+        
+        # Start from the credits spent earlier today by the spiders that have finished, in this run or an earlier one
+        self.daily_credits_before = daily_proxy_credits(settings, self.credits_day)
 
 
     @staticmethod
@@ -188,8 +437,9 @@ class ScrapeOpsProxyMiddleware:
             url=real_url.decode(response.headers.encoding))
     
 
-    def _get_scrapeops_url(self, request):
+    def _get_scrapeops_payload(self, request):
         payload = {'api_key': self.scrapeops_api_key, 'url': request.url}
+        payload.update(self.proxy_options[request.meta.get('sops_option', 0)])
         if self._param_is_true(request, 'sops_render_js'):
             payload['render_js'] = True
         if self._param_is_true(request, 'sops_residential'): 
@@ -198,19 +448,148 @@ class ScrapeOpsProxyMiddleware:
             payload['keep_headers'] = True
         if request.meta.get('sops_country') is not None:
             payload['country'] = request.meta.get('sops_country')
-        proxy_url = self.scrapeops_endpoint + urlencode(payload)
+        return payload
+
+
+    def _get_scrapeops_url(self, request):
+        proxy_url = self.scrapeops_endpoint + urlencode(self._get_scrapeops_payload(request))
         return proxy_url
 
 
+    def _request_credits(self, payload):
+        """Return the proxy credits a request costs, multiplying the cost of a request by the cost of each of its expensive proxy options"""
+        credits = self.credit_costs['request']
+        for option in ('render_js', 'residential'):
+            if payload.get(option):
+                credits *= self.credit_costs[option]
+        return credits
+
+
+    def _credit_limit_reason(self, request, credits, spider):
+        """Return why the request would spend more proxy credits than the limits allow, or None if it can be sent. Requests below the shed priority are dropped once most of a limit is spent"""
+        for limit_name, limit, spent in (("run", self.credit_run_limit, self.run_credits.total()), ("daily", self.credit_daily_limit, self.daily_credits_before + self.run_credits.total(spider.name))):
+            if limit is None:
+                continue
+            if spent + credits > limit:
+                return f"the {limit_name} limit of {limit:g} proxy credits was reached"
+            if spent + credits > limit * self.credit_shed_ratio and request.priority < self.credit_shed_priority:
+                return f"{self.credit_shed_ratio:.0%} of the {limit_name} limit of {limit:g} proxy credits was spent and the request has a low priority"
+        return None
+
+
+    def _spend_credits(self, request, site, credits, spider):
+        """Count the proxy credits of a request that is about to be sent, or drop the request if it would go over the limits"""
+        limit_reason = self._credit_limit_reason(request, credits, spider)
+        if limit_reason is not None:
+            self.stats.inc_value('proxy_credits/dropped_requests')
+            raise IgnoreRequest(f"Dropped {request.url}: {limit_reason}")
+        self.run_credits.spend(spider.name, site, credits)
+
+
     def _scrapeops_proxy_enabled(self):
         if self.scrapeops_api_key is None or self.scrapeops_api_key == '' or self.scrapeops_proxy_active == False:
             return False
         return True
-    
+
+
+    def _get_circuit(self, site):
+        """Return the blocked requests in a row for a site, when its circuit can be tested again, and the requests held while it is open"""
+        if site not in self.circuits:
+            self.circuits[site] = {'blocks': 0, 'open_until': None, 'test_until': 0, 'held': [], 'release': None}
+        return self.circuits[site]
+
+
+    def _check_circuit(self, request, site):
+        """Hold the request while the site's circuit is open, letting one request through to test the site after each pause"""
+        circuit = self._get_circuit(site)
+        if circuit['open_until'] is None or request.meta.get('circuit_test'):
+            return
+        
+        # Send the first request after the pause as the test, giving it one more pause to finish before another request is tested
+        now = monotonic()
+        if now >= circuit['open_until'] and now >= circuit['test_until']:
+            circuit['test_until'] = now + self.circuit_pause
+            request.meta['circuit_test'] = True
+            return
+        
+        # Keep a copy to put back in the scheduler later and drop the request from the downloader, so it does not take up one of the CONCURRENT_REQUESTS while it waits
+        circuit['held'].append(request.replace(dont_filter=True))
+        request.errback = None
+        raise IgnoreRequest(f"{site} is paused after blocking {circuit['blocks']} requests in a row")
+
+
+    def _release_requests(self, site):
+        """Put the requests held while the site's circuit was open back in the scheduler, all of them once the circuit is closed or one of them to test the site after a pause"""
+        circuit = self._get_circuit(site)
+        circuit['release'] = None
+        release_count = len(circuit['held']) if circuit['open_until'] is None else 1
+        for request in circuit['held'][:release_count]:
+            self.crawler.engine.crawl(request)
+        del circuit['held'][:release_count]
+
+
+    def _schedule_release(self, site, delay):
+        """Put a held request back in the scheduler to test the site once the pause is over"""
+        from twisted.internet import reactor
+        
+        circuit = self._get_circuit(site)
+        if circuit['release'] is None or not circuit['release'].active():
+            circuit['release'] = reactor.callLater(delay, self._release_requests, site)
+
+
+    def _record_circuit(self, request, blocked, spider):
+        """Count the blocked requests in a row from a site, opening its circuit once there are too many and closing it once a test request gets through"""
+        circuit = self._get_circuit(request.meta.get('circuit_site'))
+        
+        # Only the test request can close an open circuit, since the other responses were sent before it opened
+        if circuit['open_until'] is not None:
+            if not request.meta.pop('circuit_test', False):
+                return
+            circuit['test_until'] = 0
+            if blocked:
+                circuit['open_until'] = monotonic() + self.circuit_pause
+                self._schedule_release(request.meta.get('circuit_site'), self.circuit_pause)
+                spider.logger.warning(f"{blocked} from {request.meta.get('circuit_site')} while testing it, pausing its requests for {self.circuit_pause} more seconds")
+            else:
+                circuit['blocks'] = 0
+                circuit['open_until'] = None
+                spider.logger.info(f"{request.meta.get('circuit_site')} is no longer blocking requests, resuming its {len(circuit['held'])} paused requests")
+                self._release_requests(request.meta.get('circuit_site'))
+            return
+        
+        if not blocked:
+            circuit['blocks'] = 0
+            return
+        circuit['blocks'] += 1
+        if circuit['blocks'] >= self.circuit_blocks:
+            circuit['open_until'] = monotonic() + self.circuit_pause
+            self._schedule_release(request.meta.get('circuit_site'), self.circuit_pause)
+            spider.logger.warning(f"{circuit['blocks']} requests in a row were blocked by {request.meta.get('circuit_site')}, pausing its requests for {self.circuit_pause} seconds")
+
+
     def process_request(self, request, spider):
-        if self._scrapeops_proxy_enabled is False or self.scrapeops_endpoint in request.url:
+        # Remember the site before the request is sent through the proxy
+        site = request.meta.setdefault('circuit_site', urlparse_cached(request).hostname)
+        if self.circuit_blocks > 0:
+            self._check_circuit(request, site)
+        
+        if not self._scrapeops_proxy_enabled():
+            return None
+        
+        # A retry of a request that was already sent through the proxy spends its credits again
+        if self.scrapeops_endpoint in request.url:
+            if not request.meta.pop('sops_credits_spent', False):
+                self._spend_credits(request, site, request.meta.get('sops_credits', self.credit_costs['request']), spider)
             return None
         
+        # Pick the proxy options that are blocked less often by the site more often
+        request.meta['sops_option'] = self.proxy_option_outcomes.choose(range(len(self.proxy_options)), key=lambda option: (site, option))
+        
+        # Drop the request instead of going over the proxy credit limits, counting its credits once it is sent
+        request.meta['sops_credits'] = self._request_credits(self._get_scrapeops_payload(request))
+        self._spend_credits(request, site, request.meta['sops_credits'], spider)
+        request.meta['sops_credits_spent'] = True
+        
         scrapeops_url = self._get_scrapeops_url(request)
         new_request = request.replace(
             cls=Request, url=scrapeops_url, meta=request.meta)
@@ -219,5 +598,205 @@ class ScrapeOpsProxyMiddleware:
 
     def process_response(self, request, response, spider):
         new_response = self._replace_response_url(response)
+        
+        # Record whether the site blocked the request and with which proxy options
+        site = request.meta.get('circuit_site')
+        if site is not None:
+            blocked = blocked_response_reason(response, self.blocked_statuses, self.blocked_markers)
+            latency = request.meta.get('download_latency')
+            self.site_outcomes.record(site, blocked, latency)
+            if self.scrapeops_endpoint in request.url:
+                self.proxy_option_outcomes.record((site, request.meta.get('sops_option', 0)), blocked, latency)
+            if self.circuit_blocks > 0:
+                self._record_circuit(request, blocked, spider)
         return new_response
 
+
+    def process_exception(self, request, exception, spider):
+        # Let another request test the site if the test request failed without a response
+        site = request.meta.get('circuit_site')
+        if request.meta.pop('circuit_test', False) and site in self.circuits:
+            self.circuits[site]['test_until'] = 0
+            if self.circuits[site]['held']:
+                self._release_requests(site)
+        return None
+
+
+    def spider_idle(self, spider):
+        # Keep the spider open while requests are held for a paused site
+        if any(circuit['held'] for circuit in self.circuits.values()):
+            raise DontCloseSpider
+
+
+    def spider_closed(self, spider):
+        for circuit in self.circuits.values():
+            if circuit['release'] is not None and circuit['release'].active():
+                circuit['release'].cancel()
+        
+        for site in self.site_outcomes.summary():
+            blocked_reasons = ", ".join(f"{count} {reason}" for reason, count in site['blocked_reasons'].items())
+            spider.logger.info(f"{site['key']}: {site['requests']} responses, {site['blocked']} blocked" + (f" ({blocked_reasons})" if blocked_reasons else "") + f", {site['average_latency']} second average latency")
+        
+        # Report the proxy credits the spider spent on each site and on each house it saved
+        spider_credits = self.run_credits.total(spider.name)
+        houses_saved = self.stats.get_value('item_scraped_count', 0)
+        for site in self.run_credits.summary(spider.name):
+            spider.logger.info(f"{site['site']}: {site['requests']} proxy requests, {site['credits']:g} proxy credits")
+        spider.logger.info(f"{spider_credits:g} proxy credits spent by {spider.name}" + (f", {spider_credits / houses_saved:.1f} for each of its {houses_saved} houses" if houses_saved else "") + f", {self.run_credits.total():g} this run, and {self.daily_credits_before + spider_credits:g} today")
+        self.stats.set_value('proxy_credits/spent', spider_credits)
+        
+        # Add the spider's credits to today's credits for the later spiders and runs, without losing the credits of shards that finish at the same time
+        if spider_credits:
+            credits_cache = LookupCache(self.credits_cache_path, 'proxy_credits')
+            credits_cache.add(self.credits_day, spider_credits)
+            credits_cache.close()
+
+
+class AdaptiveConcurrencyMiddleware:
+    """Raise the number of requests sent at the same time to each site while the site stays fast and does not block any requests, and back off as soon as the latency rises or requests are blocked. Each site in ADAPTIVE_CONCURRENCY_BUDGETS has its own download slot and concurrency limit, even when every request is sent through the ScrapeOps proxy, and the sites share the proxy's concurrency limit when the proxy is enabled."""
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.adaptive_concurrency_active = settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED', False)
+        self.proxy_active = settings.getbool('SCRAPEOPS_PROXY_ENABLED', False) and bool(settings.get('SCRAPEOPS_API_KEY'))
+        self.budgets = settings.getdict('ADAPTIVE_CONCURRENCY_BUDGETS')
+        self.proxy_max_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_PROXY_MAX', 16)
+        self.window = settings.getint('ADAPTIVE_CONCURRENCY_WINDOW', 10)
+        self.latency_factor = settings.getfloat('ADAPTIVE_CONCURRENCY_LATENCY_FACTOR', 2.0)
+        self.max_delay = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY', 60.0)
+        self.blocked_statuses = set(settings.getlist('BLOCKED_STATUSES', [403, 429, 503]))
+        self.blocked_markers = [marker.encode() for marker in settings.getlist('BLOCKED_PAGE_MARKERS')]
+        self.start_concurrency = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN', 1)
+        self.start_delay = settings.getfloat('DOWNLOAD_DELAY', 0)
+        self.sites = {}
+
+
+    def _get_site(self, site):
+        """Return the concurrency, delay, and recent responses for a site in the budgets, starting from the default settings the first time the site is seen"""
+        if site not in self.sites:
+            budget = self.budgets[site]
+            
+            # Requests sent through the proxy come from a different address each time, so the site can be sent more requests with less delay between them
+            if self.proxy_active:
+                max_concurrency = budget.get('proxy_max_concurrency', budget.get('max_concurrency', self.start_concurrency))
+                min_delay = budget.get('proxy_min_delay', 0)
+            else:
+                max_concurrency = budget.get('max_concurrency', self.start_concurrency)
+                min_delay = budget.get('min_delay', self.start_delay)
+            
+            self.sites[site] = {
+                'concurrency': min(self.start_concurrency, max_concurrency),
+                'delay': max(self.start_delay, min_delay),
+                'max_concurrency': max_concurrency,
+                'min_delay': min_delay,
+                'best_latency': None,
+                'latencies': [],
+                'last_change': monotonic(),
+            }
+        return self.sites[site]
+
+
+    def _apply_site(self, site):
+        """Set the concurrency and delay of the site's download slot, which is recreated with the default settings after it sits idle"""
+        slot = self.crawler.engine.downloader.slots.get(site)
+        if slot is not None:
+            slot.concurrency = self.sites[site]['concurrency']
+            slot.delay = self.sites[site]['delay']
+
+
+    def _proxy_concurrency_left(self, site):
+        """Return how many more requests the site can send at the same time before the sites use up the proxy's concurrency limit"""
+        if not self.proxy_active:
+            return self.sites[site]['max_concurrency']
+        return self.proxy_max_concurrency - sum(site_values['concurrency'] for site_values in self.sites.values())
+
+
+    def _back_off(self, site, spider, reason):
+        """Halve the site's concurrency and double its delay after a blocked request"""
+        site_values = self.sites[site]
+        site_values['concurrency'] = max(1, site_values['concurrency'] // 2)
+        site_values['delay'] = min(self.max_delay, max(site_values['delay'] * 2, site_values['min_delay'], 1))
+        site_values['latencies'] = []
+        site_values['last_change'] = monotonic()
+        self._apply_site(site)
+        spider.logger.info(f"{reason} from {site}, backing off to {site_values['concurrency']} requests at a time with a {site_values['delay']} second delay")
+
+
+    def _record_latency(self, site, latency, spider):
+        """Keep the latency of each response and update the site's concurrency after every window of responses"""
+        site_values = self.sites[site]
+        site_values['latencies'].append(latency)
+        if len(site_values['latencies']) < self.window:
+            return
+        
+        # Compare the average latency of the window to the best window seen so far
+        average_latency = sum(site_values['latencies']) / len(site_values['latencies'])
+        site_values['latencies'] = []
+        if site_values['best_latency'] is None or average_latency < site_values['best_latency']:
+            site_values['best_latency'] = average_latency
+        
+        # Send one more request at a time and halve the delay while the site stays fast
+        if average_latency <= site_values['best_latency'] * self.latency_factor:
+            if site_values['concurrency'] < site_values['max_concurrency'] and self._proxy_concurrency_left(site) > 0:
+                site_values['concurrency'] += 1
+            site_values['delay'] = max(site_values['min_delay'], site_values['delay'] / 2 if site_values['delay'] > 0.1 else 0)
+        
+        # Send one less request at a time when the site slows down
+        else:
+            site_values['concurrency'] = max(1, site_values['concurrency'] - 1)
+        
+        site_values['last_change'] = monotonic()
+        self._apply_site(site)
+        spider.logger.debug(f"{site} averaged {average_latency:.2f} seconds, sending {site_values['concurrency']} requests at a time with a {site_values['delay']} second delay")
+
+
+    def _sent_before_change(self, request, site):
+        """Determine if the request was sent before the site's concurrency was last changed, so the responses already in flight do not change it again"""
+        sent_time = monotonic() - request.meta.get('download_latency', 0)
+        return sent_time < self.sites[site]['last_change']
+
+
+    def process_request(self, request, spider):
+        if not self.adaptive_concurrency_active:
+            return None
+        
+        # Give each site its own download slot before the request is sent through the proxy
+        site = request.meta.get('download_slot') or urlparse_cached(request).hostname
+        if site not in self.budgets:
+            return None
+        request.meta['download_slot'] = site
+        self._get_site(site)
+        self._apply_site(site)
+        return None
+
+
+    def process_response(self, request, response, spider):
+        site = request.meta.get('download_slot')
+        if not self.adaptive_concurrency_active or site not in self.sites:
+            return response
+        
+        # Back off when the site blocks a request sent with the current concurrency
+        blocked = blocked_response_reason(response, self.blocked_statuses, self.blocked_markers)
+        if blocked:
+            if not self._sent_before_change(request, site):
+                self._back_off(site, spider, blocked)
+        else:
+            self._record_latency(site, request.meta.get('download_latency', 0), spider)
+        return response
+
+
+    def process_exception(self, request, exception, spider):
+        site = request.meta.get('download_slot')
+        if not self.adaptive_concurrency_active or site not in self.sites:
+            return None
+        
+        # Treat timeouts and dropped connections the same as blocked requests, but not the requests a later middleware dropped before they reached the site
+        if not isinstance(exception, IgnoreRequest) and not self._sent_before_change(request, site):
+            self._back_off(site, spider, type(exception).__name__)
+        return None
@@ -23,7 +23,7 @@ class HomescraperPipeline:
             adapter['address'] = raw_address[0]
         
         # Remove all the '$' and ',' from price if they are in the price
-        if "$" and "," in adapter.get('price'):
+        if adapter.get('price') and "$" and "," in adapter.get('price'):
             value = adapter.get('price').replace('$', '').replace(',', '')
             adapter['price'] = value
         
@@ -87,8 +87,8 @@ class TaxscraperPipeline:
         
         adapter = ItemAdapter(item)
         
-        # Remove all the '$' and ',' from tax if they are in the tax
-        if "$" and "," in adapter.get('tax'):
+        # Remove all the '$' and ',' from tax if they are in the tax, skipping houses whose tax was not found
+        if adapter.get('tax') and "$" and "," in adapter.get('tax'):
             value = adapter.get('tax').replace('$', '').replace(',', '')
             adapter['tax'] = value
         
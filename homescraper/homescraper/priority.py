@@ -0,0 +1,108 @@
+# Define here how promising each house looks before its taxes and rent are scraped
+#
+# The tax and rent requests of the houses most likely to be featured are given a higher Scrapy priority, so they are
+# finished first and the houses saved before a time-boxed run or the proxy credits run out are the most useful ones.
+
+import math
+import re
+from bisect import insort
+
+
+class DealPriority:
+    """
+    Scores how promising a house looks from the details on its search result and turns the score into a Scrapy priority for its tax and rent requests.
+
+    The score adds up three cheap signals, each as a base 2 logarithm so they weigh the same: the number of units from the property subtype (a duplex scores 1 more than a single family house), how far the price is below the median price of the houses seen so far in the same zip code, and how far the price per square foot is below the median price per square foot. The medians are taken over every house seen so far until a zip code has `min_area_houses` houses. An average single family house scores 0, and each house should only be scored once, since scoring it adds it to the medians.
+
+    Attributes:
+        levels (int): The number of priorities the scores are spread across.
+        min_area_houses (int): The number of houses a zip code needs before its own median is used.
+        prices (dict): The sorted prices of the houses seen in each zip code, with every house under None.
+        prices_per_sqft (dict): The sorted prices per square foot of the houses seen in each zip code, with every house under None.
+
+    Methods:
+        score(self, house):
+            Returns the score of the house, adding it to the medians.
+        level(self, score):
+            Returns the priority level from 0 to `levels` - 1 for a score, with an average house in the middle.
+
+    Example Usage:
+        deal_priority = DealPriority()
+        yield response.follow(rent_page_url(house), callback=self.parse_rent_page, priority=deal_priority(house))
+    """
+    property_units = {
+        'duplex': 2,
+        'triplex': 3,
+        'quadplex': 4,
+        'quinplex': 5
+    }
+
+    def __init__(self, levels=10, min_area_houses=5):
+
+        self.levels = levels
+        self.min_area_houses = min_area_houses
+        self.prices = {}
+        self.prices_per_sqft = {}
+
+
+    def __call__(self, house, base=0):
+        """Return the priority for the house's requests, starting at `base` for the least promising houses"""
+        return base + self.level(self.score(house))
+
+
+    def score(self, house):
+        """Return the score of the house from its units, price, and price per square foot, or 0 if it has no price"""
+        price = house_number(house.get('price'))
+        if not price:
+            return 0.0
+
+        area = house_zip_code(house)
+        score = math.log2(self.number_units(house.get('property_subtype')))
+        score += math.log2(self.median(self.prices, area, price) / price)
+
+        # The pipeline fills in a square footage of 1 when it is missing, so only a real square footage is scored
+        sqft = house_number(house.get('sqft'))
+        if sqft and sqft > 1:
+            price_per_sqft = price / sqft
+            score += math.log2(self.median(self.prices_per_sqft, area, price_per_sqft) / price_per_sqft)
+
+        return score
+
+
+    def level(self, score):
+        """Return the priority level for a score, with each half point of score one level apart"""
+        return min(self.levels - 1, max(0, round(self.levels / 2 + 2 * score)))
+
+
+    def median(self, values, area, value):
+        """Add the value to the values seen in the area and return the median of the area, or of every area while the area has too few houses"""
+        insort(values.setdefault(None, []), value)
+        if area is not None:
+            insort(values.setdefault(area, []), value)
+
+        area_values = values[area] if area is not None and len(values[area]) >= self.min_area_houses else values[None]
+        return area_values[len(area_values) // 2]
+
+
+    def number_units(self, property_subtype):
+        """Return the number of units named in the property subtype, from the cleaned subtype (e.g., "duplex") or the raw text on the house's page"""
+        property_subtype = (property_subtype or "").lower()
+        return next((units for subtype, units in self.property_units.items() if subtype in property_subtype), 1)
+
+
+def house_number(value):
+    """Function to read a price or square footage the pipeline has or has not cleaned yet (e.g., "$199,900" or "2,140 sqft"), or return None if it is not a number"""
+    try:
+        return float(str(value).replace('$', '').replace(',', '').replace(' sqft', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+def house_zip_code(house):
+    """Function to return the zip code at the end of a house's address, or None if it has none"""
+    address = house.get('address')
+    if isinstance(address, list):
+        address = " ".join(address)
+
+    zip_code = re.search(r"(\d{5})(?:-\d{4})?\s*$", address or "")
+    return zip_code.group(1) if zip_code else None
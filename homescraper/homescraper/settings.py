@@ -18,17 +18,28 @@ NEWSPIDER_MODULE = "homescraper.spiders"
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
 #USER_AGENT = "homescraper (+http://www.yourdomain.com)"
 
-# Give a specific file and format to always save the data to
+# Save each spider's data as JSON Lines to the file named by the spider's feed_file, so the data can be read one house at a time while the next spider writes its own file
 FEEDS = {
-    'homedata.json': {'format': 'json', 'overwrite': True}
+    '%(feed_file)s': {'format': 'jsonlines', 'overwrite': True}
 }
 
+# Save the progress of each spider in this folder while the crawl runs, so main.py resumes a crawl that was stopped instead of starting again from the start urls. The folder is deleted once every spider has finished. Set to None to always start from the start urls
+CRAWL_CHECKPOINT_DIR = "crawl-checkpoint"
+
+# Share one crawl between several workers (e.g., main.py on several machines) by keeping the request queues, seen requests, and scraped houses in a shared store. Set to a redis:// url (needs the redis package), or to an sqlite:/// path for workers on one machine, or pass --frontier to main.py. None crawls in this process only
+FRONTIER_URL = None
+# The name the shared values are kept under, so every worker of a crawl must use the same run. main.py uses the date when this is None
+FRONTIER_RUN = None
+# The number of seconds the whole crawl must be idle before the workers close, and the number of seconds before a worker that stopped responding is no longer waited for
+FRONTIER_IDLE_SECONDS = 30
+FRONTIER_NODE_TIMEOUT = 600
+
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-# TODO: Set this to 8 when proxy is off
-CONCURRENT_REQUESTS = 1
+# This is the most requests sent at the same time across every site, and the AdaptiveConcurrencyMiddleware picks how many of these each site is sent
+CONCURRENT_REQUESTS = 16
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -36,7 +47,7 @@ CONCURRENT_REQUESTS = 1
 # TODO: Set this to 3 when proxy is off
 DOWNLOAD_DELAY = 1
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 1 # each site starts at this many requests at a time before the AdaptiveConcurrencyMiddleware raises it
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -64,10 +75,49 @@ SCRAPEOPS_API_KEY = scrapeops_api_key
 # Settings for the scrapeops fake request headers
 SCRAPEOPS_FAKE_HEADERS_ENABLED = True
 SCRAPEOPS_NUM_RESULTS = 34
+# The browser headers are saved in the LOOKUP_CACHE_FILE and shared by every spider, and are refreshed in the background once they are older than this
+SCRAPEOPS_FAKE_HEADERS_CACHE_HOURS = 24
+SCRAPEOPS_FAKE_HEADERS_TIMEOUT = 10
 
 # Settings for the scrapeops proxy 
 SCRAPEOPS_PROXY_ENABLED = True
 SCRAPEOPS_PROXY_SETTINGS = {'country': 'us'}
+# The proxy options to pick from for each request, e.g. add {'residential': True} to let a site that keeps blocking the standard proxy be sent through residential proxies, which cost more credits. The options blocked less often by each site are picked more often
+SCRAPEOPS_PROXY_OPTIONS = [{}]
+
+# Settings for the proxy credit budget. Each request through the proxy costs the 'request' credits, multiplied by the 'render_js' and 'residential' credits when those options are used. Once SCRAPEOPS_CREDIT_SHED_RATIO of the credits allowed for the run or the day are spent, only requests with a priority of at least SCRAPEOPS_CREDIT_SHED_PRIORITY are sent (the tax and rent lookups of the houses already found in the full crawl), and every request is dropped once the limit is reached. Set a limit to None to never drop requests for it
+SCRAPEOPS_CREDIT_COSTS = {'request': 1, 'render_js': 10, 'residential': 10}
+SCRAPEOPS_CREDIT_RUN_LIMIT = None
+SCRAPEOPS_CREDIT_DAILY_LIMIT = None
+SCRAPEOPS_CREDIT_SHED_RATIO = 0.8
+SCRAPEOPS_CREDIT_SHED_PRIORITY = 1
+
+# Settings for detecting blocked requests. A response is blocked when it has one of these statuses or its page contains one of these markers, such as the captcha page Zillow returns in place of a house
+BLOCKED_STATUSES = [403, 429, 503]
+BLOCKED_PAGE_MARKERS = ['px-captcha', 'cf-chl-']
+
+# Settings for pausing a site that keeps blocking requests. After CIRCUIT_BREAKER_BLOCKS blocked requests in a row, the site's requests wait CIRCUIT_BREAKER_PAUSE seconds, then one request is sent to test the site before the rest are sent. Set CIRCUIT_BREAKER_BLOCKS = 0 to never pause
+CIRCUIT_BREAKER_BLOCKS = 5
+CIRCUIT_BREAKER_PAUSE = 300
+
+# Settings for the adaptive concurrency of each site. Each site starts at CONCURRENT_REQUESTS_PER_DOMAIN requests at a time sent DOWNLOAD_DELAY seconds apart. After every window of responses, the site is sent one more request at a time and the delay is halved while the average latency stays within the latency factor of the best window, and one less request at a time when it does not. A blocked request or a timeout halves the concurrency and doubles the delay.
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_BUDGETS = {
+    'www.zillow.com': {'max_concurrency': 2, 'min_delay': 1, 'proxy_max_concurrency': 12, 'proxy_min_delay': 0},
+    'www.countyoffice.org': {'max_concurrency': 2, 'min_delay': 1, 'proxy_max_concurrency': 6, 'proxy_min_delay': 0},
+}
+# The most requests sent at the same time through the proxy across every site, which should match the concurrency of your ScrapeOps plan
+ADAPTIVE_CONCURRENCY_PROXY_MAX = 16
+ADAPTIVE_CONCURRENCY_WINDOW = 10
+ADAPTIVE_CONCURRENCY_LATENCY_FACTOR = 2
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 60
+
+# Settings for the records saved between runs. The tax records and the property page links on each county office street page are looked up again once they are older than TAX_CACHE_TTL_DAYS and STREET_CACHE_TTL_DAYS. Rent estimates older than RENT_CACHE_TTL_DAYS are still used for up to RENT_CACHE_STALE_DAYS more days while they are refreshed at the end of the crawl, and are looked up again before the house is saved after that
+LOOKUP_CACHE_FILE = "homedata-cache.sqlite"
+TAX_CACHE_TTL_DAYS = 180
+STREET_CACHE_TTL_DAYS = 90
+RENT_CACHE_TTL_DAYS = 7
+RENT_CACHE_STALE_DAYS = 30
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
@@ -79,15 +129,19 @@ SCRAPEOPS_PROXY_SETTINGS = {'country': 'us'}
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
 #    "homescraper.middlewares.HomescraperDownloaderMiddleware": 543,
-    "homescraper.middlewares.ScrapeOpsFakeBrowserHeadersMiddleware": 300, # rotate request headers
-    "homescraper.middlewares.ScrapeOpsProxyMiddleware": 400 # rotate proxies, this is helpful if you want to scrape mass amounts of data very quickly
+    # These run between the retry (550) and decompression (590) middlewares, so they see every blocked response before it is retried and can read the pages
+    "homescraper.middlewares.AdaptiveConcurrencyMiddleware": 560, # adapt the concurrency of each site, this must run before the proxy so each site keeps its own download slot
+    "homescraper.middlewares.ScrapeOpsFakeBrowserHeadersMiddleware": 570, # rotate request headers
+    "homescraper.middlewares.ScrapeOpsProxyMiddleware": 580 # rotate proxies, this is helpful if you want to scrape mass amounts of data very quickly
 }
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+# Save every scraped house to the shared store when the crawl is shared between workers
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "homescraper.frontier.FrontierResults": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -0,0 +1,179 @@
+from homescraper.priority import DealPriority
+from homescraper.spiders.homespider import HomespiderSpider
+from homescraper.spiders.rentspider import cache_house_rent, cached_house_rent, open_rent_cache, rent_page_url, update_house_rent
+from homescraper.spiders.taxspider import cache_house_tax, cached_house_tax, open_street_cache, open_tax_cache, street_page_links, StreetPageLookups, tax_property_page_url, tax_street_page_url, update_house_tax
+
+class FullspiderSpider(HomespiderSpider):
+    """Scrape the houses, taxes, and rent in one crawl. The tax and rent lookups for each house are scheduled as soon as the house page is scraped, so they run alongside the rest of the Zillow search instead of waiting for it to finish, and each house is saved once both lookups are done"""
+    name = "fullspider"
+    allowed_domains = ["www.zillow.com", "www.countyoffice.org"]
+
+    # Save the finished houses for the analysis
+    feed_file = "homedata.jsonl"
+
+    # Overwrite any of the settings.py settings for this particular spider \
+    custom_settings = {
+        # Override the default request headers:
+        'DEFAULT_REQUEST_HEADERS': HomespiderSpider.custom_settings['DEFAULT_REQUEST_HEADERS'],
+
+        # Configure custom item pipelines, cleaning the house data and then the tax data of each finished house
+        'ITEM_PIPELINES': {
+            "homescraper.pipelines.HomescraperPipeline": 300,
+            "homescraper.pipelines.TaxscraperPipeline": 400,
+        }
+    }
+
+    # Send the county office requests with its own authority header
+    tax_headers = {'authority': 'www.countyoffice.org'}
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+
+        # Open the tax records, street pages, and rent estimates saved by earlier runs
+        spider.tax_cache = open_tax_cache(crawler.settings)
+        spider.street_lookups = StreetPageLookups(open_street_cache(crawler.settings))
+        spider.rent_cache, spider.rent_stale_seconds = open_rent_cache(crawler.settings)
+
+        # Finish the lookups of the most promising houses first
+        spider.deal_priority = DealPriority()
+
+        # Scrapy's SpiderState extension replaces the state with the one saved by a stopped crawl when the spider opens
+        spider.state = {}
+        return spider
+
+    def closed(self, reason):
+        self.tax_cache.close()
+        self.street_pages.street_cache.close()
+        self.rent_cache.close()
+
+    @property
+    def houses_in_progress(self):
+        """The houses waiting on their lookups, kept in the spider state, which is saved with the request queue when the crawl is stopped, since the requests only carry the house's url once they are saved to disk. The state is read each time since it is only loaded once the spider opens"""
+        return self.state.setdefault('houses_in_progress', {})
+
+    @property
+    def street_pages(self):
+        """The street page lookups, with the houses waiting on each street page kept in the spider state like the houses in progress"""
+        self.street_lookups.pending = self.state.setdefault('street_pages_pending', {})
+        return self.street_lookups
+
+    def house_found(self, response, house):
+        """Start the tax and rent lookups for a house at the same time as soon as it has been scraped"""
+
+        # Skip a house that was saved or started before a stopped crawl was resumed
+        house_url = house.get('url')
+        if house_url in self.saved_house_urls or house_url in self.houses_in_progress:
+            return
+
+        # Keep track of the lookups that still need to finish for the house
+        lookups = set()
+        self.houses_in_progress[house_url] = {'house': house, 'lookups': lookups}
+
+        # Run the lookups ahead of the remaining search pages so finished houses are saved as soon as possible, and the lookups of the most promising houses first
+        priority = self.deal_priority(house, base=1)
+
+        # Skip the tax lookup if it was saved by an earlier run
+        if not cached_house_tax(self.tax_cache, house):
+            lookups.add('tax')
+            tax_url, address_number = tax_street_page_url(house)
+            yield from self.follow_street_page(response, tax_url, {'address_number': address_number, 'house_url': house_url, 'lookup': 'tax', 'priority': priority})
+
+        # Skip the rent lookup if it was saved by an earlier run, refreshing the saved rent after everything else if it is out of date
+        rent_age = cached_house_rent(self.rent_cache, house, self.rent_stale_seconds)
+        if rent_age is None:
+            lookups.add('rent')
+            yield response.follow(rent_page_url(house), callback=self.parse_rent_page, errback=self.lookup_failed, priority=priority, meta={'house_url': house_url, 'lookup': 'rent'})
+        elif rent_age > self.rent_cache.ttl:
+            yield response.follow(rent_page_url(house), callback=self.refresh_rent_page, priority=-1, meta={'house': {'url': house_url}})
+
+        # Save the house right away if both lookups were saved by earlier runs
+        if not lookups:
+            del self.houses_in_progress[house_url]
+            yield house
+
+    def follow_street_page(self, response, street_url, meta):
+        """Go straight to the house's property page if the links on its street page are already known, otherwise wait for the street page, which is only requested for the first house on the street"""
+        links = self.street_pages.known_links(street_url)
+        if links is not None:
+            yield from self.follow_property_page(response, links, meta)
+        elif self.street_pages.add_pending(street_url, meta):
+            yield response.follow(street_url, callback=self.parse_street_page, errback=self.street_page_failed, headers=self.tax_headers, priority=meta.get('priority', 1), dont_filter=True, meta={'street_url': street_url})
+
+    def parse_street_page(self, response):
+        """Parse the tax page and navigate further for every house waiting on the street"""
+
+        # Find the links on the street page once for all the houses on the street
+        links = street_page_links(response)
+        for meta in self.street_pages.resolve(response.meta.get('street_url'), links):
+            yield from self.follow_property_page(response, links, meta)
+
+    def follow_property_page(self, response, links, meta):
+        """Navigate to the property page for the house's address number on its street page"""
+
+        # Find the link for the specific house data
+        property_page_url = tax_property_page_url(links, meta.get('address_number'))
+
+        # Finish the tax lookup without the tax information if the house is not listed
+        if property_page_url is None:
+            yield from self.finish_lookup(meta)
+            return
+
+        # Navigate to the property page to pull the required information
+        yield response.follow(property_page_url, callback=self.parse_property_page, errback=self.lookup_failed, headers=self.tax_headers, priority=meta.get('priority', 1), meta={'house_url': meta.get('house_url'), 'lookup': meta.get('lookup')})
+
+    def parse_property_page(self, response):
+        """Crawl and gather the tax information for a given house"""
+        house = self.house_in_progress(response.meta)
+        if house is not None:
+            update_house_tax(house, response)
+            cache_house_tax(self.tax_cache, house)
+
+        yield from self.finish_lookup(response.meta)
+
+    def parse_rent_page(self, response):
+        """Crawl and gather the rent information for a given house"""
+        house = self.house_in_progress(response.meta)
+        if house is not None:
+            update_house_rent(house, response)
+            cache_house_rent(self.rent_cache, house)
+
+        yield from self.finish_lookup(response.meta)
+
+    def refresh_rent_page(self, response):
+        """Save the latest rent information for a house that was already saved with out of date rent"""
+        house = response.meta.get('house')
+        update_house_rent(house, response)
+        cache_house_rent(self.rent_cache, house)
+
+        # The house was already saved, so nothing is returned
+        return []
+
+    def lookup_failed(self, failure):
+        """Finish a tax or rent lookup whose request failed, so the house is still saved with the information that was found"""
+        self.logger.warning(f"The {failure.request.meta.get('lookup')} lookup failed for {failure.request.meta.get('house_url')}: {failure.value!r}")
+
+        yield from self.finish_lookup(failure.request.meta)
+
+    def street_page_failed(self, failure):
+        """Finish the tax lookup of every house waiting on a street page whose request failed"""
+        self.logger.warning(f"The street page {failure.request.meta.get('street_url')} failed: {failure.value!r}")
+
+        for meta in self.street_pages.fail(failure.request.meta.get('street_url')):
+            yield from self.finish_lookup(meta)
+
+    def house_in_progress(self, meta):
+        """Return the house a lookup is for, or None if the house was already saved"""
+        progress = self.houses_in_progress.get(meta.get('house_url'))
+        return progress['house'] if progress is not None else None
+
+    def finish_lookup(self, meta):
+        """Mark a lookup as finished and save the house once both of its lookups have finished"""
+        progress = self.houses_in_progress.get(meta.get('house_url'))
+        if progress is None:
+            return
+
+        progress['lookups'].discard(meta.get('lookup'))
+        if not progress['lookups']:
+            del self.houses_in_progress[meta.get('house_url')]
+            yield progress['house']
@@ -1,19 +1,35 @@
+import json
+import math
+import re
 import scrapy
+from homescraper.checkpoint import saved_house_urls
 from homescraper.items import HomeItem
-from analysis_functions import load_json
+from analysis_functions import FeaturedHousePrescreen, load_json
+
+# Load config file with all the start urls and the house details that must be scraped
+config = load_json("config.json")
 
 class HomespiderSpider(scrapy.Spider):
     name = "homespider"
     allowed_domains = ["www.zillow.com"]
-    
+
+    # Save the scraped houses for the taxspider to read
+    feed_file = "homedata-homes.jsonl"
+
     # Load config file with all the start urls
-    start_urls = load_json("config.json")['starturls']
+    start_urls = config['starturls']
+
+    # Only go to a house's page when the search results are missing one of these details
+    detail_fields = config.get('house_detail_fields') or ['address', 'price']
+
+    # Save the request queue while the search runs so a stopped crawl resumes from the search page it stopped on
+    checkpoint_requests = True
 
     # Overwrite any of the settings.py settings for this particular spider \
     custom_settings = {
         # Close the spider after a certain number of items have been scraped
         # 'CLOSESPIDER_ITEMCOUNT': 10,
-        
+
         # Override the default request headers:
         'DEFAULT_REQUEST_HEADERS': {
             'authority': 'www.zillow.com',
@@ -23,38 +39,83 @@ class HomespiderSpider(scrapy.Spider):
             'sec-fetch-mode': 'navigate',
             'sec-fetch-dest': 'document',
         },
-        
+
         # Configure custom item pipelines
         'ITEM_PIPELINES': {
             "homescraper.pipelines.HomescraperPipeline": 300,
         }
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+
+        # Skip the houses saved before a stopped crawl was resumed
+        spider.saved_house_urls = saved_house_urls(crawler.settings, spider.feed_file)
+
+        # Drop the houses that could never be featured before any more of their details are scraped
+        spider.prescreen = FeaturedHousePrescreen.from_config(config)
+        return spider
+
     def parse(self, response):
         """Navigate through each of the houses on a given page"""
-        
-        # Get all of the links for all the houses on the page
-        house_links = response.xpath('//div[1]/ul/li/div/div/article/div/div/a[contains(@data-test, "property-card-link")]/@href').getall()
-        
-        # Loop though all of the links to houses on the given zillow page
-        for link in house_links:
-            # Go into the home page and scrape the data
-            yield response.follow(link, callback=self.parse_zillow_house_page)
-            
-        # Load in the next page
-        next_page = response.xpath('//a[contains(@title, "Next page")][contains(@aria-disabled, "false")]/@href').get()
-        
-        # Determine if there is still a next page
-        if next_page is not None:
-            # Create the url link for that next page
-            next_page_url = "https://www.zillow.com" + next_page
-            # Follow the next page and perform the callback function on the response from following the page
-            yield response.follow(next_page_url, callback=self.parse)
-            
+
+        # Read the houses from the search results embedded in the page
+        search_results = search_page_results(response)
+
+        # Fall back to the links for all the houses on the page if the search results could not be read
+        if search_results is None:
+            # Get all of the links for all the houses on the page
+            house_links = response.xpath('//div[1]/ul/li/div/div/article/div/div/a[contains(@data-test, "property-card-link")]/@href').getall()
+
+            # Loop though all of the links to houses on the given zillow page
+            for link in house_links:
+                # Go into the home page and scrape the data
+                yield response.follow(link, callback=self.parse_zillow_house_page)
+
+        else:
+            # Loop through each of the houses in the search results
+            for search_result in search_results:
+                home_item = search_result_home_item(search_result)
+
+                # Skip any search results that are not a house, such as ads, and the houses saved before a stopped crawl was resumed
+                if not home_item['url'] or home_item['url'] in self.saved_house_urls:
+                    continue
+
+                # Skip the houses whose price alone keeps them from ever being featured, before their page, taxes, or rent are requested
+                if not self.prescreen(home_item['price'], home_item['sqft']):
+                    self.crawler.stats.inc_value('prescreen/dropped')
+                    continue
+
+                # Go into the home page only for the houses missing a required detail
+                if any(not home_item.get(field) for field in self.detail_fields):
+                    yield response.follow(home_item['url'], callback=self.parse_zillow_house_page)
+                else:
+                    yield from self.house_found(response, home_item)
+
+        # Request every other page of the search at once when the first page says how many pages there are, so the pages are not found one round trip at a time
+        page_count = search_page_count(response) if 'search_page' not in response.meta else None
+        if page_count:
+            for page in range(2, page_count + 1):
+                # The dupefilter skips any page that was already requested, such as a page found through a "Next page" link
+                yield response.follow(search_page_url(response.url, page), callback=self.parse, meta={'search_page': page})
+
+        # Follow the "Next page" link one page at a time when the number of pages is not known
+        elif 'search_page' not in response.meta:
+            # Load in the next page
+            next_page = response.xpath('//a[contains(@title, "Next page")][contains(@aria-disabled, "false")]/@href').get()
+
+            # Determine if there is still a next page
+            if next_page is not None:
+                # Create the url link for that next page
+                next_page_url = "https://www.zillow.com" + next_page
+                # Follow the next page and perform the callback function on the response from following the page
+                yield response.follow(next_page_url, callback=self.parse)
+
 
     def parse_zillow_house_page(self, response):
         """Crawl and gather all of the information on a particular house's page"""
-        
+
         home_item = HomeItem()
         home_item['url'] = response.url
         home_item['address'] = response.xpath('//div[contains(@data-testid, "fs-chip-container")]/div/div/div/h1/text()').getall()
@@ -67,6 +128,89 @@ class HomespiderSpider(scrapy.Spider):
         home_item['property_subtype'] = response.xpath('//ul/li/span[contains(text(), "Property subType")]/text()[3]').get()
         home_item['region'] = response.xpath('//ul/li/span[contains(text(), "Region")]/text()[3]').get()
         home_item['subdivision'] = response.xpath('//ul/li/span[contains(text(), "Subdivision")]/text()[3]').get()
-        
-        yield home_item
-        
+
+        # Skip the houses that could never be featured before their taxes or rent are requested
+        if not self.prescreen(home_item['price'], home_item['sqft']):
+            self.crawler.stats.inc_value('prescreen/dropped')
+            return
+
+        yield from self.house_found(response, home_item)
+
+
+    def house_found(self, response, home_item):
+        """Save a house once it has been scraped from the search results or the house's page"""
+        if home_item['url'] not in self.saved_house_urls:
+            yield home_item
+
+
+def search_page_results(response):
+    """Function to return the list of houses in the search results embedded in a Zillow search page, or None if they could not be found"""
+    # Read the JSON data the page is built from
+    next_data = response.xpath('//script[@id="__NEXT_DATA__"]/text()').get()
+    if not next_data:
+        return None
+
+    try:
+        search_page_state = json.loads(next_data)['props']['pageProps']['searchPageState']
+        return search_page_state['cat1']['searchResults']['listResults']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def search_page_count(response):
+    """Function to return the number of pages in a Zillow search from the search results embedded in one of its pages, or None if it could not be found"""
+    next_data = response.xpath('//script[@id="__NEXT_DATA__"]/text()').get()
+    if not next_data:
+        return None
+
+    try:
+        search_list = json.loads(next_data)['props']['pageProps']['searchPageState']['cat1']['searchList']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    # Use the number of pages if it is given, otherwise work it out from the number of houses and the houses on each page
+    try:
+        total_pages = int(search_list.get('totalPages') or 0)
+        if not total_pages and search_list.get('totalResultCount') and search_list.get('resultsPerPage'):
+            total_pages = math.ceil(int(search_list['totalResultCount']) / int(search_list['resultsPerPage']))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+    return total_pages or None
+
+
+def search_page_url(url, page):
+    """Function to return the url of a page of a Zillow search (e.g., https://www.zillow.com/edgewater-cleveland-oh/duplex/2_p/) from the url of any of its pages"""
+    base_url, _, query = url.partition("?")
+
+    # Replace the page number already in the url, if there is one
+    base_url = re.sub(r"\d+_p/?$", "", base_url.rstrip("/") + "/")
+    page_url = base_url + (f"{page}_p/" if page > 1 else "")
+    return page_url + "?" + query if query else page_url
+
+
+def search_result_home_item(search_result):
+    """Function to create a HomeItem from a house in the embedded Zillow search results, leaving out any details that are not in the search results"""
+    home_info = (search_result.get('hdpData') or {}).get('homeInfo') or {}
+
+    # Build the full url for the house's page
+    url = search_result.get('detailUrl') or ""
+    if url.startswith("/"):
+        url = "https://www.zillow.com" + url
+
+    # Use the unformatted values where they exist and let the pipeline clean the formatted ones
+    price = home_info.get('price') or search_result.get('unformattedPrice') or search_result.get('price')
+    beds = search_result.get('beds') or home_info.get('bedrooms')
+    baths = search_result.get('baths') or home_info.get('bathrooms')
+    sqft = search_result.get('area') or home_info.get('livingArea')
+
+    home_item = HomeItem()
+    home_item['url'] = url
+    home_item['address'] = [search_result['address']] if search_result.get('address') else []
+    home_item['price'] = str(price) if price is not None else None
+    home_item['beds'] = str(beds) if beds is not None else None
+    home_item['baths'] = str(baths) if baths is not None else None
+    home_item['sqft'] = str(sqft) if sqft is not None else None
+    home_item['year_built'] = str(home_info['yearBuilt']) if home_info.get('yearBuilt') else None
+
+    return home_item
@@ -1,13 +1,20 @@
-import json
 import re
 import scrapy
-from homescraper.settings import SCRAPEOPS_PROXY_ENABLED as proxy_enabled
+from homescraper.cache import LookupCache
+from homescraper.checkpoint import saved_house_urls
+from homescraper.frontier import iter_source_houses
+from homescraper.priority import DealPriority
+from homescraper.spiders.taxspider import house_url_slug
 
 
 class RentspiderSpider(scrapy.Spider):
     name = "rentspider"
     allowed_domains = ["www.zillow.com"]
     start_urls = ["https://www.zillow.com/rental-manager/price-my-rental/"]
+    
+    # Read the houses with their tax information from the taxspider and save the finished houses for the analysis
+    source_file = "homedata-taxes.jsonl"
+    feed_file = "homedata.jsonl"
 
         # Overwrite any of the settings.py settings for this particular spider \
     custom_settings = {
@@ -21,61 +28,124 @@ class RentspiderSpider(scrapy.Spider):
         },
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        
+        # Open the rent estimates saved by earlier runs
+        spider.rent_cache, spider.rent_stale_seconds = open_rent_cache(crawler.settings)
+        
+        # Look up the rent of the most promising houses first
+        spider.deal_priority = DealPriority()
+        
+        # Skip the houses saved before a stopped crawl was resumed
+        spider.saved_house_urls = saved_house_urls(crawler.settings, spider.feed_file)
+        return spider
+    
+    def closed(self, reason):
+        self.rent_cache.close()
+
     def parse(self, response):
-        """Navigate to the page for each of the houses from homedata.json"""
+        """Navigate to the page for each of the houses from the taxspider"""
         
-        # Get all of the house data from homedata.json
-        with open('homedata.json') as file:
-            data = json.load(file)
+        # Read the house data from the taxspider one house at a time
+        data = iter_source_houses(self.settings, "taxspider", self.source_file)
             
-        # Verify if the proxy has been enabled from the settings file
-        if proxy_enabled:
-            # Loop through each house in the home data and pull the address information
-            for house in data:
-                value = house.get('url').split("%2F")[4].lower()
-                rent_url = "https://www.zillow.com/rental-manager/price-my-rental/results/" + value + "/"
+        # Loop through each house in the home data and pull the address information
+        for house in data:
+            if house.get('url') in self.saved_house_urls:
+                continue
             
-                # Navigate to the street page with the address numbers
-                yield response.follow(rent_url, callback=self.parse_rent_page, meta={'house': house})
-
-        # Handle cases where the proxy was not enabled
-        else:
-            # Loop through each house in the home data and pull the address information
-            for house in data:
-                value = house.get('url').split("/")[4].lower()
-                rent_url = "https://www.zillow.com/rental-manager/price-my-rental/results/" + value + "/"
+            rent_url = rent_page_url(house)
             
-                # Navigate to the street page with the address numbers
-                yield response.follow(rent_url, callback=self.parse_rent_page, meta={'house': house})
+            # Save the house right away if its rent was saved by an earlier run, refreshing the saved rent after everything else if it is out of date
+            rent_age = cached_house_rent(self.rent_cache, house, self.rent_stale_seconds)
+            if rent_age is not None:
+                yield house
+                if rent_age > self.rent_cache.ttl:
+                    yield response.follow(rent_url, callback=self.refresh_rent_page, priority=-1, meta={'house': {'url': house.get('url')}})
+                continue
+        
+            # Navigate to the street page with the address numbers
+            yield response.follow(rent_url, callback=self.parse_rent_page, priority=self.deal_priority(house), meta={'house': house})
 
     def parse_rent_page(self, response):
         """Crawl and gather the rent information for a given house"""
         # Extract house data from meta
         house = response.meta.get('house')
         
-        # Extract javascript script from the page
-        javascript = response.xpath('//script[contains(@type, "text/javascript")]/text()').get()
-        
-        # TODO: Create a smart rent feature to look for the closest rent comp
-        # Define the regular expression pattern for the suggested, min, and max comp rents
-        suggested_rent_pattern = r'"rentZestimate":(\d+)'
-        min_rent_pattern = r'"min":(\d+)'
-        max_rent_pattern = r'"max":(\d+)'
-
-        # Search for the pattern in the JavaScript code
-        suggested_rent = re.search(suggested_rent_pattern, javascript)
-        min_rent = re.search(min_rent_pattern, javascript)
-        max_rent = re.search(max_rent_pattern, javascript)
+        # Update the house data with rent information if it was found and save it for the next runs
+        update_house_rent(house, response)
+        cache_house_rent(self.rent_cache, house)
         
-        # Update the house data with rent information if it was found
-        if suggested_rent and min_rent and max_rent:
-            house['rent_url'] = response.url
-            house['rent'] = suggested_rent.group(1)
-            house['min_rent'] = min_rent.group(1)
-            house['max_rent'] = max_rent.group(1)
-        
-        elif suggested_rent:
-            house['rent_url'] = response.url
-            house['rent'] = suggested_rent.group(1)
+        yield house
+
+    def refresh_rent_page(self, response):
+        """Save the latest rent information for a house that was already saved with out of date rent"""
+        house = response.meta.get('house')
+        update_house_rent(house, response)
+        cache_house_rent(self.rent_cache, house)
         
-        yield house
\ No newline at end of file
+        # The house was already saved, so nothing is returned
+        return []
+
+
+# The house details that come from the rent lookup
+rent_fields = ('rent_url', 'rent', 'min_rent', 'max_rent')
+
+
+def cache_house_rent(rent_cache, house):
+    """Function to save the rent information of a house for the next runs if the rent was found"""
+    if house.get('rent'):
+        rent_cache.set(house_url_slug(house.get('url')), {field: house.get(field) for field in rent_fields})
+
+
+def cached_house_rent(rent_cache, house, stale_seconds=0):
+    """Function to update the house data with the rent information saved by an earlier run and return the number of seconds since it was saved, or None if there is none. Rent that is out of date is still used for up to `stale_seconds` past the time to live of the cache so it can be refreshed without holding up the house"""
+    rent_values, rent_age = rent_cache.get_with_age(house_url_slug(house.get('url')))
+    if rent_values is None or rent_age > rent_cache.ttl + stale_seconds:
+        return None
+    
+    for field in rent_fields:
+        house[field] = rent_values.get(field)
+    return rent_age
+
+
+def open_rent_cache(settings):
+    """Function to open the rent cache from the LOOKUP_CACHE_FILE and RENT_CACHE_TTL_DAYS settings and return it with the number of seconds out of date rent is still used for from the RENT_CACHE_STALE_DAYS setting"""
+    rent_cache = LookupCache(settings.get('LOOKUP_CACHE_FILE', 'homedata-cache.sqlite'), 'rents', ttl=settings.getfloat('RENT_CACHE_TTL_DAYS', 7) * 24 * 60 * 60)
+    return rent_cache, settings.getfloat('RENT_CACHE_STALE_DAYS', 30) * 24 * 60 * 60
+
+
+def rent_page_url(house):
+    """Function to return the url of the Zillow rent estimate page for a house"""
+    # Pull the address information from the house url
+    return "https://www.zillow.com/rental-manager/price-my-rental/results/" + house_url_slug(house.get('url')) + "/"
+
+
+def update_house_rent(house, response):
+    """Function to update the house data with the suggested, min, and max rent from a Zillow rent estimate page if they were found"""
+    # Extract javascript script from the page
+    javascript = response.xpath('//script[contains(@type, "text/javascript")]/text()').get() or ""
+    
+    # TODO: Create a smart rent feature to look for the closest rent comp
+    # Define the regular expression pattern for the suggested, min, and max comp rents
+    suggested_rent_pattern = r'"rentZestimate":(\d+)'
+    min_rent_pattern = r'"min":(\d+)'
+    max_rent_pattern = r'"max":(\d+)'
+
+    # Search for the pattern in the JavaScript code
+    suggested_rent = re.search(suggested_rent_pattern, javascript)
+    min_rent = re.search(min_rent_pattern, javascript)
+    max_rent = re.search(max_rent_pattern, javascript)
+    
+    # Update the house data with rent information if it was found
+    if suggested_rent and min_rent and max_rent:
+        house['rent_url'] = response.url
+        house['rent'] = suggested_rent.group(1)
+        house['min_rent'] = min_rent.group(1)
+        house['max_rent'] = max_rent.group(1)
+    
+    elif suggested_rent:
+        house['rent_url'] = response.url
+        house['rent'] = suggested_rent.group(1)
@@ -1,12 +1,19 @@
-import json
 import scrapy
-from homescraper.settings import SCRAPEOPS_PROXY_ENABLED as proxy_enabled
+from homescraper.cache import LookupCache
+from homescraper.checkpoint import saved_house_urls
+from homescraper.frontier import iter_source_houses
+from homescraper.priority import DealPriority
+from urllib.parse import unquote
 
 class TaxspiderSpider(scrapy.Spider):
     name = "taxspider"
     allowed_domains = ["www.countyoffice.org"]
     start_urls = ["https://www.countyoffice.org/"]
     
+    # Read the houses from the homespider and save them with their tax information for the rentspider
+    source_file = "homedata-homes.jsonl"
+    feed_file = "homedata-taxes.jsonl"
+    
         # Overwrite any of the settings.py settings for this particular spider \
     custom_settings = {
         
@@ -26,62 +33,226 @@ class TaxspiderSpider(scrapy.Spider):
         }
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        
+        # Open the tax records and street pages saved by earlier runs
+        spider.tax_cache = open_tax_cache(crawler.settings)
+        spider.street_pages = StreetPageLookups(open_street_cache(crawler.settings))
+        
+        # Look up the taxes of the most promising houses first
+        spider.deal_priority = DealPriority()
+        
+        # Skip the houses saved before a stopped crawl was resumed
+        spider.saved_house_urls = saved_house_urls(crawler.settings, spider.feed_file)
+        return spider
+    
+    def closed(self, reason):
+        self.tax_cache.close()
+        self.street_pages.street_cache.close()
+
     def parse(self, response):
-        """Navigate to the page for each of the houses from homedata.json"""
-        
-        # Get all of the house data from homedata.json
-        with open('homedata.json') as file:
-            data = json.load(file)
-        
-        # Verify if the proxy has been enabled from the settings file
-        if proxy_enabled:
-            # Loop through each house in the home data and pull the address information for the proxy
-            for house in data:
-                value = house.get('url').split("%2F")[4].lower()
-                value = value.split("-")
-                address_number = value[0]
-                value = "-".join(value[1:-1])
-                tax_url = "https://www.countyoffice.org/" + value + "-property-records/"
-                
-                # Navigate to the street page with the address numbers
-                yield response.follow(tax_url, callback=self.parse_street_page, meta={'address_number': address_number, 'house': house})
-                
-        # Handle cases where the proxy was not enabled
-        else:
-            # Loop through each house in the home data and pull the address information
-            for house in data:
-                value = house.get('url').split("/")[4].lower()
-                value = value.split("-")
-                address_number = value[0]
-                value = "-".join(value[1:-1])
-                tax_url = "https://www.countyoffice.org/" + value + "-property-records/"
-                
-                # Navigate to the street page with the address numbers
-                yield response.follow(tax_url, callback=self.parse_street_page, meta={'address_number': address_number, 'house': house})
+        """Navigate to the page for each of the houses from the homespider"""
+        
+        # Read the house data from the homespider one house at a time
+        data = iter_source_houses(self.settings, "homespider", self.source_file)
+        
+        # Group the houses by street so each street page is only requested once. The houses travel with the street page request, so any worker of a shared crawl can finish them
+        street_houses = {}
+        
+        # Loop through each house in the home data and pull the address information
+        for house in data:
+            if house.get('url') in self.saved_house_urls:
+                continue
+            
+            # Save the house right away if its tax information was saved by an earlier run
+            if cached_house_tax(self.tax_cache, house):
+                yield house
+                continue
+            
+            tax_url, address_number = tax_street_page_url(house)
+            meta = {'address_number': address_number, 'house': house, 'priority': self.deal_priority(house)}
+            
+            # Go straight to the property page if the links on the street page were saved by an earlier run
+            links = self.street_pages.known_links(tax_url)
+            if links is not None:
+                yield from self.follow_property_page(response, links, meta)
+            else:
+                street_houses.setdefault(tax_url, []).append(meta)
+        
+        # Navigate to the street page with the address numbers, as soon as the most promising house on the street would be
+        for street_url, houses in street_houses.items():
+            yield response.follow(street_url, callback=self.parse_street_page, errback=self.street_page_failed, priority=max(meta['priority'] for meta in houses), dont_filter=True, meta={'street_url': street_url, 'houses': houses})
         
     def parse_street_page(self, response):
-        """Parse the tax page and navigate further based on address_number"""
+        """Parse the tax page and navigate further for every house on the street"""
+        
+        # Find the links on the street page once for all the houses on the street
+        links = street_page_links(response)
+        self.street_pages.save_links(response.meta.get('street_url'), links)
+        for meta in response.meta.get('houses'):
+            yield from self.follow_property_page(response, links, meta)
+    
+    def street_page_failed(self, failure):
+        """Save every house on a street page whose request failed without its tax information"""
+        self.logger.warning(f"The street page {failure.request.meta.get('street_url')} failed: {failure.value!r}")
+        
+        for meta in failure.request.meta.get('houses'):
+            yield meta.get('house')
+    
+    def follow_property_page(self, response, links, meta):
+        """Navigate to the property page for the house's address number on its street page"""
         
-        # Extract address_number and house from meta
-        address_number = response.meta.get('address_number')
-        house = response.meta.get('house')
-         
         # Find the link for the specific house data
-        property_page_url = 'https://www.countyoffice.org' + response.xpath(f'//ul/li/a[contains(@href, "{address_number}")]/@href').get()
+        property_page_url = tax_property_page_url(links, meta.get('address_number'))
+        
+        # Save the house without its tax information if it is not listed on the street page
+        if property_page_url is None:
+            self.logger.warning(f"No property records were found for {meta.get('house').get('url')}")
+            yield meta.get('house')
+            return
         
         # Navigate to the property page to pull the required information
-        yield response.follow(property_page_url, callback=self.parse_property_page, meta={'house': house})
+        yield response.follow(property_page_url, callback=self.parse_property_page, priority=meta.get('priority', 0), meta={'house': meta.get('house')})
 
     def parse_property_page(self, response):
         """Crawl and gather the tax information for a given house"""
         # Extract house data from meta
         house = response.meta.get('house')
         
-        # Update the house data with tax information
-        house['tax_url'] = response.url
-        house['tax'] = response.xpath('//table[contains(@id, "taxes")]/tbody/tr[1]/td[2]/text()').get()
-        house['structure_quality'] = response.xpath('//table/tbody/tr/th[contains(text(), "Structure Quality")]/following-sibling::td/text()').get()
-        house['structure_condition'] = response.xpath('//table/tbody/tr/th[contains(text(), "Structure Condition")]/following-sibling::td/text()').get()
+        # Update the house data with tax information and save it for the next runs
+        update_house_tax(house, response)
+        cache_house_tax(self.tax_cache, house)
         
         yield house
-        
\ No newline at end of file
+
+
+class StreetPageLookups:
+    """
+    Coalesces the county office street page requests for the houses on the same street, so each street page is downloaded once and every house waiting on it is resolved from the one response. The links found on each street page are kept in memory for the rest of the crawl and saved in the street cache for later runs.
+
+    Attributes:
+        street_cache (LookupCache): The links found on each street page by earlier runs.
+        links (dict): The links on each street page known during this crawl.
+        pending (dict): The request meta of each house waiting on each street page that has been requested.
+
+    Methods:
+        known_links(self, street_url):
+            Returns the links on the street page if they are already known, or None.
+        add_pending(self, street_url, meta):
+            Adds a house waiting on the street page, returning True if the street page needs to be requested.
+        save_links(self, street_url, links):
+            Saves the links on a downloaded street page for the rest of the crawl and later runs.
+        resolve(self, street_url, links):
+            Saves the links on a downloaded street page and returns the houses that were waiting on it.
+        fail(self, street_url):
+            Returns the houses that were waiting on a street page that could not be downloaded.
+    """
+    def __init__(self, street_cache):
+        
+        self.street_cache = street_cache
+        self.links = {}
+        self.pending = {}
+    
+    
+    def known_links(self, street_url):
+        """Return the links on the street page from this crawl or an earlier run, or None if the street page has not been downloaded"""
+        if street_url not in self.links:
+            cached_links = self.street_cache.get(street_url)
+            if cached_links is None:
+                return None
+            self.links[street_url] = cached_links
+        return self.links[street_url]
+    
+    
+    def add_pending(self, street_url, meta):
+        """Add a house waiting on the street page and return True if it is the first house, so the street page only needs to be requested once"""
+        self.pending.setdefault(street_url, []).append(meta)
+        return len(self.pending[street_url]) == 1
+    
+    
+    def save_links(self, street_url, links):
+        """Save the links on the street page for the rest of the crawl and later runs"""
+        self.links[street_url] = links
+        self.street_cache.set(street_url, links)
+    
+    
+    def resolve(self, street_url, links):
+        """Save the links on the street page for the rest of the crawl and later runs and return every house that was waiting on it"""
+        self.save_links(street_url, links)
+        return self.pending.pop(street_url, [])
+    
+    
+    def fail(self, street_url):
+        """Return every house that was waiting on a street page that could not be downloaded, so the street page is requested again for the next house on the street"""
+        return self.pending.pop(street_url, [])
+
+
+# The house details that come from the tax lookup
+tax_fields = ('tax_url', 'tax', 'structure_quality', 'structure_condition')
+
+
+def cache_house_tax(tax_cache, house):
+    """Function to save the tax information of a house for the next runs if the tax was found"""
+    if house.get('tax'):
+        tax_cache.set(house_url_slug(house.get('url')), {field: house.get(field) for field in tax_fields})
+
+
+def cached_house_tax(tax_cache, house):
+    """Function to update the house data with the tax information saved by an earlier run, returning True if it was found and has not expired"""
+    tax_values = tax_cache.get(house_url_slug(house.get('url')))
+    if tax_values is None:
+        return False
+    
+    for field in tax_fields:
+        house[field] = tax_values.get(field)
+    return True
+
+
+def house_url_slug(url):
+    """Function to return the address part of a Zillow house url (e.g., 1486-olivewood-ave-lakewood-oh-44107), whether or not the url was sent through the proxy"""
+    return unquote(url).split("zillow.com/")[1].split("/")[1].lower()
+
+
+def tax_street_page_url(house):
+    """Function to return the url of the county office page for the street of a house and the house's address number"""
+    # Pull the address information from the house url
+    value = house_url_slug(house.get('url')).split("-")
+    address_number = value[0]
+    value = "-".join(value[1:-1])
+    tax_url = "https://www.countyoffice.org/" + value + "-property-records/"
+    
+    return tax_url, address_number
+
+
+def open_tax_cache(settings):
+    """Function to open the tax cache from the LOOKUP_CACHE_FILE and TAX_CACHE_TTL_DAYS settings"""
+    return LookupCache(settings.get('LOOKUP_CACHE_FILE', 'homedata-cache.sqlite'), 'taxes', ttl=settings.getfloat('TAX_CACHE_TTL_DAYS', 180) * 24 * 60 * 60)
+
+
+def open_street_cache(settings):
+    """Function to open the street page cache from the LOOKUP_CACHE_FILE and STREET_CACHE_TTL_DAYS settings"""
+    return LookupCache(settings.get('LOOKUP_CACHE_FILE', 'homedata-cache.sqlite'), 'streets', ttl=settings.getfloat('STREET_CACHE_TTL_DAYS', 90) * 24 * 60 * 60)
+
+
+def street_page_links(response):
+    """Function to return the links to every property page on a county office street page"""
+    return response.xpath('//ul/li/a/@href').getall()
+
+
+def tax_property_page_url(links, address_number):
+    """Function to return the url of the property page for an address number from the links on a county office street page, or None if the address is not listed"""
+    property_page_path = next((link for link in links if address_number in link), None)
+    if property_page_path is None:
+        return None
+    
+    return 'https://www.countyoffice.org' + property_page_path
+
+
+def update_house_tax(house, response):
+    """Function to update the house data with the tax information from a county office property page"""
+    house['tax_url'] = response.url
+    house['tax'] = response.xpath('//table[contains(@id, "taxes")]/tbody/tr[1]/td[2]/text()').get()
+    house['structure_quality'] = response.xpath('//table/tbody/tr/th[contains(text(), "Structure Quality")]/following-sibling::td/text()').get()
+    house['structure_condition'] = response.xpath('//table/tbody/tr/th[contains(text(), "Structure Condition")]/following-sibling::td/text()').get()
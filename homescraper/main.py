@@ -2,94 +2,369 @@ import asyncio
 from twisted.internet import asyncioreactor
 asyncioreactor.install(asyncio.get_event_loop()) # Explicitly install and run a reactor before any imports
 
-from analysis_functions import analyze_all_houses, create_house_analysis_excel_book, config_file_required_values_present, delete_file, config_file_required_email_values_present, load_json, send_featured_house_email, send_error_email
+from analysis_functions import AssumptionSweep, collect_config_featured_houses, create_house_analysis_excel_book, create_simulation_results_csv, create_sweep_results_csv, config_file_required_values_present, delete_file, config_file_required_email_values_present, iter_analyzed_houses, iter_house_data, load_json, merge_house_data, MonteCarloSimulation, parse_assumption_range, send_featured_house_email, send_error_email, verify_config_file_target_values
+import argparse
 from datetime import date
+import multiprocessing
+import os
+import signal
+from homescraper.checkpoint import CrawlCheckpoint
+from homescraper.frontier import export_frontier_houses
+from homescraper.middlewares import shard_credit_limit
 from homescraper.spiders.rentspider import RentspiderSpider
 from homescraper.spiders.taxspider import TaxspiderSpider
 from twisted.internet import reactor, defer
 from scrapy.crawler import CrawlerRunner
 from scrapy.utils.log import configure_logging
+from scrapy.utils.ossignal import install_shutdown_handlers
 from scrapy.utils.project import get_project_settings
+from tabulate import tabulate
 
 # TODO: Reset Email Password
 
-# Try to load the config file
-config = load_json("config.json")
 
-# Exit the program if no config file can be found
-if not config:
-    exit(1)
+def run_sweep(args, config):
+    """Function to analyze the houses that were already scraped under every combination of the swept assumption values and save the featured houses for each combination"""
+    # Read the values to try for each swept assumption
+    assumption_ranges = {}
+    try:
+        for sweep in args.sweep:
+            assumption, _, range_text = sweep.partition("=")
+            assumption_ranges[assumption.strip()] = parse_assumption_range(range_text)
+    except ValueError as error:
+        print(f'"{sweep}" could not be read as a sweep. Enter sweeps as ASSUMPTION=start:stop:step or ASSUMPTION=value,value. {error}')
+        exit(1)
 
-# Generate any error messages from the required values in the config file
-error_messages = config_file_required_values_present(config)
+    # Verify the target values used to pick the featured houses
+    error_messages = verify_config_file_target_values(config)
+    if error_messages:
+        for error in error_messages:
+            print(error)
+        exit(1)
 
-# Verify all required values in the config file are present and accurate
-if error_messages:
-    for error in error_messages:
+    # Try to pull the scraped home data
+    data = list(iter_house_data(args.data))
+    if not data:
+        print(f"No houses were found in '{args.data}' to sweep.")
+        exit(1)
+
+    # Analyze every house under every combination of the assumption values
+    try:
+        assumption_sweep = AssumptionSweep(config, data, assumption_ranges)
+    except ValueError as error:
         print(error)
-    exit(1)
+        exit(1)
 
-# Generate any error messages from the required email values in the config file
-error_messages = config_file_required_email_values_present(config)
+    # Create a CSV file with the houses that are featured under each scenario and show how many there are
+    csv_filename = str(date.today()) + "-assumption-sweep.csv"
+    create_sweep_results_csv(assumption_sweep, csv_filename)
+    print(tabulate(assumption_sweep.summary(), headers="keys"))
+    print(f"The featured houses for each of the {len(assumption_sweep.scenarios)} scenarios were saved to '{csv_filename}'.")
+
+
+def run_simulation(args, config):
+    """Function to simulate the houses that were already scraped across random growth, vacancy, repair, and interest rate paths and save the percentile bands for each house"""
+    # Verify the number of paths
+    if args.simulate < 1:
+        print("The number of simulated paths must be at least 1.")
+        exit(1)
+
+    # Try to pull the scraped home data
+    data = list(iter_house_data(args.data))
+    if not data:
+        print(f"No houses were found in '{args.data}' to simulate.")
+        exit(1)
 
-# Verify all required email values in the config file are present and accurate
-if error_messages:
-    for error in error_messages:
+    # Simulate every house on the same paths
+    try:
+        simulation = MonteCarloSimulation(config, data, simulations=args.simulate, projection_yrs=args.simulate_years, seed=args.seed)
+    except ValueError as error:
         print(error)
-    exit(1)
-
-# Load in homespider after the config file has been verified since it is dependent on the config file
-from homescraper.spiders.homespider import HomespiderSpider
-
-# Get and configure the settings for all the spiders
-settings = get_project_settings()
-configure_logging(settings)
-
-# Create instance of CrawlerRunner class to execute multiple spiders in the script using project settings
-runner = CrawlerRunner(settings)
-
-# Create a function to run the spiders sequentially and stop the twisted reactor after all the spiders have run
-@defer.inlineCallbacks
-def crawl():
-    yield runner.crawl(HomespiderSpider)
-    yield runner.crawl(TaxspiderSpider)
-    yield runner.crawl(RentspiderSpider)
-    reactor.stop()
-
-# Call the crawl function to loop through the spiders sequentially
-crawl()
-reactor.run()  # the script will block here until the last crawl call is finished
-
-# Try to pull the scraped home data
-data = load_json("homedata.json")
-
-# Check if there are any houses in the list pulled
-if not data:
-    error_message = "No houses were found during the search."
-    print(error_message)
-    send_error_email(error_message, config)
-    
-else:   
-    # Retrieve a list containing all the analyzed houses and one with any houses missing data
-    analyzed_houses, error_houses = analyze_all_houses(config, data)
-    
-    # Verify there are analyzed houses to send to the user
-    if len(analyzed_houses) == 0:
-        error_message = f"{len(error_houses)} houses were scraped, but none contained all the required information. Review scrapping process for more details."
-        print(error_message)
-        send_error_email(error_message, config)
         exit(1)
+
+    # Create a CSV file with the percentile bands for each house and year
+    csv_filename = str(date.today()) + "-monte-carlo-simulation.csv"
+    create_simulation_results_csv(simulation, csv_filename)
+    print(f"The percentile bands for {len(simulation.address)} houses across {simulation.simulations} simulated paths were saved to '{csv_filename}'.")
+
+
+def shard_file(path, shard):
+    """Function to return the name of a shard's copy of a data file (e.g., homedata-shard1-of-4.jsonl), or the file itself when the crawl is not sharded"""
+    if shard is None:
+        return path
+    shard_index, shard_count = shard
+    stem, extension = os.path.splitext(path)
+    return f"{stem}-shard{shard_index}-of-{shard_count}{extension}"
+
+
+def run_crawl(args, settings, checkpoint, start_urls=None, shard=None):
+    """Function to run the spiders on the reactor in this process, returning True if every spider finished or False if the crawl was stopped and can be resumed. A shard crawls only its start urls and writes its own data files"""
+    # Load in homespider and fullspider after the config file has been verified since they are dependent on the config file
+    from homescraper.spiders.fullspider import FullspiderSpider
+    from homescraper.spiders.homespider import HomespiderSpider
+
+    # Run the spiders one after another if requested, otherwise look up the taxes and rent for each house while the rest of the houses are scraped
+    spiders = [HomespiderSpider, TaxspiderSpider, RentspiderSpider] if args.sequential_crawl else [FullspiderSpider]
+    crawl_state = {'runner': None, 'interrupted': False, 'finished': False, 'stopped_reason': 'stopped right away'}
+
+    # Create a function to run the spiders and stop the twisted reactor after all the spiders have run
+    @defer.inlineCallbacks
+    def crawl():
+        for spider in spiders:
+            # Do not start the next spider once the crawl is interrupted
+            if crawl_state['interrupted']:
+                crawl_state['stopped_reason'] = 'shutdown'
+                break
+
+            # Skip the spiders that finished before the crawl was stopped
+            if checkpoint.is_finished(spider):
+                print(f"The {spider.name} finished before the crawl was stopped and will be skipped.")
+                continue
+
+            # Give a shard's spiders their own start urls and data files
+            spider_args = {'feed_file': shard_file(spider.feed_file, shard)}
+            if hasattr(spider, 'source_file'):
+                spider_args['source_file'] = shard_file(spider.source_file, shard)
+            if start_urls is not None and issubclass(spider, HomespiderSpider):
+                spider_args['start_urls'] = start_urls
+
+            # Create instance of CrawlerRunner class to run the spider with the project settings and its checkpoint
+            crawl_state['runner'] = CrawlerRunner(checkpoint.spider_settings(settings, spider, spider_args['feed_file']))
+            crawler = crawl_state['runner'].create_crawler(spider)
+            yield crawl_state['runner'].crawl(crawler, **spider_args)
+
+            # Save the spider's progress and stop the crawl if the spider did not finish
+            reason = crawler.stats.get_value('finish_reason')
+            checkpoint.close_spider(spider, reason)
+            if reason != 'finished':
+                crawl_state['stopped_reason'] = reason
+                break
+        else:
+            crawl_state['finished'] = True
+        reactor.stop()
+
+    # Let the spider save its progress the first time the crawl is interrupted (e.g., Ctrl-C), and stop right away the second time
+    def stop_crawl(signum, _):
+        install_shutdown_handlers(lambda signum, _: reactor.callFromThread(reactor.stop))
+        print("Stopping the crawl so it can be resumed. Press Ctrl-C again to stop right away.")
+        crawl_state['interrupted'] = True
+        if crawl_state['runner'] is not None:
+            reactor.callFromThread(crawl_state['runner'].stop)
+
+    # Call the crawl function to loop through the spiders sequentially
+    install_shutdown_handlers(stop_crawl)
+    crawl()
+    reactor.run(installSignalHandlers=False)  # the script will block here until the last crawl call is finished
+
+    if not crawl_state['finished']:
+        print(f"The crawl stopped before it finished ({crawl_state['stopped_reason']}). Run main.py again to resume it where it stopped, or with --restart-crawl to start over.")
+    return crawl_state['finished']
+
+
+def crawl_shard(args, start_urls, shard, checkpoint_dir, credit_limit=None):
+    """Function to run one shard of a sharded crawl in its own process, with its own reactor and its share of the concurrency and proxy limits, exiting with 0 if every spider finished"""
+    settings = get_project_settings()
+    shard_count = shard[1]
+    settings.set('CONCURRENT_REQUESTS', max(1, settings.getint('CONCURRENT_REQUESTS', 16) // shard_count))
+    settings.set('ADAPTIVE_CONCURRENCY_PROXY_MAX', max(1, settings.getint('ADAPTIVE_CONCURRENCY_PROXY_MAX', 16) // shard_count))
+
+    # Bound the shard's own credits by its share of the credits the coordinator found were left, since the day's total also counts the other shards
+    settings.set('SCRAPEOPS_CREDIT_RUN_LIMIT', credit_limit)
+    settings.set('SCRAPEOPS_CREDIT_DAILY_LIMIT', None)
+    configure_logging(settings)
+
+    # Keep each shard's progress in its own folder of the checkpoint
+    checkpoint = CrawlCheckpoint(checkpoint_dir and os.path.join(checkpoint_dir, f"shard{shard[0]}-of-{shard_count}"))
+    exit(0 if run_crawl(args, settings, checkpoint, start_urls=start_urls, shard=shard) else 1)
+
+
+def run_sharded_crawl(args, start_urls, checkpoint_dir):
+    """Function to split the start urls across worker processes that each crawl their share, then merge the houses from every shard into homedata.jsonl without duplicates, returning True if every shard finished"""
+    shard_count = min(args.workers, len(start_urls))
     
-    # Create a name for the excel file
-    excel_filename = str(date.today()) + "-house-analysis.xlsx"
+    # Split the proxy credits left for the run and for today between the shards
+    credit_limit = shard_credit_limit(get_project_settings(), shard_count)
+
+    # Start a process for each shard, dealing the start urls out in turn so each shard gets a similar number of searches
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for shard_index in range(1, shard_count + 1):
+        shard = (shard_index, shard_count)
+        process = context.Process(target=crawl_shard, args=(args, start_urls[shard_index - 1::shard_count], shard, checkpoint_dir, credit_limit))
+        process.start()
+        processes.append(process)
     
-    # Create an excel book containing all of the houses that were scraped for analysis
-    create_house_analysis_excel_book(analyzed_houses, excel_filename)
+    # Each worker handles Ctrl-C by saving its own progress, so the coordinator waits for all of them
+    install_shutdown_handlers(signal.SIG_IGN)
+    for process in processes:
+        process.join()
     
-    # Send the html email content and excel file to the target user
-    send_featured_house_email(analyzed_houses, excel_filename, config)
+    if any(process.exitcode != 0 for process in processes):
+        print(f"{sum(process.exitcode != 0 for process in processes)} of the {shard_count} shards did not finish. Run main.py again with --workers {args.workers} to resume them.")
+        return False
     
-    # Determine if the user wants the file deleted
-    if config['delete_excel_file']:
-        # Delete the excel file that was created
-        delete_file(excel_filename)
\ No newline at end of file
+    # Merge the houses from every shard, keeping one copy of a house found by more than one search
+    shard_files = [shard_file("homedata.jsonl", (shard_index, shard_count)) for shard_index in range(1, shard_count + 1)]
+    number_houses, number_duplicates = merge_house_data(shard_files, "homedata.jsonl")
+    print(f"{number_houses} houses from {shard_count} shards were saved to 'homedata.jsonl', skipping {number_duplicates} duplicate houses.")
+    
+    # Delete the data files of each shard once they are merged
+    for shard_index in range(1, shard_count + 1):
+        for data_file in (TaxspiderSpider.source_file, TaxspiderSpider.feed_file, RentspiderSpider.feed_file):
+            if os.path.exists(shard_file(data_file, (shard_index, shard_count))):
+                os.remove(shard_file(data_file, (shard_index, shard_count)))
+    return True
+
+
+def main():
+    # Read the command line options
+    parser = argparse.ArgumentParser(description="Scrape, analyze, and email the houses from the Zillow searches in config.json.")
+    parser.add_argument("--sweep", action="append", metavar="ASSUMPTION=VALUES", help='Skip scraping and analyze the houses already in the data file under every combination of the given assumption values, e.g. --sweep interest_rate=0.05:0.08:0.01 --sweep loan_term_yrs=15,30. Can be given more than once.')
+    parser.add_argument("--simulate", type=int, metavar="PATHS", help="Skip scraping and simulate the houses already in the data file across the given number of random growth, vacancy, repair, and interest rate paths.")
+    parser.add_argument("--simulate-years", type=int, metavar="YEARS", help="The number of years to project in a simulation (default: the loan term).")
+    parser.add_argument("--seed", type=int, help="The random seed for a simulation, to make the results repeatable.")
+    parser.add_argument("--sequential-crawl", action="store_true", help="Scrape the houses, taxes, and rent with three spiders that run one after another instead of one crawl that looks up the taxes and rent while the houses are scraped.")
+    parser.add_argument("--workers", type=int, default=1, metavar="PROCESSES", help="Split the start urls across this many worker processes, each with its own share of the concurrency and proxy limits, and merge their houses when they finish (default: 1).")
+    parser.add_argument("--frontier", metavar="URL", help="Share the crawl with every worker started with the same url, a redis:// url or an sqlite:/// path, so any worker can download any request and no request is downloaded twice. Implies --sequential-crawl.")
+    parser.add_argument("--frontier-run", metavar="NAME", help="The name of the shared crawl, which must be the same for every worker (default: the date). Use a new name to start a shared crawl over.")
+    parser.add_argument("--frontier-worker", action="store_true", help="Only help crawl a shared crawl, leaving the analysis and email to the worker started without this option.")
+    parser.add_argument("--restart-crawl", action="store_true", help="Start the crawl again from the start urls instead of resuming a crawl that was stopped.")
+    parser.add_argument("--data", default="homedata.jsonl", metavar="FILE", help="The scraped house data to use for a sweep or simulation, as JSON Lines or a JSON list (default: homedata.jsonl).")
+    args = parser.parse_args()
+
+    # Try to load the config file
+    config = load_json("config.json")
+
+    # Exit the program if no config file can be found
+    if not config:
+        exit(1)
+
+    # Generate any error messages from the required values in the config file
+    error_messages = config_file_required_values_present(config)
+
+    # Verify all required values in the config file are present and accurate
+    if error_messages:
+        for error in error_messages:
+            print(error)
+        exit(1)
+
+    # Run a sweep or simulation over the houses that were already scraped instead of scraping again
+    if args.sweep:
+        run_sweep(args, config)
+        exit(0)
+    if args.simulate is not None:
+        run_simulation(args, config)
+        exit(0)
+
+    # Generate any error messages from the required email values in the config file
+    error_messages = config_file_required_email_values_present(config)
+
+    # Verify all required email values in the config file are present and accurate
+    if error_messages:
+        for error in error_messages:
+            print(error)
+        exit(1)
+
+    # Get and configure the settings for all the spiders
+    settings = get_project_settings()
+
+    # Resume the crawl where it stopped unless a new crawl was requested
+    checkpoint = CrawlCheckpoint(settings.get('CRAWL_CHECKPOINT_DIR'))
+    if args.restart_crawl:
+        checkpoint.clear()
+
+    # Split the start urls across worker processes if requested, otherwise crawl them all in this process
+    if args.workers < 1:
+        print("The number of worker processes must be at least 1.")
+        exit(1)
+
+    # Share the crawl with the other workers through the shared store if requested. The spiders run one after another since the full crawl keeps the houses waiting on their lookups in memory, and the shared store keeps the progress instead of the checkpoint
+    if args.frontier:
+        settings.set('FRONTIER_URL', args.frontier)
+    if args.frontier_run:
+        settings.set('FRONTIER_RUN', args.frontier_run)
+    if settings.get('FRONTIER_URL'):
+        if args.workers > 1:
+            print("A shared crawl cannot be split with --workers. Start more workers with --frontier and --frontier-worker instead.")
+            exit(1)
+        settings.set('FRONTIER_RUN', settings.get('FRONTIER_RUN') or str(date.today()))
+        settings.set('SCHEDULER', 'homescraper.frontier.FrontierScheduler')
+        settings.set('DUPEFILTER_CLASS', 'homescraper.frontier.FrontierDupeFilter')
+        args.sequential_crawl = True
+        checkpoint = CrawlCheckpoint(None)
+    elif args.frontier_worker:
+        print("--frontier-worker needs a shared crawl. Pass the shared store with --frontier.")
+        exit(1)
+
+    if args.workers > 1:
+        finished = run_sharded_crawl(args, config['starturls'], settings.get('CRAWL_CHECKPOINT_DIR'))
+    else:
+        configure_logging(settings)
+        finished = run_crawl(args, settings, checkpoint)
+
+    # Leave the analysis for when the crawl is resumed and finished
+    if not finished:
+        exit(1)
+    checkpoint.clear()
+
+    # Leave the analysis of a shared crawl to its coordinating worker, which saves the houses found by every worker for the analysis
+    if args.frontier_worker:
+        exit(0)
+    if settings.get('FRONTIER_URL'):
+        number_houses = export_frontier_houses(settings, RentspiderSpider.name, "homedata.jsonl")
+        print(f"{number_houses} houses from every worker of the shared crawl were saved to 'homedata.jsonl'.")
+
+    # Read the scraped home data one house at a time
+    data = iter_house_data("homedata.jsonl")
+
+    # Use every core for large datasets unless the config file limits the workers or changes the threshold
+    parallel_threshold = config.get('parallel_analysis_threshold')
+    parallel_threshold = 10000 if parallel_threshold is None else parallel_threshold
+
+    # Analyze the houses as they are read, keeping a list of any houses missing data
+    error_houses = []
+    analyzed_houses = iter_analyzed_houses(config, data, error_houses, workers=config.get('analysis_workers'), parallel_threshold=parallel_threshold)
+
+    # Keep only the top ranked featured houses for the email as the houses pass through
+    analyzed_houses, featured_houses = collect_config_featured_houses(analyzed_houses, config)
+
+    # Create a name for the excel file
+    excel_filename = str(date.today()) + "-house-analysis.xlsx"
+
+    # Create an excel book containing all of the houses that were scraped for analysis, one house at a time
+    number_analyzed_houses = create_house_analysis_excel_book(analyzed_houses, excel_filename)
+
+    # Check if there are any houses in the list pulled
+    if number_analyzed_houses == 0:
+        # Delete the empty excel file
+        delete_file(excel_filename)
+
+        if not error_houses:
+            error_message = "No houses were found during the search."
+            print(error_message)
+            send_error_email(error_message, config)
+
+        # Verify there are analyzed houses to send to the user
+        else:
+            error_message = f"{len(error_houses)} houses were scraped, but none contained all the required information. Review scrapping process for more details."
+            print(error_message)
+            send_error_email(error_message, config)
+            exit(1)
+
+    else:
+        # Show the top featured houses when they are ranked
+        if featured_houses.rank_by is not None and len(featured_houses) > 0:
+            print(tabulate(featured_houses.summary(), headers="keys"))
+
+        # Send the html email content for the featured houses and excel file to the target user
+        send_featured_house_email(featured_houses, excel_filename, config)
+
+        # Determine if the user wants the file deleted
+        if config['delete_excel_file']:
+            # Delete the excel file that was created
+            delete_file(excel_filename)
+
+
+# Only run the program when main.py is run directly, since the process pools used for large analyses import this file again in each worker process
+if __name__ == '__main__':
+    main()
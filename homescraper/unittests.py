@@ -1,5 +1,32 @@
 import unittest
-from analysis_functions import config_file_required_values_present, config_file_required_email_values_present
+from unittest import mock
+from datetime import date
+import json
+from openpyxl import load_workbook, Workbook
+from scrapy.http import HtmlResponse, Request
+from scrapy import signals
+from scrapy.core.downloader import Slot
+from scrapy.exceptions import IgnoreRequest
+from scrapy.settings import Settings
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+import os
+import pickle
+import requests
+import tempfile
+from types import SimpleNamespace
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from twisted.trial import unittest as trial_unittest
+from homescraper.cache import LookupCache
+from homescraper.checkpoint import CrawlCheckpoint, saved_house_urls, truncate_incomplete_line
+from homescraper.frontier import FrontierScheduler, request_from_json, request_to_json, SQLiteFrontierStore
+from homescraper.priority import DealPriority
+from homescraper.middlewares import AdaptiveConcurrencyMiddleware, blocked_response_reason, daily_proxy_credits, OutcomeStats, ProxyCreditLedger, ScrapeOpsFakeBrowserHeadersMiddleware, ScrapeOpsProxyMiddleware, shard_credit_limit
+from homescraper.spiders.fullspider import FullspiderSpider
+from homescraper.spiders.homespider import search_page_count, search_page_results, search_page_url, search_result_home_item
+from homescraper.spiders.taxspider import StreetPageLookups, tax_property_page_url
+from analysis_functions import analyze_all_houses, analyze_all_houses_batch, AssumptionSweep, collect_config_featured_houses, collect_featured_houses, config_file_required_values_present, config_file_required_email_values_present, create_house_analysis_excel_book, FeaturedHouseFilter, FeaturedHousePrescreen, FeaturedHouseRanking, House, HouseAssumptions, HouseBatch, HouseProjection, iter_analyzed_houses, iter_house_data, merge_house_data, MonteCarloSimulation, parse_assumption_range
 
 # TODO: Add additional tests
 class TestConfigFileRequiredValuesPresent(unittest.TestCase):
@@ -310,5 +337,1431 @@ class TestConfigFileRequiredEmailValuesPresent(unittest.TestCase):
         }
         self.assertEqual(config_file_required_email_values_present(config), ['"featured_house_required" is not in the config file. Please enter "featured_house_required" in the config file.'])
         
+class TestHouseBatch(unittest.TestCase):
+    
+    config = {
+        "down_payment_decimal": 0.12, 
+        "closing_cost_buyer_decimal": 0.03,
+        "closing_cost_seller_decimal": 0.08,
+        "expected_annual_growth": 0.02,
+        "interest_rate": 0.06,
+        "loan_term_yrs": 30,
+        "expected_repairs_monthly": 0.05,
+        "expected_vacancy_monthly": 0.09,
+        "expected_capx_monthly": 0.1,
+        "expected_management_monthly": 0.1,
+        "insurance_rate_yearly": 0.006,
+    }
+    
+    data = [
+        {"address": "1356 W 85th St, Cleveland, OH 44102", "price": "415000", "sqft": "3636", "tax": "3501", "rent": "2868", "property_subtype": None},
+        {"address": "1486 Olivewood Ave, Lakewood, OH 44107", "price": "229900", "sqft": "2268", "tax": "4325", "rent": "1395", "property_subtype": "duplex"},
+        {"address": "2040 Marlowe Ave, Lakewood, OH 44107", "price": "189000.50", "sqft": "2450", "tax": "3980", "rent": "1125", "property_subtype": "triplex"},
+        {"address": "11801 Franklin Blvd, Lakewood, OH 44107", "price": "549999", "sqft": "4100", "tax": "7210", "rent": "1450", "property_subtype": "quadplex"},
+    ]
+    
+    def test_matches_house_metrics(self):
+        """Test case where every metric in the batch matches the House class for each house."""
+        house_batch = HouseBatch(self.config, self.data)
+        
+        for index, house_data in enumerate(self.data):
+            house = House(self.config, house_data)
+            for metric in ["price_per_sqft", "principle_interest_monthly", "total_expenses_monthly", "cash_flow_monthly", "cash_flow_50", "cash_needed_total", "cash_on_cash_decimal", "percent_rule_decimal", "net_operating_income", "pro_forma_cap_decimal"]:
+                self.assertEqual(getattr(house_batch, metric)[index], getattr(house, metric), metric)
+    
+    def test_matches_house_projections(self):
+        """Test case where every yearly projection in the batch matches the House class for each house."""
+        house_batch = HouseBatch(self.config, self.data)
+        
+        for index, house_data in enumerate(self.data):
+            house = House(self.config, house_data)
+            for projection in ["property_value", "loan_balance", "equity", "rent_growth", "profit_if_sold", "cash_flow_yearly", "annualized_return_decimal"]:
+                self.assertEqual(getattr(house_batch, projection)[index].tolist(), list(getattr(house, projection)), projection)
+    
+    def test_projection_shape(self):
+        """Test case where the projections have one row per house and one column per year of the loan term."""
+        house_batch = HouseBatch(self.config, self.data)
+        self.assertEqual(house_batch.property_value.shape, (4, 31))
+        self.assertEqual(house_batch.annualized_return_decimal.shape, (4, 31))
+    
+    def test_error_houses_excluded(self):
+        """Test case where houses missing required values are left out of the batch."""
+        data = self.data + [{"address": "2200 Lewis Dr, Lakewood, OH 44107", "price": "199000", "sqft": "1800", "tax": None, "rent": "1300", "property_subtype": None}]
+        house_batch, error_houses = analyze_all_houses_batch(self.config, data)
+        self.assertEqual(len(house_batch), 4)
+        self.assertEqual(error_houses, ["2200 Lewis Dr, Lakewood, OH 44107"])
+        
+
+class TestHouseAssumptions(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    data = TestHouseBatch.data
+    
+    def test_assumptions_shared_by_houses(self):
+        """Test case where every analyzed house shares the same assumptions object instead of copying the config values."""
+        analyzed_houses, error_houses = analyze_all_houses(self.config, self.data)
+        self.assertTrue(all(house.assumptions is analyzed_houses[0].assumptions for house in analyzed_houses))
+        self.assertEqual(analyzed_houses[0].interest_rate, 0.06)
+    
+    def test_assumptions_are_immutable(self):
+        """Test case where the shared assumptions cannot be changed."""
+        assumptions = HouseAssumptions.from_config(self.config)
+        with self.assertRaises(AttributeError):
+            assumptions.interest_rate = 0.07
+        self.assertIs(HouseAssumptions.from_config(assumptions), assumptions)
+    
+    def test_house_has_no_instance_dictionary(self):
+        """Test case where a house only stores its values in slots."""
+        house = House(self.config, self.data[0])
+        self.assertFalse(hasattr(house, '__dict__'))
+        with self.assertRaises(AttributeError):
+            house.unknown_value = 1
+    
+    def test_pickled_house_recalculates_projection(self):
+        """Test case where a pickled house leaves out its projection and recalculates the same values."""
+        house = House(self.config, self.data[0])
+        property_value = house.property_value[:6]
+        unpickled_house = pickle.loads(pickle.dumps(house))
+        self.assertIsNone(unpickled_house.projections)
+        self.assertEqual(unpickled_house.property_value[:6], property_value)
+        
+
+class TestHouseProjection(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    house_data = TestHouseBatch.data[1]
+    
+    def test_yearly_projection_length(self):
+        """Test case where the yearly projection covers every year of the loan term, including the purchase year."""
+        house = House(self.config, self.house_data)
+        self.assertEqual(house.year, list(range(31)))
+        self.assertEqual(len(house.cash_flow_yearly), 31)
+        self.assertEqual(house.loan_balance[-1], 0.0)
+    
+    def test_profit_includes_earlier_cash_flow(self):
+        """Test case where the profit if sold includes the cash flow from all the earlier years."""
+        house = House(self.config, self.house_data)
+        for year in [1, 5, 30]:
+            expected_profit = round(house.property_value[year] * (1 - self.config["closing_cost_seller_decimal"]) + sum(house.cash_flow_yearly[:year]) - house.cash_needed_total - house.loan_balance[year], 2)
+            self.assertAlmostEqual(house.profit_if_sold[year], expected_profit, places=2)
+    
+    def test_monthly_projection_matches_yearly(self):
+        """Test case where a monthly projection lines up with the yearly projection at the end of each year."""
+        house = House(self.config, self.house_data)
+        monthly_projection = house.projection(periods_per_year=12)
+        self.assertEqual(len(monthly_projection), 30 * 12 + 1)
+        for year in [1, 5, 30]:
+            self.assertAlmostEqual(monthly_projection.property_value[year * 12], house.property_value[year], delta=0.01)
+            self.assertAlmostEqual(monthly_projection.loan_balance[year * 12], house.loan_balance[year], delta=0.01)
+    
+    def test_extend_to_continues_projection(self):
+        """Test case where extending a projection in steps gives the same values as extending it all at once."""
+        house = House(self.config, self.house_data)
+        projection = HouseProjection(house)
+        projection.extend_to(3)
+        projection.extend_to(10)
+        self.assertEqual(projection.calculated_periods, 11)
+        self.assertEqual(projection.values['profit_if_sold'].tolist(), house.profit_if_sold[:11])
+        self.assertEqual(projection.values['annualized_return_decimal'].tolist(), house.annualized_return_decimal[:11])
+    
+    def test_projection_is_lazy(self):
+        """Test case where the projection is only calculated as far as the years that are read."""
+        house = House(self.config, self.house_data)
+        self.assertIsNone(house.projections)
+        self.assertEqual(house.property_value[:6], [house.property_value[year] for year in range(6)])
+        self.assertEqual(house.projection().calculated_periods, 6)
+        self.assertEqual(len(house.property_value), 31)
+    
+    def test_featured_screen_skips_projection(self):
+        """Test case where a house that fails a headline target never calculates a projection and a five year target only calculates six years."""
+        house = House(self.config, self.house_data)
+        self.assertFalse(house.featured_home_determiner({"target_cash_flow_monthly_min": 10000, "target_five_year_annualized_return_min": 0.1}))
+        self.assertIsNone(house.projections)
+        house.featured_home_determiner({"target_five_year_annualized_return_min": 0.1})
+        self.assertEqual(house.projection().calculated_periods, 6)
+        
+
+class TestAnalyzeAllHousesParallel(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    
+    data = TestHouseBatch.data + [{"address": "2200 Lewis Dr, Lakewood, OH 44107", "price": "199000", "sqft": "1800", "tax": None, "rent": "1300", "property_subtype": None}] + TestHouseBatch.data
+    
+    def test_matches_serial_order(self):
+        """Test case where the houses analyzed on a process pool come back in the original order with the same metrics and error houses."""
+        serial_houses, serial_error_houses = analyze_all_houses(self.config, self.data)
+        parallel_houses, parallel_error_houses = analyze_all_houses(self.config, self.data, workers=2, parallel_threshold=0)
+        
+        self.assertEqual([house.address for house in parallel_houses], [house.address for house in serial_houses])
+        self.assertEqual([house.cash_flow_monthly for house in parallel_houses], [house.cash_flow_monthly for house in serial_houses])
+        self.assertEqual([house.profit_if_sold[5] for house in parallel_houses], [house.profit_if_sold[5] for house in serial_houses])
+        self.assertEqual(parallel_error_houses, serial_error_houses)
+    
+    def test_shares_assumptions(self):
+        """Test case where every house analyzed on a process pool shares the same assumptions again."""
+        parallel_houses, _ = analyze_all_houses(self.config, self.data, workers=2, parallel_threshold=0)
+        self.assertTrue(all(house.assumptions is parallel_houses[0].assumptions for house in parallel_houses))
+        
+
+class TestFeaturedHouseFilter(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    
+    data = TestHouseBatch.data
+    
+    target_values = {
+        "target_cash_flow_monthly_min": -1500,
+        "target_percent_rule_min": 0.005,
+        "target_net_operating_income_min": None,
+        "target_pro_forma_cap_min": 0.02,
+        "target_five_year_annualized_return_min": -0.5,
+        "target_cash_on_cash_return_min": None,
+    }
+    
+    def test_only_set_targets_checked(self):
+        """Test case where only the target values that are set are compiled and every other config value is ignored."""
+        featured_filter = FeaturedHouseFilter(dict(self.config, **self.target_values))
+        self.assertEqual([check[0] for check in featured_filter.checks], ["target_cash_flow_monthly_min", "target_percent_rule_min", "target_pro_forma_cap_min", "target_five_year_annualized_return_min"])
+        self.assertTrue(FeaturedHouseFilter({})(House(self.config, self.data[0])))
+    
+    def test_matches_each_target(self):
+        """Test case where the filter gives the same result as checking every target of every house one at a time."""
+        houses = [House(self.config, house_data) for house_data in self.data]
+        featured_filter = FeaturedHouseFilter(self.target_values, reorder_interval=1)
+        for house in houses * 3:
+            expected = all(value <= FeaturedHouseFilter.house_metrics[key](house) for key, value in self.target_values.items() if value is not None)
+            self.assertEqual(featured_filter(house), expected)
+            self.assertEqual(house.featured_home_determiner(self.target_values), expected)
+        
+        house_batch = HouseBatch(self.config, self.data)
+        self.assertEqual(FeaturedHouseFilter(self.target_values).mask(house_batch).tolist(), [featured_filter(house) for house in houses])
+    
+    def test_reorder_by_rejection_rate(self):
+        """Test case where the target that rejects the most houses is checked first and the five year annualized return stays last."""
+        target_values = {"target_cash_flow_monthly_min": -100000, "target_pro_forma_cap_min": 1, "target_five_year_annualized_return_min": 1}
+        featured_filter = FeaturedHouseFilter(target_values, reorder_interval=4)
+        for house_data in self.data * 2:
+            self.assertFalse(featured_filter(House(self.config, house_data)))
+        self.assertEqual([check[0] for check in featured_filter.checks], ["target_pro_forma_cap_min", "target_cash_flow_monthly_min", "target_five_year_annualized_return_min"])
+        self.assertEqual([check[2:] for check in featured_filter.checks], [[8, 8], [4, 0], [0, 0]])
+        
+        batch_filter = FeaturedHouseFilter(target_values)
+        self.assertFalse(batch_filter.mask(HouseBatch(self.config, self.data)).any())
+        self.assertEqual(batch_filter.checks[0][0], "target_pro_forma_cap_min")
+        
+
+class TestFeaturedHousePrescreen(unittest.TestCase):
+    
+    config = dict(TestHouseBatch.config, featured_house_required=True, target_cash_flow_monthly_min=-200, target_five_year_annualized_return_min=0.05, prescreen_max_rent_per_sqft=1.5)
+    
+    data = TestHouseBatch.data
+    
+    def test_featured_houses_kept(self):
+        """Test case where every house that is featured with its scraped taxes and rent passes the prescreen on its price and square footage."""
+        prescreen = FeaturedHousePrescreen.from_config(self.config)
+        featured_filter = FeaturedHouseFilter(self.config)
+        for house_data in self.data:
+            if featured_filter(House(self.config, house_data)):
+                self.assertTrue(prescreen(house_data["price"], house_data["sqft"]))
+    
+    def test_unaffordable_houses_dropped(self):
+        """Test case where a house too expensive for any rent is dropped, and houses are kept when the search result or config leaves nothing to check."""
+        prescreen = FeaturedHousePrescreen.from_config(self.config)
+        self.assertFalse(prescreen("$2,500,000", "1,000 sqft"))
+        self.assertTrue(prescreen("$2,500,000", None))
+        self.assertEqual((prescreen.houses_checked, prescreen.houses_dropped), (1, 1))
+        
+        self.assertTrue(FeaturedHousePrescreen.from_config(dict(self.config, featured_house_required=False))("$2,500,000", "1,000 sqft"))
+        self.assertTrue(FeaturedHousePrescreen.from_config(dict(self.config, prescreen_max_rent_per_sqft=None))("$2,500,000", "1,000 sqft"))
+    
+    def test_assumptions_shared(self):
+        """Test case where every best case house shares the assumptions the prescreen created once from the config file."""
+        prescreen = FeaturedHousePrescreen.from_config(self.config)
+        self.assertEqual(prescreen.assumptions, HouseAssumptions.from_config(self.config))
+        self.assertIs(prescreen.best_case_house(229900, 2140).assumptions, prescreen.assumptions)
+        self.assertIs(prescreen.best_case_house(189000, 1800).assumptions, prescreen.assumptions)
+        self.assertIsNone(FeaturedHousePrescreen.from_config(dict(self.config, featured_house_required=False)).assumptions)
+        
+
+class TestFeaturedHouseRanking(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    
+    data = TestHouseBatch.data
+    
+    def setUp(self):
+        self.houses = [House(self.config, house_data) for house_data in self.data]
+    
+    def test_top_houses_by_metric(self):
+        """Test case where only the top houses by monthly cash flow are kept, from the highest to the lowest."""
+        ranking = FeaturedHouseRanking(limit=2, rank_by="cash_flow_monthly")
+        for house in self.houses:
+            ranking.append(house)
+        
+        top_houses = sorted(self.houses, key=lambda house: house.cash_flow_monthly, reverse=True)[:2]
+        self.assertEqual(list(ranking), top_houses)
+        self.assertEqual(ranking.houses_seen, 4)
+        self.assertEqual([row["rank"] for row in ranking.summary()], [1, 2])
+    
+    def test_ties_keep_scrape_order(self):
+        """Test case where houses with the same score are kept and listed in the order they were scraped."""
+        ranking = FeaturedHouseRanking(limit=3, rank_by="cash_flow_monthly")
+        for house in [self.houses[0]] * 5:
+            ranking.append(house)
+        self.assertEqual(len(ranking), 3)
+        self.assertEqual([tiebreaker for _, tiebreaker, _ in sorted(ranking.heap, reverse=True)], [0, -1, -2])
+        
+        unranked = FeaturedHouseRanking()
+        for house in self.houses:
+            unranked.append(house)
+        self.assertEqual(list(unranked), self.houses)
+    
+    def test_weighted_score(self):
+        """Test case where the houses are ranked by a weighted score of several metrics and houses without a real score are ranked last."""
+        rank_by = {"cash_on_cash_return": 100, "five_year_annualized_return": 50}
+        ranking = FeaturedHouseRanking.from_config(dict(self.config, featured_house_rank_by=rank_by))
+        for house in self.houses:
+            ranking.append(house)
+        
+        expected_scores = [100 * house.cash_on_cash_decimal + 50 * house.annualized_return_decimal[5] for house in self.houses]
+        expected_scores = sorted((-float("inf") if score != score else score for score in expected_scores), reverse=True)
+        self.assertEqual([row["score"] for row in ranking.summary()], expected_scores)
+    
+    def test_nan_ranked_last(self):
+        """Test case where a house without a real score is ranked below every other house."""
+        self.houses[0].cash_flow_monthly = float("nan")
+        ranking = FeaturedHouseRanking(rank_by="cash_flow_monthly")
+        for house in self.houses:
+            ranking.append(house)
+        self.assertIs(list(ranking)[-1], self.houses[0])
+        self.assertEqual(ranking.summary()[-1]["score"], -float("inf"))
+        
+
+class TestSearchPagination(unittest.TestCase):
+    
+    search_url = "https://www.zillow.com/edgewater-cleveland-oh/duplex/"
+    
+    list_results = [
+        {
+            "detailUrl": "/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33392551_zpid/",
+            "address": "1486 Olivewood Ave, Lakewood, OH 44107",
+            "price": "$229,900",
+            "unformattedPrice": 229900,
+            "beds": 4,
+            "baths": 2.0,
+            "area": 2140,
+            "hdpData": {"homeInfo": {"price": 229900, "bedrooms": 4, "bathrooms": 2.0, "livingArea": 2140, "yearBuilt": 1918}},
+        },
+        {
+            "detailUrl": "https://www.zillow.com/homedetails/2040-Marlowe-Ave-Lakewood-OH-44107/33429384_zpid/",
+            "price": "$189,000",
+        },
+    ]
+    
+    def search_page(self, search_list, list_results=None):
+        """Create a search page with the search list and results embedded the way Zillow embeds them"""
+        next_data = json.dumps({"props": {"pageProps": {"searchPageState": {"cat1": {"searchList": search_list, "searchResults": {"listResults": list_results or []}}}}}})
+        body = f'<html><body><script id="__NEXT_DATA__" type="application/json">{next_data}</script></body></html>'
+        return HtmlResponse(url=self.search_url, body=body, encoding="utf-8")
+    
+    def test_page_count(self):
+        """Test case where the number of pages is read from the page, worked out from the number of houses, or missing."""
+        self.assertEqual(search_page_count(self.search_page({"totalPages": 4, "totalResultCount": 150})), 4)
+        self.assertEqual(search_page_count(self.search_page({"totalResultCount": 83, "resultsPerPage": 41})), 3)
+        self.assertIsNone(search_page_count(self.search_page({})))
+        self.assertIsNone(search_page_count(HtmlResponse(url=self.search_url, body=b"<html></html>", encoding="utf-8")))
+    
+    def test_page_url(self):
+        """Test case where the url of each page is built from the first page or another page, keeping any query."""
+        self.assertEqual(search_page_url(self.search_url, 2), "https://www.zillow.com/edgewater-cleveland-oh/duplex/2_p/")
+        self.assertEqual(search_page_url("https://www.zillow.com/edgewater-cleveland-oh/duplex/2_p/", 3), "https://www.zillow.com/edgewater-cleveland-oh/duplex/3_p/")
+        self.assertEqual(search_page_url("https://www.zillow.com/edgewater-cleveland-oh/duplex/2_p/", 1), self.search_url)
+        self.assertEqual(search_page_url("https://www.zillow.com/lakewood-oh/?searchQueryState=%7B%7D", 2), "https://www.zillow.com/lakewood-oh/2_p/?searchQueryState=%7B%7D")
+    
+    def test_page_results(self):
+        """Test case where the houses are read from the search results embedded in the page, or None if the results are missing or not JSON."""
+        self.assertEqual(search_page_results(self.search_page({}, self.list_results)), self.list_results)
+        self.assertIsNone(search_page_results(HtmlResponse(url=self.search_url, body=b'<html><script id="__NEXT_DATA__">{"props": {}}</script></html>', encoding="utf-8")))
+        self.assertIsNone(search_page_results(HtmlResponse(url=self.search_url, body=b'<html><script id="__NEXT_DATA__">{"props": </script></html>', encoding="utf-8")))
+    
+    def test_result_home_item(self):
+        """Test case where a house is created from a full search result and from a search result missing most of its details."""
+        self.assertEqual(dict(search_result_home_item(self.list_results[0])), {
+            "url": "https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33392551_zpid/",
+            "address": ["1486 Olivewood Ave, Lakewood, OH 44107"],
+            "price": "229900",
+            "beds": "4",
+            "baths": "2.0",
+            "sqft": "2140",
+            "year_built": "1918",
+        })
+        self.assertEqual(dict(search_result_home_item(self.list_results[1])), {
+            "url": "https://www.zillow.com/homedetails/2040-Marlowe-Ave-Lakewood-OH-44107/33429384_zpid/",
+            "address": [],
+            "price": "$189,000",
+            "beds": None,
+            "baths": None,
+            "sqft": None,
+            "year_built": None,
+        })
+        
+
+class TestLookupCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir.name, "homedata-cache.sqlite")
+        
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_values_kept_between_runs(self):
+        """Test case where the stored values are read back after the cache is closed and opened again."""
+        tax_cache = LookupCache(self.cache_path, "taxes", ttl=60)
+        self.assertIsNone(tax_cache.get("1486-olivewood-ave-lakewood-oh-44107"))
+        tax_cache.set("1486-olivewood-ave-lakewood-oh-44107", {"tax": "$4,325", "structure_quality": None})
+        tax_cache.close()
+        
+        tax_cache = LookupCache(self.cache_path, "taxes", ttl=60)
+        self.assertEqual(tax_cache.get("1486-olivewood-ave-lakewood-oh-44107"), {"tax": "$4,325", "structure_quality": None})
+        self.assertIsNone(LookupCache(self.cache_path, "rents").get("1486-olivewood-ave-lakewood-oh-44107"))
+        tax_cache.close()
+    
+    def test_expired_values(self):
+        """Test case where values older than the time to live are treated as missing."""
+        tax_cache = LookupCache(self.cache_path, "taxes", ttl=-1)
+        tax_cache.set("1486-olivewood-ave-lakewood-oh-44107", {"tax": "$4,325"})
+        self.assertIsNone(tax_cache.get("1486-olivewood-ave-lakewood-oh-44107"))
+        tax_cache.close()
+        
+        # Expired values can still be read with their age to be used while they are refreshed
+        rent_cache = LookupCache(self.cache_path, "rents", ttl=-1)
+        rent_cache.set("1486-olivewood-ave-lakewood-oh-44107", {"rent": "1395"})
+        rent_values, rent_age = rent_cache.get_with_age("1486-olivewood-ave-lakewood-oh-44107")
+        self.assertEqual(rent_values, {"rent": "1395"})
+        self.assertGreaterEqual(rent_age, 0)
+        self.assertEqual(rent_cache.get_with_age("2040-marlowe-ave-lakewood-oh-44107"), (None, None))
+        rent_cache.close()
+        
+        with self.assertRaises(ValueError):
+            LookupCache(self.cache_path, "taxes; DROP TABLE taxes")
+
+
+class TestFullspiderLookups(unittest.TestCase):
+    
+    house_url = "https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33392551_zpid/"
+    
+    street_page_body = b'<ul><li><a href="/oh-lakewood-1486-olivewood-ave-property-records/">1486 Olivewood Ave</a></li></ul>'
+    
+    property_page_body = b'<table id="property-taxes"><tbody><tr><td>2023</td><td>$4,218</td></tr></tbody></table><table><tbody><tr><th>Structure Quality</th><td>Average</td></tr><tr><th>Structure Condition</th><td>Good</td></tr></tbody></table>'
+    
+    rent_page_body = b'<script type="text/javascript">{"rentZestimate":1650,"rentRange":{"min":1400,"max":1900}}</script>'
+    
+    slug = "1486-olivewood-ave-lakewood-oh-44107"
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+    
+    def open_spider(self):
+        """Create the spider through a crawler with its caches in the temporary folder and open it the way the engine does"""
+        crawler = get_crawler(FullspiderSpider, {"LOOKUP_CACHE_FILE": os.path.join(self.temp_dir.name, "homedata-cache.sqlite")})
+        spider = FullspiderSpider.from_crawler(crawler)
+        crawler.signals.send_catch_log(signals.spider_opened, spider=spider)
+        self.addCleanup(crawler.signals.send_catch_log, signals.spider_closed, spider=spider, reason="finished")
+        return spider
+    
+    def start_lookups(self, spider):
+        """Find the house in the search results and return its street page and rent page requests"""
+        search_page = HtmlResponse(url="https://www.zillow.com/edgewater-cleveland-oh/duplex/", body=b"<html></html>")
+        street_request, rent_request = spider.house_found(search_page, {"url": self.house_url, "price": "229900"})
+        return street_request, rent_request
+    
+    def test_lookups_merged_into_house(self):
+        """Test case where the street page, property page, and rent page of a house are parsed and their information is merged into the saved house."""
+        spider = self.open_spider()
+        street_request, rent_request = self.start_lookups(spider)
+        self.assertEqual(street_request.url, "https://www.countyoffice.org/olivewood-ave-lakewood-oh-property-records/")
+        
+        property_request, = spider.parse_street_page(HtmlResponse(url=street_request.url, request=street_request, body=self.street_page_body))
+        self.assertEqual(property_request.url, "https://www.countyoffice.org/oh-lakewood-1486-olivewood-ave-property-records/")
+        self.assertEqual(list(spider.parse_property_page(HtmlResponse(url=property_request.url, request=property_request, body=self.property_page_body))), [])
+        
+        house, = spider.parse_rent_page(HtmlResponse(url=rent_request.url, request=rent_request, body=self.rent_page_body))
+        self.assertEqual({key: house.get(key) for key in ("url", "tax_url", "tax", "structure_quality", "structure_condition", "rent_url", "rent", "min_rent", "max_rent")}, {
+            "url": self.house_url,
+            "tax_url": property_request.url,
+            "tax": "$4,218",
+            "structure_quality": "Average",
+            "structure_condition": "Good",
+            "rent_url": rent_request.url,
+            "rent": "1650",
+            "min_rent": "1400",
+            "max_rent": "1900",
+        })
+    
+    def test_failed_lookups_save_house(self):
+        """Test case where the rent page and then the street page of a house fail and the house is saved without their information once both have failed."""
+        spider = self.open_spider()
+        street_request, rent_request = self.start_lookups(spider)
+        
+        rent_failure = Failure(TimeoutError("Getting the rent page took too long"))
+        rent_failure.request = rent_request
+        self.assertEqual(list(spider.lookup_failed(rent_failure)), [])
+        
+        street_failure = Failure(TimeoutError("Getting the street page took too long"))
+        street_failure.request = street_request
+        house, = spider.street_page_failed(street_failure)
+        self.assertEqual(house["url"], self.house_url)
+        self.assertNotIn("tax", house)
+        self.assertNotIn("rent", house)
+    
+    def save_lookups(self, rent_age):
+        """Save the tax records and a rent estimate of the house to the lookup cache as if an earlier run found them, with the rent saved the given number of days ago"""
+        cache_path = os.path.join(self.temp_dir.name, "homedata-cache.sqlite")
+        tax_cache = LookupCache(cache_path, "taxes")
+        tax_cache.set(self.slug, {"tax_url": "https://www.countyoffice.org/oh-lakewood-1486-olivewood-ave-property-records/", "tax": "$4,218", "structure_quality": "Average", "structure_condition": "Good"})
+        tax_cache.close()
+        
+        rent_cache = LookupCache(cache_path, "rents")
+        rent_cache.set(self.slug, {"rent_url": "https://www.zillow.com/rental-manager/price-my-rental/results/1486-olivewood-ave-lakewood-oh-44107/", "rent": "1500", "min_rent": "1300", "max_rent": "1700"})
+        rent_cache.connection.execute("UPDATE rents SET stored_at = stored_at - ?", (rent_age * 24 * 60 * 60,))
+        rent_cache.connection.commit()
+        rent_cache.close()
+    
+    def find_house(self, spider):
+        """Find the house in the search results and return everything the spider yields for it"""
+        search_page = HtmlResponse(url="https://www.zillow.com/edgewater-cleveland-oh/duplex/", body=b"<html></html>")
+        return list(spider.house_found(search_page, {"url": self.house_url, "price": "229900"}))
+    
+    def test_fresh_rent_used(self):
+        """Test case where rent saved less than RENT_CACHE_TTL_DAYS ago is used without a request and the house is saved at once."""
+        self.save_lookups(rent_age=1)
+        spider = self.open_spider()
+        house, = self.find_house(spider)
+        self.assertEqual((house["rent"], house["min_rent"], house["max_rent"], house["tax"]), ("1500", "1300", "1700", "$4,218"))
+        self.assertEqual(spider.houses_in_progress, {})
+    
+    def test_stale_rent_refreshed(self):
+        """Test case where rent saved between RENT_CACHE_TTL_DAYS and RENT_CACHE_STALE_DAYS ago is used to save the house at once while a low priority request refreshes it, and the refreshed rent replaces the saved rent."""
+        self.save_lookups(rent_age=10)
+        spider = self.open_spider()
+        refresh_request, house = self.find_house(spider)
+        self.assertEqual(house["rent"], "1500")
+        self.assertEqual(spider.houses_in_progress, {})
+        self.assertEqual((refresh_request.callback, refresh_request.priority), (spider.refresh_rent_page, -1))
+        self.assertEqual(refresh_request.url, "https://www.zillow.com/rental-manager/price-my-rental/results/1486-olivewood-ave-lakewood-oh-44107/")
+        
+        self.assertEqual(list(spider.refresh_rent_page(HtmlResponse(url=refresh_request.url, request=refresh_request, body=self.rent_page_body))), [])
+        rent_values, rent_age = spider.rent_cache.get_with_age(self.slug)
+        self.assertEqual((rent_values["rent"], rent_values["min_rent"], rent_values["max_rent"]), ("1650", "1400", "1900"))
+        self.assertLess(rent_age, spider.rent_cache.ttl)
+    
+    def test_expired_rent_refetched(self):
+        """Test case where rent saved more than RENT_CACHE_STALE_DAYS past RENT_CACHE_TTL_DAYS ago is looked up again before the house is saved, like a house that was never saved."""
+        self.save_lookups(rent_age=40)
+        spider = self.open_spider()
+        rent_request, = self.find_house(spider)
+        self.assertEqual(rent_request.callback, spider.parse_rent_page)
+        self.assertEqual(spider.houses_in_progress[self.house_url]["lookups"], {"rent"})
+        self.assertNotIn("rent", spider.houses_in_progress[self.house_url]["house"])
+        
+        house, = spider.parse_rent_page(HtmlResponse(url=rent_request.url, request=rent_request, body=self.rent_page_body))
+        self.assertEqual((house["rent"], house["tax"]), ("1650", "$4,218"))
+    
+    def test_unlisted_house_saved(self):
+        """Test case where a house missing from its street page finishes its tax lookup without the tax information."""
+        spider = self.open_spider()
+        street_request, rent_request = self.start_lookups(spider)
+        self.assertEqual(list(spider.parse_street_page(HtmlResponse(url=street_request.url, request=street_request, body=b"<ul></ul>"))), [])
+        
+        house, = spider.parse_rent_page(HtmlResponse(url=rent_request.url, request=rent_request, body=self.rent_page_body))
+        self.assertEqual((house["rent"], house.get("tax")), ("1650", None))
+
+
+class TestCrawlCheckpoint(unittest.TestCase):
+    
+    class QueueSpider(Spider):
+        name = "queuespider"
+        checkpoint_requests = True
+    
+    class FileSpider(Spider):
+        name = "filespider"
+    
+    house_lines = [
+        '{"url": "https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33392551_zpid/"}\n',
+        '{"url": "https://www.zillow.com/homedetails/2040-Marlowe-Ave-Lakewood-OH-44107/33429384_zpid/"}\n',
+    ]
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.checkpoint = CrawlCheckpoint(os.path.join(self.temp_dir.name, "crawl-checkpoint"))
+        self.feed_path = os.path.join(self.temp_dir.name, "homedata.jsonl")
+        self.settings = Settings({"FEEDS": {self.feed_path: {"format": "jsonlines"}}})
+    
+    def write_feed(self, content):
+        with open(self.feed_path, "w") as feed_file:
+            feed_file.write(content)
+    
+    def read_feed(self):
+        with open(self.feed_path) as feed_file:
+            return feed_file.read()
+    
+    def save_queue(self, spidercls):
+        """Start the spider's checkpoint and save a request queue to it the way Scrapy's JOBDIR does"""
+        self.checkpoint.spider_settings(self.settings, spidercls, self.feed_path)
+        queue_path = os.path.join(self.checkpoint.spider_dir(spidercls), "requests.queue")
+        os.makedirs(queue_path)
+        return queue_path
+    
+    def test_new_crawl(self):
+        """Test case where a spider without a checkpoint starts from the start urls and replaces its feed file."""
+        spider_settings = self.checkpoint.spider_settings(self.settings, self.QueueSpider, self.feed_path)
+        self.assertFalse(spider_settings.getbool("CRAWL_RESUME"))
+        self.assertEqual(spider_settings.get("JOBDIR"), self.checkpoint.spider_dir(self.QueueSpider))
+        self.assertNotIn("overwrite", spider_settings.getdict("FEEDS")[self.feed_path])
+        self.assertIsNone(self.settings.get("JOBDIR"))
+        
+        # No checkpoint folder means every crawl starts from the start urls
+        spider_settings = CrawlCheckpoint(None).spider_settings(self.settings, self.QueueSpider, self.feed_path)
+        self.assertIsNone(spider_settings.get("JOBDIR"))
+        self.assertFalse(CrawlCheckpoint(None).is_finished(self.QueueSpider))
+    
+    def test_killed_spider_restarted(self):
+        """Test case where a spider with request checkpoints that was killed has its folder wiped, so the requests it saw are not skipped, but keeps the houses it saved."""
+        queue_path = self.save_queue(self.QueueSpider)
+        self.write_feed(self.house_lines[0] + '{"url": "https://www.zillow.com/homedetails/20')
+        
+        spider_settings = self.checkpoint.spider_settings(self.settings, self.QueueSpider, self.feed_path)
+        self.assertFalse(os.path.exists(queue_path))
+        self.assertTrue(os.path.isdir(self.checkpoint.spider_dir(self.QueueSpider)))
+        self.assertTrue(spider_settings.getbool("CRAWL_RESUME"))
+        self.assertEqual(self.read_feed(), self.house_lines[0])
+    
+    def test_stopped_spider_resumed(self):
+        """Test case where a spider that stopped cleanly keeps its saved queue and the stopped marker is removed once it runs again."""
+        queue_path = self.save_queue(self.QueueSpider)
+        self.checkpoint.close_spider(self.QueueSpider, "shutdown")
+        stopped_marker = os.path.join(self.checkpoint.spider_dir(self.QueueSpider), "stopped")
+        self.assertTrue(os.path.exists(stopped_marker))
+        self.assertFalse(self.checkpoint.is_finished(self.QueueSpider))
+        
+        spider_settings = self.checkpoint.spider_settings(self.settings, self.QueueSpider, self.feed_path)
+        self.assertTrue(os.path.isdir(queue_path))
+        self.assertFalse(os.path.exists(stopped_marker))
+        self.assertEqual(spider_settings.get("JOBDIR"), self.checkpoint.spider_dir(self.QueueSpider))
+        self.assertTrue(spider_settings.getbool("CRAWL_RESUME"))
+    
+    def test_finished_spider_skipped(self):
+        """Test case where a spider that finished is skipped when the crawl is resumed and started again once the checkpoint is cleared."""
+        self.checkpoint.spider_settings(self.settings, self.FileSpider, self.feed_path)
+        self.checkpoint.close_spider(self.FileSpider, "finished")
+        self.assertTrue(self.checkpoint.is_finished(self.FileSpider))
+        self.assertFalse(self.checkpoint.is_finished(self.QueueSpider))
+        
+        self.checkpoint.clear()
+        self.assertFalse(self.checkpoint.is_finished(self.FileSpider))
+        self.assertFalse(os.path.exists(self.checkpoint.checkpoint_dir))
+    
+    def test_resumed_feed_appended(self):
+        """Test case where a resumed spider adds to its feed file instead of replacing it and skips the houses it already saved."""
+        self.checkpoint.spider_settings(self.settings, self.FileSpider, self.feed_path)
+        self.write_feed("".join(self.house_lines))
+        
+        spider_settings = self.checkpoint.spider_settings(self.settings, self.FileSpider, self.feed_path)
+        self.assertEqual(spider_settings.getdict("FEEDS"), {self.feed_path: {"format": "jsonlines", "overwrite": False}})
+        self.assertIsNone(spider_settings.get("JOBDIR"))
+        self.assertEqual(saved_house_urls(spider_settings, self.feed_path), {json.loads(line)["url"] for line in self.house_lines})
+        self.assertEqual(saved_house_urls(self.settings, self.feed_path), set())
+        self.assertEqual(saved_house_urls(Settings({"CRAWL_RESUME": True}), os.path.join(self.temp_dir.name, "missing.jsonl")), set())
+    
+    def test_truncate_incomplete_line(self):
+        """Test case where only a partly written last line is removed, including a file with no complete lines and lines longer than the chunks the file is read in."""
+        self.write_feed(self.house_lines[0] + '{"url": "https://www.zillow.com/homedetails/20')
+        truncate_incomplete_line(self.feed_path)
+        self.assertEqual(self.read_feed(), self.house_lines[0])
+        
+        self.write_feed("".join(self.house_lines))
+        truncate_incomplete_line(self.feed_path)
+        self.assertEqual(self.read_feed(), "".join(self.house_lines))
+        
+        self.write_feed('{"url": "https://www.zillow.com/homedetails/14')
+        truncate_incomplete_line(self.feed_path)
+        self.assertEqual(self.read_feed(), "")
+        
+        long_line = json.dumps({"description": "a" * 10000}) + "\n"
+        self.write_feed(long_line + long_line[:9000])
+        truncate_incomplete_line(self.feed_path)
+        self.assertEqual(self.read_feed(), long_line)
+        
+        truncate_incomplete_line(os.path.join(self.temp_dir.name, "missing.jsonl"))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir.name, "missing.jsonl")))
+
+
+class TestFullspiderState(unittest.TestCase):
+    
+    house_url = "https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33392551_zpid/"
+    
+    saved_house_url = "https://www.zillow.com/homedetails/2040-Marlowe-Ave-Lakewood-OH-44107/33429384_zpid/"
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.job_dir = os.path.join(self.temp_dir.name, "fullspider")
+        os.makedirs(self.job_dir)
+        
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def open_spider(self, settings=None):
+        """Create the spider through a real crawler and open it the way the engine does, letting the SpiderState extension load any saved state"""
+        crawler = get_crawler(FullspiderSpider, dict({"LOOKUP_CACHE_FILE": os.path.join(self.temp_dir.name, "homedata-cache.sqlite")}, **(settings or {})))
+        spider = FullspiderSpider.from_crawler(crawler)
+        crawler.signals.send_catch_log(signals.spider_opened, spider=spider)
+        self.addCleanup(crawler.signals.send_catch_log, signals.spider_closed, spider=spider, reason="finished")
+        return spider
+    
+    def test_house_saved_after_both_lookups(self):
+        """Test case where a new crawl starts the tax and rent lookups of a house and saves it once both have finished."""
+        spider = self.open_spider()
+        search_page = HtmlResponse(url="https://www.zillow.com/edgewater-cleveland-oh/duplex/", body=b"<html></html>")
+        requests = list(spider.house_found(search_page, {"url": self.house_url, "price": "229900"}))
+        self.assertEqual([request.url for request in requests], [
+            "https://www.countyoffice.org/olivewood-ave-lakewood-oh-property-records/",
+            "https://www.zillow.com/rental-manager/price-my-rental/results/1486-olivewood-ave-lakewood-oh-44107/",
+        ])
+        self.assertEqual(spider.houses_in_progress[self.house_url]["lookups"], {"tax", "rent"})
+        
+        self.assertEqual(list(spider.finish_lookup({"house_url": self.house_url, "lookup": "tax"})), [])
+        self.assertEqual(list(spider.finish_lookup({"house_url": self.house_url, "lookup": "rent"})), [{"url": self.house_url, "price": "229900"}])
+        self.assertEqual(spider.houses_in_progress, {})
+    
+    def test_houses_in_progress_resumed(self):
+        """Test case where a resumed crawl finishes the lookups of the houses saved in the spider state of the stopped crawl."""
+        with open(os.path.join(self.job_dir, "spider.state"), "wb") as state_file:
+            pickle.dump({"houses_in_progress": {self.saved_house_url: {"house": {"url": self.saved_house_url}, "lookups": {"rent"}}}, "street_pages_pending": {}}, state_file)
+        
+        spider = self.open_spider({"JOBDIR": self.job_dir})
+        self.assertEqual(list(spider.finish_lookup({"house_url": self.saved_house_url, "lookup": "rent"})), [{"url": self.saved_house_url}])
+        self.assertIs(spider.street_pages.pending, spider.state["street_pages_pending"])
+        
+
+class TestStreetPageLookups(unittest.TestCase):
+    
+    street_url = "https://www.countyoffice.org/olivewood-ave-lakewood-oh-property-records/"
+    
+    links = ["/oh-lakewood-1486-olivewood-ave-property-records/", "/oh-lakewood-1490-olivewood-ave-property-records/"]
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir.name, "homedata-cache.sqlite")
+        
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_street_page_requested_once(self):
+        """Test case where every house on a street waits on one street page request and is resolved from the one response."""
+        street_pages = StreetPageLookups(LookupCache(self.cache_path, "streets"))
+        self.assertIsNone(street_pages.known_links(self.street_url))
+        self.assertEqual([street_pages.add_pending(self.street_url, {"address_number": address_number}) for address_number in ("1486", "1490", "1500")], [True, False, False])
+        
+        resolved = street_pages.resolve(self.street_url, self.links)
+        self.assertEqual([tax_property_page_url(self.links, meta["address_number"]) for meta in resolved], [
+            "https://www.countyoffice.org/oh-lakewood-1486-olivewood-ave-property-records/",
+            "https://www.countyoffice.org/oh-lakewood-1490-olivewood-ave-property-records/",
+            None,
+        ])
+        self.assertEqual(street_pages.known_links(self.street_url), self.links)
+        street_pages.street_cache.close()
+        
+        # The links are known to the next run without downloading the street page
+        street_pages = StreetPageLookups(LookupCache(self.cache_path, "streets"))
+        self.assertEqual(street_pages.known_links(self.street_url), self.links)
+        street_pages.street_cache.close()
+    
+    def test_failed_street_page(self):
+        """Test case where the houses waiting on a failed street page are returned and the next house requests it again."""
+        street_pages = StreetPageLookups(LookupCache(self.cache_path, "streets"))
+        street_pages.add_pending(self.street_url, {"address_number": "1486"})
+        self.assertEqual(street_pages.fail(self.street_url), [{"address_number": "1486"}])
+        self.assertTrue(street_pages.add_pending(self.street_url, {"address_number": "1490"}))
+        street_pages.street_cache.close()
+        
+
+class TestSQLiteFrontierStore(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.temp_dir.name, "homedata-frontier.sqlite")
+        
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_requests_shared_between_workers(self):
+        """Test case where two workers take requests from one queue by priority, and each request is only taken once."""
+        first_worker = SQLiteFrontierStore(self.store_path, run="2024-03-15")
+        second_worker = SQLiteFrontierStore(self.store_path, run="2024-03-15")
+        first_worker.push_request("taxspider", b"street page", priority=0)
+        first_worker.push_request("taxspider", b"property page", priority=1)
+        second_worker.push_request("taxspider", b"second street page", priority=0)
+        self.assertEqual(second_worker.count_requests("taxspider"), 3)
+        
+        self.assertEqual(second_worker.pop_request("taxspider", "host-b:202")[1], b"property page")
+        self.assertEqual(first_worker.pop_request("taxspider", "host-a:101")[1], b"street page")
+        self.assertEqual(second_worker.pop_request("taxspider", "host-b:202")[1], b"second street page")
+        self.assertIsNone(first_worker.pop_request("taxspider", "host-a:101"))
+        
+        # A request seen by one worker is a duplicate for the other, but not for a new run
+        self.assertTrue(first_worker.add_fingerprint("taxspider", "a1b2"))
+        self.assertFalse(second_worker.add_fingerprint("taxspider", "a1b2"))
+        next_run = SQLiteFrontierStore(self.store_path, run="2024-03-16")
+        self.assertTrue(next_run.add_fingerprint("taxspider", "a1b2"))
+        for frontier_store in (first_worker, second_worker, next_run):
+            frontier_store.close()
+    
+    def test_busy_workers_and_items(self):
+        """Test case where idle workers and workers past the timeout are not counted as busy, and a house saved twice is kept once."""
+        frontier_store = SQLiteFrontierStore(self.store_path, run="2024-03-15")
+        frontier_store.mark_busy("homespider", "host-a:101")
+        frontier_store.mark_busy("homespider", "host-b:202")
+        self.assertEqual(frontier_store.busy_nodes("homespider", timeout=600), 2)
+        self.assertEqual(frontier_store.busy_nodes("homespider", timeout=-1), 0)
+        frontier_store.mark_idle("homespider", "host-a:101")
+        self.assertEqual(frontier_store.busy_nodes("homespider", timeout=600), 1)
+        
+        frontier_store.save_item("homespider", "33392551", {"price": "$199,900"})
+        frontier_store.save_item("homespider", "33429384", {"price": "$154,900"})
+        frontier_store.save_item("homespider", "33392551", {"price": "$189,900"})
+        self.assertEqual(list(frontier_store.iter_items("homespider")), [{"price": "$189,900"}, {"price": "$154,900"}])
+        self.assertEqual(list(frontier_store.iter_items("taxspider")), [])
+        frontier_store.close()
+    
+    def test_requests_of_killed_worker_requeued(self):
+        """Test case where a finished request is removed, and a request taken by a worker that stops being marked busy is put back for another worker."""
+        frontier_store = SQLiteFrontierStore(self.store_path, run="2024-03-15")
+        frontier_store.push_request("taxspider", b"street page", priority=0)
+        frontier_store.push_request("taxspider", b"property page", priority=1)
+        frontier_store.mark_busy("taxspider", "host-a:101")
+        
+        request_id, _ = frontier_store.pop_request("taxspider", "host-a:101")
+        frontier_store.ack_request("taxspider", request_id)
+        frontier_store.pop_request("taxspider", "host-a:101")
+        self.assertEqual(frontier_store.count_requests("taxspider"), 0)
+        self.assertEqual(frontier_store.requeue_requests("taxspider", timeout=600), 0)
+        
+        self.assertEqual(frontier_store.requeue_requests("taxspider", timeout=-1), 1)
+        self.assertEqual(frontier_store.count_requests("taxspider"), 1)
+        self.assertEqual(frontier_store.pop_request("taxspider", "host-b:202")[1], b"street page")
+        frontier_store.close()
+    
+    def test_request_json(self):
+        """Test case where a request is stored as JSON and rebuilt with the same headers, body, meta, and callback."""
+        spider = TestCircuitBreaker.CircuitSpider()
+        request = Request("https://www.countyoffice.org/olivewood-ave-lakewood-oh-property-records/", callback=spider.parse, headers={"authority": "www.countyoffice.org", "x-street": "Olivewood Café"}, body=b"\x00\xff", priority=3, meta={"houses": [{"house_url": "https://www.zillow.com/homedetails/33392551_zpid/", "priority": 3}]})
+        data = request_to_json(request, spider)
+        self.assertEqual(json.loads(data)["callback"], "parse")
+        
+        stored_request = request_from_json(data, spider)
+        self.assertEqual((stored_request.url, stored_request.body, stored_request.priority, stored_request.meta), (request.url, request.body, request.priority, request.meta))
+        self.assertEqual(stored_request.headers.to_unicode_dict(), request.headers.to_unicode_dict())
+        self.assertEqual(stored_request.callback, spider.parse)
+    
+    def test_scheduler_acks_finished_requests(self):
+        """Test case where the scheduler keeps a request in the store while the engine is working on it and removes it once the engine is done."""
+        crawler = get_crawler(TestCircuitBreaker.CircuitSpider, {
+            "FRONTIER_URL": f"sqlite:///{self.store_path}",
+            "DUPEFILTER_CLASS": "homescraper.frontier.FrontierDupeFilter",
+        })
+        crawler.spider = TestCircuitBreaker.CircuitSpider()
+        crawler.engine = SimpleNamespace(slot=SimpleNamespace(inprogress=set()))
+        scheduler = FrontierScheduler.from_crawler(crawler)
+        scheduler.open(crawler.spider)
+        frontier_store = SQLiteFrontierStore(self.store_path, run="default")
+        
+        scheduler.enqueue_request(Request("https://www.countyoffice.org/olivewood-ave-lakewood-oh-property-records/", callback=crawler.spider.parse))
+        request = scheduler.next_request()
+        crawler.engine.slot.inprogress.add(request)
+        self.assertIsNone(scheduler.next_request())
+        self.assertEqual(frontier_store.connection.execute("SELECT COUNT(*) FROM frontier_requests").fetchone()[0], 1)
+        
+        crawler.engine.slot.inprogress.remove(request)
+        self.assertIsNone(scheduler.next_request())
+        self.assertEqual(frontier_store.connection.execute("SELECT COUNT(*) FROM frontier_requests").fetchone()[0], 0)
+        scheduler.close("finished")
+        frontier_store.close()
+        
+
+class TestDealPriority(unittest.TestCase):
+    
+    def test_promising_houses_first(self):
+        """Test case where houses with more units and a lower price than the area median get a higher priority and houses without a price stay in the middle."""
+        deal_priority = DealPriority(min_area_houses=2)
+        self.assertEqual(deal_priority({"price": "200000", "sqft": "2000", "address": "1486 Olivewood Ave, Lakewood, OH 44107"}), 5)
+        self.assertEqual(deal_priority({"price": "$200,000", "sqft": "2,000 sqft", "address": ["2040 Marlowe Ave", "Lakewood, OH 44107"]}), 5)
+        duplex_priority = deal_priority({"price": "150000", "sqft": "2400", "address": "1500 Olivewood Ave, Lakewood, OH 44107", "property_subtype": "duplex"})
+        expensive_priority = deal_priority({"price": "400000", "sqft": "1500", "address": "11801 Franklin Blvd, Lakewood, OH 44107"})
+        self.assertGreater(duplex_priority, 5)
+        self.assertLess(expensive_priority, 5)
+        self.assertEqual(deal_priority({"price": None, "sqft": "1"}, base=1), 6)
+        
+
+class TestOutcomeStats(unittest.TestCase):
+    
+    def test_blocked_choices_picked_less_often(self):
+        """Test case where the header profile that keeps getting blocked is picked less often than the one that gets through and one that has not been tried."""
+        header_outcomes = OutcomeStats()
+        for _ in range(20):
+            header_outcomes.record("blocked-browser", "Status 403", 1.5)
+            header_outcomes.record("working-browser", None, 0.5)
+        
+        self.assertAlmostEqual(header_outcomes.success_rate("blocked-browser"), 1 / 22)
+        self.assertAlmostEqual(header_outcomes.success_rate("working-browser"), 21 / 22)
+        self.assertAlmostEqual(header_outcomes.success_rate("new-browser"), 0.5)
+        self.assertEqual(header_outcomes.summary()[0], {'key': "blocked-browser", 'requests': 20, 'blocked': 20, 'blocked_reasons': {"Status 403": 20}, 'average_latency': 1.5})
+        self.assertEqual(header_outcomes.summary()[1]['blocked_reasons'], {})
+        
+        picks = [header_outcomes.choose(["blocked-browser", "working-browser", "new-browser"]) for _ in range(2000)]
+        self.assertLess(picks.count("blocked-browser"), picks.count("new-browser"))
+        self.assertLess(picks.count("new-browser"), picks.count("working-browser"))
+    
+    def test_blocked_reasons_counted(self):
+        """Test case where the reasons a key's requests were blocked are counted for each key from the most to the least common."""
+        site_outcomes = OutcomeStats()
+        for reason in ["Captcha page (px-captcha)", "Status 403", None, "Status 403"]:
+            site_outcomes.record("www.zillow.com", reason, 1.0)
+        site_outcomes.record("www.countyoffice.org", "Status 429", 1.0)
+        
+        self.assertEqual([(site['key'], site['blocked'], site['blocked_reasons']) for site in site_outcomes.summary()], [
+            ("www.zillow.com", 3, {"Status 403": 2, "Captcha page (px-captcha)": 1}),
+            ("www.countyoffice.org", 1, {"Status 429": 1}),
+        ])
+        self.assertEqual(list(site_outcomes.summary()[0]['blocked_reasons']), ["Status 403", "Captcha page (px-captcha)"])
+    
+    def test_blocked_response_reason(self):
+        """Test case where responses are blocked by their status or by a captcha page returned with a normal status."""
+        blocked_statuses = {403, 429, 503}
+        blocked_markers = [b"px-captcha"]
+        house_page = HtmlResponse("https://www.zillow.com/homedetails/1", body=b"<h1>1486 Olivewood Ave</h1>")
+        captcha_page = HtmlResponse("https://www.zillow.com/homedetails/1", body=b'<div id="px-captcha"></div>')
+        rate_limited = HtmlResponse("https://www.zillow.com/homedetails/1", status=429, body=b"")
+        
+        self.assertIsNone(blocked_response_reason(house_page, blocked_statuses, blocked_markers))
+        self.assertEqual(blocked_response_reason(captcha_page, blocked_statuses, blocked_markers), "Captcha page (px-captcha)")
+        self.assertEqual(blocked_response_reason(rate_limited, blocked_statuses, blocked_markers), "Status 429")
+
+
+class TestFakeBrowserHeaders(unittest.TestCase):
+    
+    def browser_headers(self, browser):
+        """Create the headers ScrapeOps returns for one browser"""
+        return {
+            "accept-language": "en-US,en;q=0.9",
+            "sec-fetch-user": "?1",
+            "sec-fetch-mod": "navigate",
+            "sec-fetch-site": "none",
+            "sec-ch-ua-platform": "Windows",
+            "sec-ch-ua-mobile": "?0",
+            "sec-ch-ua": f'"{browser}";v="120"',
+            "accept": "text/html",
+            "user-agent": f"Mozilla/5.0 {browser}/120.0",
+            "upgrade-insecure-requests": "1",
+        }
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.settings = Settings({
+            "SCRAPEOPS_API_KEY": "d875dca3-61b5-4126-9181-24e588fe58d3",
+            "SCRAPEOPS_FAKE_HEADERS_ENABLED": True,
+            "LOOKUP_CACHE_FILE": os.path.join(self.temp_dir.name, "homedata-cache.sqlite"),
+        })
+        self.headers_key = "http://headers.scrapeops.io/v1/browser-headers?None"
+        
+        # Start each test with an empty header pool and answer the header requests without the network
+        self.fetched_headers = [self.browser_headers("Chrome")]
+        self.fetch = mock.Mock(side_effect=lambda: self.fetched_headers)
+        self.refreshes = []
+        for patcher in (
+            mock.patch.object(ScrapeOpsFakeBrowserHeadersMiddleware, "shared_headers_lists", {}),
+            mock.patch.object(ScrapeOpsFakeBrowserHeadersMiddleware, "refreshing_headers_lists", set()),
+            mock.patch.object(ScrapeOpsFakeBrowserHeadersMiddleware, "header_outcomes", OutcomeStats()),
+            mock.patch.object(ScrapeOpsFakeBrowserHeadersMiddleware, "_fetch_headers_list", lambda middleware: self.fetch()),
+            mock.patch("homescraper.middlewares.deferToThread", self.defer_to_thread),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def defer_to_thread(self, function):
+        """Hold a background refresh until the test finishes it"""
+        refresh = defer.Deferred()
+        self.refreshes.append((function, refresh))
+        return refresh
+    
+    def save_headers(self, headers_list, age):
+        headers_cache = LookupCache(self.settings.get("LOOKUP_CACHE_FILE"), "browser_headers")
+        headers_cache.set(self.headers_key, headers_list)
+        headers_cache.connection.execute("UPDATE browser_headers SET stored_at = stored_at - ?", (age,))
+        headers_cache.connection.commit()
+        headers_cache.close()
+    
+    def saved_headers(self):
+        headers_cache = LookupCache(self.settings.get("LOOKUP_CACHE_FILE"), "browser_headers")
+        headers_list = headers_cache.get(self.headers_key)
+        headers_cache.close()
+        return headers_list
+    
+    def test_headers_fetched_once(self):
+        """Test case where the headers are fetched before the first spider starts, saved for the next runs, and shared with the later spiders of the run."""
+        ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        middleware = ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        self.assertEqual(self.fetch.call_count, 1)
+        self.assertEqual(middleware.headers_list, self.fetched_headers)
+        self.assertEqual(self.saved_headers(), self.fetched_headers)
+        
+        request = Request("https://www.zillow.com/homedetails/33392551_zpid/")
+        middleware.process_request(request, None)
+        self.assertEqual(request.headers["user-agent"], b"Mozilla/5.0 Chrome/120.0")
+        self.assertEqual(request.headers["sec-ch-ua-platform"], b'"Windows"')
+        self.assertEqual(request.meta["header_profile"], "Mozilla/5.0 Chrome/120.0")
+    
+    def test_saved_headers_used(self):
+        """Test case where the headers saved by an earlier run are used without fetching them."""
+        self.save_headers([self.browser_headers("Firefox")], 60)
+        middleware = ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        self.assertEqual(middleware.headers_list, [self.browser_headers("Firefox")])
+        self.assertEqual((self.fetch.call_count, self.refreshes), (0, []))
+    
+    def test_stale_headers_refreshed_in_background(self):
+        """Test case where out of date headers are used while they are refreshed once in the background, and replaced once the refresh finishes."""
+        self.save_headers([self.browser_headers("Firefox")], 2 * 24 * 60 * 60)
+        middleware = ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        ScrapeOpsFakeBrowserHeadersMiddleware.shared_headers_lists.clear()
+        ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        self.assertEqual(middleware.headers_list, [self.browser_headers("Firefox")])
+        self.assertEqual(len(self.refreshes), 1)
+        
+        function, refresh = self.refreshes[0]
+        refresh.callback(function())
+        self.assertEqual(middleware.headers_list, self.fetched_headers)
+        self.assertEqual(self.saved_headers(), self.fetched_headers)
+        self.assertEqual(ScrapeOpsFakeBrowserHeadersMiddleware.refreshing_headers_lists, set())
+    
+    def test_failed_refresh_keeps_saved_headers(self):
+        """Test case where the saved headers are kept when the background refresh fails."""
+        self.save_headers([self.browser_headers("Firefox")], 2 * 24 * 60 * 60)
+        middleware = ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        
+        _, refresh = self.refreshes[0]
+        with self.assertLogs("homescraper.middlewares", level="WARNING") as logs:
+            refresh.errback(requests.ConnectionError("headers.scrapeops.io could not be reached"))
+        self.assertEqual(logs.output, ["WARNING:homescraper.middlewares:The browser headers could not be refreshed from ScrapeOps, so the saved headers will be used: ConnectionError"])
+        self.assertEqual(middleware.headers_list, [self.browser_headers("Firefox")])
+        self.assertEqual(ScrapeOpsFakeBrowserHeadersMiddleware.refreshing_headers_lists, set())
+    
+    def test_default_headers_without_fetch(self):
+        """Test case where the default headers are kept when there are no saved headers and the blocking fetch fails."""
+        self.fetch.side_effect = requests.ConnectionError("headers.scrapeops.io could not be reached")
+        with self.assertLogs("homescraper.middlewares", level="WARNING") as logs:
+            middleware = ScrapeOpsFakeBrowserHeadersMiddleware(self.settings)
+        self.assertEqual(logs.output, ["WARNING:homescraper.middlewares:The browser headers could not be loaded from ScrapeOps, so the default headers will be used: ConnectionError"])
+        self.assertEqual(middleware.headers_list, [])
+        self.assertIsNone(self.saved_headers())
+        
+        request = Request("https://www.zillow.com/homedetails/33392551_zpid/", headers={"user-agent": "homescraper"})
+        self.assertIsNone(middleware.process_request(request, None))
+        self.assertEqual(request.headers["user-agent"], b"homescraper")
+        self.assertNotIn("header_profile", request.meta)
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    
+    def setUp(self):
+        self.downloader = SimpleNamespace(slots={})
+        self.crawler = SimpleNamespace(engine=SimpleNamespace(downloader=self.downloader), settings=Settings({
+            "ADAPTIVE_CONCURRENCY_ENABLED": True,
+            "ADAPTIVE_CONCURRENCY_BUDGETS": {"www.zillow.com": {"max_concurrency": 4, "min_delay": 0.5}},
+            "ADAPTIVE_CONCURRENCY_WINDOW": 2,
+            "BLOCKED_STATUSES": [403],
+            "CONCURRENT_REQUESTS_PER_DOMAIN": 2,
+            "DOWNLOAD_DELAY": 1,
+        }))
+        self.middleware = AdaptiveConcurrencyMiddleware.from_crawler(self.crawler)
+        self.spider = Spider("fullspider")
+    
+    def send(self, latency, status=200):
+        """Send a request to the site through the middleware and return its response after the latency"""
+        request = Request("https://www.zillow.com/homedetails/33392551_zpid/")
+        self.downloader.slots.setdefault("www.zillow.com", Slot(1, 0, False))
+        self.middleware.process_request(request, self.spider)
+        request.meta["download_latency"] = latency
+        return self.middleware.process_response(request, HtmlResponse(request.url, status=status, body=b"", request=request), self.spider)
+    
+    def assertSlot(self, concurrency, delay):
+        slot = self.downloader.slots["www.zillow.com"]
+        self.assertEqual((slot.concurrency, slot.delay), (concurrency, delay))
+    
+    def test_ramp_up_and_back_off(self):
+        """Test case where the site is sent more requests after a fast window of responses and backs off once a request is blocked."""
+        self.send(0.2)
+        self.assertSlot(2, 1)
+        self.send(0.2)
+        self.assertSlot(3, 0.5)
+        
+        self.send(0, status=403)
+        self.assertSlot(1, 1)
+        
+        # A blocked request sent before the back off does not back off again
+        self.send(30, status=403)
+        self.assertSlot(1, 1)
+        
+        # A window slower than twice the best window sends one less request at a time, down to one
+        self.send(1)
+        self.send(1)
+        self.assertSlot(1, 1)
+        self.send(0.2)
+        self.send(0.2)
+        self.assertSlot(2, 0.5)
+    
+    def test_concurrency_limited_by_budget(self):
+        """Test case where the site is never sent more requests at a time than its budget and never with less than its minimum delay."""
+        for _ in range(10):
+            self.send(0.2)
+        self.assertSlot(4, 0.5)
+    
+    def test_timeout_backs_off(self):
+        """Test case where a timeout backs off like a blocked request, but a request a later middleware dropped does not."""
+        self.send(0.2)
+        request = Request("https://www.zillow.com/homedetails/33392551_zpid/", meta={"download_slot": "www.zillow.com"})
+        self.middleware.process_exception(request, IgnoreRequest(), self.spider)
+        self.assertSlot(2, 1)
+        self.middleware.process_exception(request, TimeoutError(), self.spider)
+        self.assertSlot(1, 2)
+
+
+class TestCircuitBreaker(trial_unittest.TestCase):
+    
+    class SiteDownloadHandler:
+        """Answers every request without the network, blocking the first requests to the paused site and keeping the order the pages were downloaded in."""
+        lazy = False
+        
+        def download_request(self, request, spider):
+            spider.downloads.append(request.url)
+            blocked = "zillow" in request.url and len([url for url in spider.downloads if "zillow" in url]) <= 2
+            return defer.succeed(HtmlResponse(request.url, status=403 if blocked else 200, body=b"", request=request))
+    
+    class CircuitSpider(Spider):
+        name = "circuitspider"
+        
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.downloads, self.parsed, self.failed = [], [], []
+        
+        def start_requests(self):
+            for page in range(1, 7):
+                yield Request(f"https://www.zillow.com/homedetails/{page}", callback=self.parse, errback=self.failed.append, priority=1)
+            for page in range(1, 7):
+                yield Request(f"https://www.countyoffice.org/property/{page}", callback=self.parse, errback=self.failed.append)
+        
+        def parse(self, response):
+            self.parsed.append(response.url)
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+    
+    @defer.inlineCallbacks
+    def test_other_sites_download_while_paused(self):
+        """Test case where the requests to a site that blocked two requests in a row are held outside the downloader, so the other site is downloaded during the pause with only two requests at a time, and the held requests are sent once a test request gets through."""
+        crawler = get_crawler(self.CircuitSpider, {
+            "LOOKUP_CACHE_FILE": os.path.join(self.temp_dir.name, "homedata-cache.sqlite"),
+            "DOWNLOADER_MIDDLEWARES": {"homescraper.middlewares.ScrapeOpsProxyMiddleware": 580},
+            "DOWNLOAD_HANDLERS": {"https": self.SiteDownloadHandler},
+            "CONCURRENT_REQUESTS": 2,
+            "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+            "CIRCUIT_BREAKER_BLOCKS": 2,
+            "CIRCUIT_BREAKER_PAUSE": 1,
+            "HTTPERROR_ALLOW_ALL": True,
+            "TELNETCONSOLE_ENABLED": False,
+        })
+        yield crawler.crawl()
+        spider = crawler.spider
+        
+        county_pages = [url for url in spider.downloads if "countyoffice" in url]
+        self.assertEqual(len(county_pages), 6)
+        self.assertEqual(spider.downloads[2:8], county_pages)
+        self.assertEqual(len([url for url in spider.downloads if "zillow" in url]), 6)
+        self.assertEqual(len(spider.parsed), 12)
+        self.assertEqual(spider.failed, [])
+
+
+class TestProxyCreditBudget(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.settings = Settings({
+            "LOOKUP_CACHE_FILE": os.path.join(self.temp_dir.name, "homedata-cache.sqlite"),
+            "SCRAPEOPS_PROXY_OPTIONS": [{}, {"residential": True}],
+            "SCRAPEOPS_CREDIT_RUN_LIMIT": 100,
+        })
+        
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_weighted_credits(self):
+        """Test case where residential and render_js requests cost more credits and the credits are totaled by spider and site."""
+        middleware = ScrapeOpsProxyMiddleware(self.settings)
+        self.assertEqual(middleware._request_credits({}), 1)
+        self.assertEqual(middleware._request_credits({"residential": True}), 10)
+        self.assertEqual(middleware._request_credits({"residential": True, "render_js": True}), 100)
+        
+        run_credits = ProxyCreditLedger()
+        run_credits.spend("taxspider", "www.countyoffice.org", 1)
+        run_credits.spend("taxspider", "www.countyoffice.org", 10)
+        run_credits.spend("rentspider", "www.zillow.com", 1)
+        self.assertEqual((run_credits.total("taxspider"), run_credits.total()), (11, 12))
+        self.assertEqual(run_credits.summary("taxspider"), [{'spider': "taxspider", 'site': "www.countyoffice.org", 'requests': 2, 'credits': 11}])
+    
+    def test_low_priority_requests_shed(self):
+        """Test case where low priority requests are dropped once most of the run limit is spent and every request is dropped at the limit."""
+        middleware = ScrapeOpsProxyMiddleware(self.settings)
+        middleware.run_credits = ProxyCreditLedger()
+        spider = type("Spider", (), {"name": "fullspider"})()
+        search_page = Request("https://www.zillow.com/edgewater-cleveland-oh/duplex/2_p/", priority=0)
+        rent_page = Request("https://www.zillow.com/rental-manager/price-my-rental/results/1486-olivewood-ave-lakewood-oh-44107/", priority=6)
+        
+        middleware.run_credits.spend("fullspider", "www.zillow.com", 79)
+        self.assertIsNone(middleware._credit_limit_reason(search_page, 1, spider))
+        middleware.run_credits.spend("fullspider", "www.zillow.com", 1)
+        self.assertIsNotNone(middleware._credit_limit_reason(search_page, 1, spider))
+        self.assertIsNone(middleware._credit_limit_reason(rent_page, 1, spider))
+        self.assertIsNotNone(middleware._credit_limit_reason(rent_page, 21, spider))
+    
+    def test_blocked_reasons_logged(self):
+        """Test case where the reasons each site blocked requests are logged when the spider closes."""
+        middleware = ScrapeOpsProxyMiddleware(self.settings)
+        middleware.run_credits = ProxyCreditLedger()
+        middleware.stats = SimpleNamespace(get_value=lambda key, default=None: default, set_value=lambda key, value: None)
+        for reason in ["Status 403", "Captcha page (px-captcha)", "Status 403", None]:
+            middleware.site_outcomes.record("www.zillow.com", reason, 1.0)
+        middleware.site_outcomes.record("www.countyoffice.org", None, 0.5)
+        
+        with self.assertLogs("fullspider", level="INFO") as logs:
+            middleware.spider_closed(Spider("fullspider"))
+        self.assertIn("INFO:fullspider:www.zillow.com: 4 responses, 3 blocked (2 Status 403, 1 Captcha page (px-captcha)), 1.0 second average latency", logs.output)
+        self.assertIn("INFO:fullspider:www.countyoffice.org: 1 responses, 0 blocked, 0.5 second average latency", logs.output)
+    
+    def test_daily_credits_added_by_each_shard(self):
+        """Test case where shards finishing at the same time each add their credits to today's total without losing the other's."""
+        first_shard = LookupCache(self.settings.get("LOOKUP_CACHE_FILE"), "proxy_credits")
+        second_shard = LookupCache(self.settings.get("LOOKUP_CACHE_FILE"), "proxy_credits")
+        self.addCleanup(first_shard.close)
+        self.addCleanup(second_shard.close)
+        today = str(date.today())
+        
+        self.assertEqual(first_shard.add(today, 30), 30)
+        self.assertEqual(second_shard.add(today, 12), 42)
+        self.assertEqual(first_shard.add(today, 8), 50)
+        self.assertEqual(daily_proxy_credits(self.settings), 50)
+    
+    def test_shard_credit_limit(self):
+        """Test case where each shard gets its share of the credits left today rather than of the whole daily limit."""
+        credits_cache = LookupCache(self.settings.get("LOOKUP_CACHE_FILE"), "proxy_credits")
+        credits_cache.add(str(date.today()), 600)
+        credits_cache.close()
+        
+        self.settings.set("SCRAPEOPS_CREDIT_DAILY_LIMIT", 1000)
+        self.assertEqual(shard_credit_limit(self.settings, 4), 25)
+        self.settings.set("SCRAPEOPS_CREDIT_RUN_LIMIT", None)
+        self.assertEqual(shard_credit_limit(self.settings, 4), 100)
+        self.settings.set("SCRAPEOPS_CREDIT_DAILY_LIMIT", None)
+        self.assertIsNone(shard_credit_limit(self.settings, 4))
+        
+        # A shard with no credits left sends no proxy requests at all
+        self.settings.set("SCRAPEOPS_CREDIT_DAILY_LIMIT", 600)
+        self.settings.set("SCRAPEOPS_CREDIT_RUN_LIMIT", shard_credit_limit(self.settings, 4))
+        middleware = ScrapeOpsProxyMiddleware(self.settings)
+        middleware.run_credits = ProxyCreditLedger()
+        rent_page = Request("https://www.zillow.com/rental-manager/price-my-rental/results/1486-olivewood-ave-lakewood-oh-44107/", priority=6)
+        self.assertIsNotNone(middleware._credit_limit_reason(rent_page, 1, type("Spider", (), {"name": "fullspider"})()))
+        
+
+class TestStreamingAnalysis(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    
+    data = TestHouseBatch.data + [{"address": "2200 Lewis Dr, Lakewood, OH 44107", "price": "199000", "sqft": "1800", "tax": None, "rent": "1300", "property_subtype": None}]
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_read_json_lines(self):
+        """Test case where houses are read one line at a time and an incomplete last line is skipped."""
+        json_lines_path = os.path.join(self.temp_dir.name, "homedata.jsonl")
+        with open(json_lines_path, "w") as json_lines_file:
+            for house_data in self.data:
+                json_lines_file.write(json.dumps(house_data) + "\n")
+            json_lines_file.write('{"address": "1233 Granger')
+        
+        self.assertEqual(list(iter_house_data(json_lines_path)), self.data)
+    
+    def test_read_json_list(self):
+        """Test case where a JSON file holding a list of houses is still read."""
+        json_path = os.path.join(self.temp_dir.name, "homedata.json")
+        with open(json_path, "w") as json_file:
+            json.dump(self.data, json_file)
+        
+        self.assertEqual(list(iter_house_data(json_path)), self.data)
+    
+    def test_merge_shards(self):
+        """Test case where the houses from each shard of a crawl are merged into one file, keeping one copy of a house found by two searches."""
+        shard_houses = [
+            [{"url": "https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33546129_zpid/", "price": "185000"},
+             {"url": "https://www.zillow.com/homedetails/2040-Marlowe-Ave-Lakewood-OH-44107/33546500_zpid/", "price": "210000"}],
+            [{"url": "https://www.zillow.com/homedetails/1486-Olivewood-Ave-Lakewood-OH-44107/33546129_zpid/?source=search", "price": "185000"},
+             {"url": "https://www.zillow.com/homedetails/2200-Lewis-Dr-Lakewood-OH-44107/33547001_zpid/", "price": "199000"}],
+        ]
+        shard_paths = []
+        for shard_index, houses in enumerate(shard_houses, start=1):
+            shard_paths.append(os.path.join(self.temp_dir.name, f"homedata-shard{shard_index}-of-2.jsonl"))
+            with open(shard_paths[-1], "w") as json_lines_file:
+                for house_data in houses:
+                    json_lines_file.write(json.dumps(house_data) + "\n")
+        
+        merged_path = os.path.join(self.temp_dir.name, "homedata.jsonl")
+        missing_path = os.path.join(self.temp_dir.name, "homedata-shard3-of-3.jsonl")
+        self.assertEqual(merge_house_data(shard_paths + [missing_path], merged_path), (3, 1))
+        self.assertEqual([house["price"] for house in iter_house_data(merged_path)], ["185000", "210000", "199000"])
+    
+    def test_stream_matches_list(self):
+        """Test case where the streamed analysis gives the same houses, featured houses, and error houses as analyzing the whole list."""
+        analyzed_houses, error_houses = analyze_all_houses(self.config, self.data)
+        
+        streamed_error_houses = []
+        featured_houses = []
+        target_values = {"target_cash_flow_monthly_min": -500}
+        streamed_houses = list(collect_featured_houses(iter_analyzed_houses(self.config, iter(self.data), streamed_error_houses), target_values, featured_houses))
+        
+        self.assertEqual([house.address for house in streamed_houses], [house.address for house in analyzed_houses])
+        self.assertEqual(streamed_error_houses, error_houses)
+        self.assertEqual([house.address for house in featured_houses], [house.address for house in analyzed_houses if house.featured_home_determiner(target_values)])
+    
+    def test_featured_houses_not_required(self):
+        """Test case where every streamed house passes through without being kept in the featured house ranking when featured houses are not required, and only the featured houses are kept when they are."""
+        analyzed_houses, featured_houses = collect_config_featured_houses(iter_analyzed_houses(self.config, iter(self.data), []), dict(self.config, featured_house_required=False))
+        self.assertEqual(len(list(analyzed_houses)), 4)
+        self.assertEqual((len(featured_houses), featured_houses.houses_seen), (0, 0))
+        
+        config = dict(self.config, featured_house_required=True, target_cash_flow_monthly_min=-500)
+        analyzed_houses, featured_houses = collect_config_featured_houses(iter_analyzed_houses(config, iter(self.data), []), config)
+        self.assertEqual(len(list(analyzed_houses)), 4)
+        self.assertEqual(len(featured_houses), len([house for house in analyze_all_houses(config, self.data)[0] if house.featured_home_determiner({"target_cash_flow_monthly_min": -500})]))
+    
+    def test_write_only_excel_book(self):
+        """Test case where the streamed excel book has the same cells and formats as a regular workbook."""
+        analyzed_houses, _ = analyze_all_houses(self.config, self.data)
+        
+        regular_path = os.path.join(self.temp_dir.name, "regular.xlsx")
+        wb = Workbook()
+        wb.remove(wb.active)
+        for house in analyzed_houses:
+            house.house_excel_sheet_creator(wb)
+        wb.save(regular_path)
+        
+        streamed_path = os.path.join(self.temp_dir.name, "streamed.xlsx")
+        self.assertEqual(create_house_analysis_excel_book(iter(analyzed_houses), streamed_path), 4)
+        
+        regular_book = load_workbook(regular_path)
+        streamed_book = load_workbook(streamed_path)
+        self.assertEqual(streamed_book.sheetnames, regular_book.sheetnames)
+        for sheet_name in regular_book.sheetnames:
+            for row in regular_book[sheet_name].iter_rows():
+                for cell in row:
+                    streamed_cell = streamed_book[sheet_name][cell.coordinate]
+                    self.assertEqual((streamed_cell.value, streamed_cell.number_format), (cell.value, cell.number_format), cell.coordinate)
+        
+
+class TestAssumptionSweep(unittest.TestCase):
+    
+    config = dict(TestHouseBatch.config, target_cash_flow_monthly_min=-200, target_five_year_annualized_return_min=0.1)
+    
+    data = TestHouseBatch.data
+    
+    assumption_ranges = {"interest_rate": [0.04, 0.06, 0.08], "down_payment_decimal": [0.05, 0.2], "loan_term_yrs": [15, 30]}
+    
+    def test_grid_matches_house_metrics(self):
+        """Test case where every scenario in a grid batch matches the House class analyzed with that scenario's config."""
+        assumptions, scenarios = HouseAssumptions.grid(self.config, self.assumption_ranges)
+        house_batch = HouseBatch(assumptions, self.data, projection_yrs=5)
+        self.assertEqual(house_batch.cash_flow_monthly.shape, (12, 4))
+        self.assertEqual(house_batch.annualized_return_decimal.shape, (12, 4, 6))
+        
+        for scenario_index, scenario in enumerate(scenarios):
+            for house_index, house_data in enumerate(self.data):
+                house = House(dict(self.config, **scenario), house_data)
+                for metric in ["principle_interest_monthly", "total_expenses_monthly", "cash_flow_monthly", "cash_flow_50", "cash_needed_total", "cash_on_cash_decimal"]:
+                    self.assertEqual(getattr(house_batch, metric)[scenario_index, house_index], getattr(house, metric), metric)
+                self.assertEqual(house_batch.profit_if_sold[scenario_index, house_index].tolist(), house.profit_if_sold[:6])
+    
+    def test_featured_matches_house(self):
+        """Test case where the featured houses of every scenario match the House class featured home determiner."""
+        assumption_sweep = AssumptionSweep(self.config, self.data, self.assumption_ranges)
+        self.assertEqual(len(assumption_sweep.scenarios), 12)
+        
+        for scenario_index, scenario in enumerate(assumption_sweep.scenarios):
+            featured_houses = [house_data["address"] for house_data in self.data if House(dict(self.config, **scenario), house_data).featured_home_determiner(self.config)]
+            self.assertEqual(assumption_sweep.featured_houses(scenario_index), featured_houses)
+            self.assertEqual([result["address"] for result in assumption_sweep.results if all(result[key] == value for key, value in scenario.items())], featured_houses)
+    
+    def test_invalid_assumption(self):
+        """Test case where a value that is not a financial assumption is swept."""
+        with self.assertRaises(ValueError):
+            AssumptionSweep(self.config, self.data, {"target_cash_flow_monthly_min": [0, 100]})
+    
+    def test_parse_assumption_range(self):
+        """Test case where ranges and lists of assumption values are read from the command line."""
+        self.assertEqual(parse_assumption_range("0.05:0.08:0.01"), [0.05, 0.06, 0.07, 0.08])
+        self.assertEqual(parse_assumption_range("15,30"), [15, 30])
+        with self.assertRaises(ValueError):
+            parse_assumption_range("0.08:0.05:0.01")
+        
+
+class TestMonteCarloSimulation(unittest.TestCase):
+    
+    config = TestHouseBatch.config
+    
+    data = TestHouseBatch.data
+    
+    def test_no_volatility_matches_house(self):
+        """Test case where every path follows the config values and every percentile matches the House projections to within rounding."""
+        simulation = MonteCarloSimulation(self.config, self.data, simulations=20, volatility={assumption: 0 for assumption in MonteCarloSimulation.default_volatility}, workers=1)
+        self.assertEqual(simulation.profit_if_sold.shape, (4, 5, 31))
+        
+        for index, house_data in enumerate(self.data):
+            house = House(self.config, house_data)
+            for year in simulation.year:
+                for profit_if_sold in simulation.profit_if_sold[index, :, year]:
+                    self.assertAlmostEqual(profit_if_sold, house.profit_if_sold[year], delta=5)
+    
+    def test_percentile_bands(self):
+        """Test case where the percentile bands are ordered and widen as the projection goes on."""
+        simulation = MonteCarloSimulation(self.config, self.data, simulations=2000, projection_yrs=10, seed=1, workers=1)
+        self.assertEqual(simulation.annualized_return_decimal.shape, (4, 5, 11))
+        
+        for profit_bands in simulation.profit_if_sold:
+            for year in range(1, 11):
+                self.assertEqual(sorted(profit_bands[:, year]), list(profit_bands[:, year]))
+            self.assertGreater(profit_bands[-1, 10] - profit_bands[0, 10], profit_bands[-1, 1] - profit_bands[0, 1])
+    
+    def test_repeatable_across_workers(self):
+        """Test case where the same seed gives the same results no matter how the houses are split across processes."""
+        serial_simulation = MonteCarloSimulation(self.config, self.data, simulations=500, projection_yrs=5, seed=7, workers=1)
+        parallel_simulation = MonteCarloSimulation(self.config, self.data, simulations=500, projection_yrs=5, seed=7, workers=2, chunk_size=1)
+        self.assertEqual(serial_simulation.profit_if_sold.tolist(), parallel_simulation.profit_if_sold.tolist())
+        self.assertEqual(serial_simulation.address, parallel_simulation.address)
+        
+
 if __name__ == '__main__':
     unittest.main()